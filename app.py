@@ -1,40 +1,51 @@
 import os
-from flask import Flask, redirect, request, url_for, session, render_template, jsonify, send_from_directory
+from dotenv import load_dotenv
+if __name__ == '__main__':
+    # wsgi.py loads .env itself, before any module reads the environment
+    load_dotenv()
+from flask import Flask, Response, redirect, request, url_for, session, render_template, jsonify
 from flask_login import LoginManager, UserMixin, login_user, login_required, current_user, logout_user
 from flask_cors import CORS
 import requests
-from dotenv import load_dotenv
 import subprocess
 from werkzeug.utils import secure_filename
 from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.exceptions import BadRequest
 from datetime import datetime, timedelta
 import threading
+import time
 import uuid
-import re
 import json
 import configparser
-from version import VERSION
+from version import VERSION, COMMIT_MESSAGE as BUILD_COMMIT_MESSAGE
+from scheduler import TranscodeScheduler
+from task_store import FFmpegProgress, create_task_store
+from media_probe import probe_media, content_hash
+from discord_api import DiscordClient
+from channel_directory import ChannelDirectory
+from guild_membership import MembershipCache, NotAMember, verify_member
+from output_cache import OutputCache, cache_key, file_version
+from ingest import IngestRequest, IngestAborted
+from ffmpeg_progress import StderrRing, follow_progress
+import metrics
+from encoding_ladder import choose_rendition
+from segmented_encode import (SEGMENT_ENCODE_SECONDS, default_workers, keyframe_times, plan_segments,
+                              segment_bitrate, encode_segmented, throughput_baseline)
+from encoding import (ENCODE_MODE, ENCODE_MAX_ATTEMPTS, ABSOLUTE_MIN_VIDEO_BITRATE_BPS,
+                      plan_bitrates, rate_control_args, corrected_bitrate, size_report)
+from encoder_policy import EncoderPolicy, ThroughputModel
+from scratch import ScratchSpace
+from job_journal import JobJournal, MAX_RESUMES, RESCAN_SECONDS
+from chunked_upload import ChunkedUpload, ChunkRejected, CHUNK_SIZE as UPLOAD_CHUNK_BYTES
+from batch_upload import Batch, BatchRegistry, plan_messages, MAX_FILES as BATCH_MAX_FILES, MAX_UPLOAD_BYTES as BATCH_MAX_UPLOAD_BYTES
+from static_assets import StaticAssets, PLAIN_MAX_AGE as STATIC_MAX_AGE
+from request_logging import configure_logging, RequestTimer, ENDPOINT_KEY
 import logging
 
-load_dotenv()
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
 logger = logging.getLogger(__name__)
 
-def get_latest_commit_message():
-    try:
-        result = subprocess.run(['git', 'log', '-1', '--pretty=format:%s'], 
-                              capture_output=True, text=True, check=True)
-        return result.stdout
-    except:
-        return "Development build"
-
-COMMIT_MESSAGE = get_latest_commit_message()
+# Stamped into version.py at build time by stamp_version.py
+COMMIT_MESSAGE = BUILD_COMMIT_MESSAGE or "Development build"
 
 # Get progress settings from environment variables
 PROGRESS_CONFIG = {
@@ -46,71 +57,43 @@ PROGRESS_CONFIG = {
     'opacity': float(os.getenv('PROGRESS_CHART_OPACITY', 0.9))
 }
 
-# Global dictionary to store task progress
-tasks = {}
-
-class FFmpegProgress:
-    def __init__(self, duration):
-        self.duration = duration
-        self.current_time = 0
-        self.status = 'processing'
-        self.stage = 'processing'  # uploading, processing, posting, complete, failed
-        self.percent = 0
-        self.error = None
-        self.message_link = None
-
-    def update(self, time):
-        self.current_time = time
-        self.percent = min((time / self.duration) * 100, 100)
-
-    def set_stage(self, stage, percent=None):
-        self.stage = stage
-        if percent is not None:
-            self.percent = percent
-
-    def complete(self, message_link=None):
-        self.status = 'completed'
-        self.percent = 100
-        self.stage = 'complete'
-        self.message_link = message_link
-
-    def fail(self, error):
-        self.status = 'failed'
-        self.error = error
-        self.stage = 'failed'
+# Server-Sent Events progress stream settings
+PROGRESS_STREAM_CONFIG = {
+    'step': float(os.getenv('PROGRESS_STREAM_STEP', 2.0)),
+    'interval': float(os.getenv('PROGRESS_STREAM_INTERVAL', 0.5)),
+    'max_seconds': float(os.getenv('PROGRESS_STREAM_MAX_SECONDS', 25)),
+    'retry_ms': int(os.getenv('PROGRESS_STREAM_RETRY_MS', 1000)),
+    # Each open stream holds a server thread; past this many, clients fall back to polling
+    'max_clients': int(os.getenv('PROGRESS_STREAM_MAX_CLIENTS', 16))
+}
+stream_slots = threading.BoundedSemaphore(PROGRESS_STREAM_CONFIG['max_clients'])
+
+# Task progress, shared across workers when TASK_STORE=sqlite
+tasks = create_task_store()
 
 app = Flask(__name__)  # Reset to default
+app.request_class = IngestRequest
 app.static_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
 app.static_url_path = '/static'
 
 # Static URL from environment variable
 app.config['STATIC_URL'] = os.getenv('STATIC_URL', 'https://stuff.introvrtlounge.com/images')
 
-# Log static folder configuration
-logger.info(f"Static folder: {app.static_folder}")
-logger.info(f"Static URL path: {app.static_url_path}")
-logger.info(f"Static URL: {app.config['STATIC_URL']}")
-logger.info(f"Static folder exists: {os.path.exists(app.static_folder)}")
-logger.info(f"Static folder contents: {os.listdir(app.static_folder)}")
+# Fingerprinted, precompressed static files, built by create_app()
+static_assets = StaticAssets(app.static_folder, external_url=app.config['STATIC_URL'])
+
+@app.context_processor
+def asset_helpers():
+    return {'asset_url': static_assets.url}
 
 @app.route('/upvrt/static/<path:filename>')
 def serve_static(filename):
-    """Serve static files."""
-    logger.info(f"Serving static file: {filename}")
-    try:
-        if filename.startswith('images/'):
-            logger.info(f"Static folder path: {app.static_folder}")
-            logger.info(f"Full file path: {os.path.join(app.static_folder, filename)}")
-            logger.info(f"File exists: {os.path.exists(os.path.join(app.static_folder, filename))}")
-            response = send_from_directory(app.static_folder, filename)
-            logger.info(f"Successfully served static file: {filename}")
-            return response
-        else:
-            logger.error(f"Invalid path for static file: {filename}")
-            return "Invalid path", 404
-    except Exception as e:
-        logger.error(f"Error serving static file {filename}: {str(e)}")
-        return str(e), 404
+    """Serve static files, marking fingerprinted names immutable."""
+    asset, immutable = static_assets.lookup(filename)
+    if asset is None:
+        logger.warning(f"Static file not found: {filename}")
+        return "Not found", 404
+    return static_assets.response(asset, request, immutable=immutable)
 
 CORS(app, resources={
     r"/upvrt/*": {
@@ -118,8 +101,10 @@ CORS(app, resources={
         "supports_credentials": True
     }
 })
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
-app.secret_key = os.urandom(24)
+# One timing line per request, sampled per endpoint (REQUEST_LOG_SAMPLING)
+app.wsgi_app = ProxyFix(RequestTimer(app.wsgi_app), x_proto=1, x_host=1)
+# Set SECRET_KEY to keep sessions valid across restarts and workers started without --preload
+app.secret_key = os.getenv('SECRET_KEY') or os.urandom(24)
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=24)
 app.config['APPLICATION_ROOT'] = '/'
 app.config['SESSION_COOKIE_NAME'] = 'upvrt_session'
@@ -169,7 +154,7 @@ def login():
     next_url = request.args.get('next', url_for('dashboard'))
     session['next_url'] = next_url
     
-    oauth_url = f'https://discord.com/api/oauth2/authorize?client_id={DISCORD_CLIENT_ID}&redirect_uri={DISCORD_REDIRECT_URI}&response_type=code&scope=identify%20guilds%20guilds.members.read'
+    oauth_url = f'https://discord.com/api/oauth2/authorize?client_id={DISCORD_CLIENT_ID}&redirect_uri={DISCORD_REDIRECT_URI}&response_type=code&scope=identify%20guilds.members.read'
     return render_template('login.html', oauth_url=oauth_url, version=VERSION, commit_message=COMMIT_MESSAGE)
 
 @app.route('/upvrt/callback')
@@ -182,37 +167,17 @@ def callback():
     if not code:
         return render_template('callback.html', success=False, error='No authorization code received', version=VERSION, commit_message=COMMIT_MESSAGE)
         
+    login_started = time.monotonic()
     try:
-        data = {
-            'client_id': DISCORD_CLIENT_ID,
-            'client_secret': DISCORD_CLIENT_SECRET,
-            'grant_type': 'authorization_code',
-            'code': code,
-            'redirect_uri': DISCORD_REDIRECT_URI,
-            'scope': 'identify guilds guilds.members.read'
-        }
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded'
-        }
-        response = requests.post('https://discord.com/api/oauth2/token', data=data, headers=headers)
-        response.raise_for_status()
-        tokens = response.json()
-        
+        tokens = discord_client.exchange_code(code, DISCORD_CLIENT_ID, DISCORD_CLIENT_SECRET,
+                                              DISCORD_REDIRECT_URI, 'identify guilds.members.read')
         access_token = tokens.get('access_token')
-        headers = {
-            'Authorization': f'Bearer {access_token}'
-        }
-        
-        user_response = requests.get('https://discord.com/api/users/@me', headers=headers)
-        user_response.raise_for_status()
-        user_data = user_response.json()
         
-        # Check if user is in the specified guild
-        guilds_response = requests.get('https://discord.com/api/users/@me/guilds', headers=headers)
-        guilds_response.raise_for_status()
-        guilds = guilds_response.json()
-        
-        if not any(g['id'] == GUILD_ID for g in guilds):
+        # Members verified within the cache TTL skip the guild member lookup
+        try:
+            user_data = verify_member(discord_client, access_token, GUILD_ID, membership_cache)
+        except NotAMember:
+            metrics.logins.inc(outcome='not_member')
             return render_template('callback.html', 
                                 success=False, 
                                 error="You must be a member of the IntroVRT Lounge Discord server to use this application.",
@@ -224,50 +189,50 @@ def callback():
         
         user = User(user_data['id'], user_data['username'], user_data.get('discriminator', '0'), user_data.get('avatar'))
         login_user(user, remember=True, duration=timedelta(hours=24))
+        metrics.logins.inc(outcome='success')
         
         return render_template('callback.html', success=True, version=VERSION, commit_message=COMMIT_MESSAGE)
         
     except requests.exceptions.RequestException as e:
-        print(f"OAuth error: {str(e)}")
+        logger.error(f"OAuth error: {str(e)}")
+        metrics.logins.inc(outcome='error')
         return render_template('callback.html', 
                             success=False, 
                             error="Failed to authenticate with Discord. Please try again.",
                             version=VERSION,
                             commit_message=COMMIT_MESSAGE)
+    finally:
+        metrics.login_seconds.observe(time.monotonic() - login_started)
 
 @app.route('/upvrt/dashboard')
 @login_required
 def dashboard():
-    # Get available channels
-    headers = {
-        'Authorization': f'Bot {DISCORD_BOT_TOKEN}'
-    }
-    channels_response = requests.get(
-        f'https://discord.com/api/guilds/{GUILD_ID}/channels',
-        headers=headers
-    )
-    channels = channels_response.json()
-    text_channels = [c for c in channels if c['type'] == 0]  # 0 is text channel
+    # Get available channels from the in-memory directory
+    text_channels = channel_directory.get()
     
     return render_template('dashboard.html', 
                          channels=text_channels,
                          progress_config=PROGRESS_CONFIG,
+                         batch_max_files=BATCH_MAX_FILES,
                          version=VERSION,
                          commit_message=COMMIT_MESSAGE)
 
+@app.route('/upvrt/channels/refresh', methods=['POST'])
+@login_required
+def refresh_channels():
+    """Invalidate the cached channel list so the next dashboard load revalidates it."""
+    channel_directory.invalidate()
+    return jsonify({'status': 'ok'})
+
 @app.before_request
 def before_request():
     session.permanent = True  # Set session to use PERMANENT_SESSION_LIFETIME
-    # Log all requests
-    logger.info(f"Request: {request.method} {request.path} from {request.remote_addr}")
-    logger.info(f"Endpoint: {request.endpoint}")
-    logger.info(f"URL: {request.url}")
-    logger.info(f"Base URL: {request.base_url}")
+    # The request timing middleware logs the endpoint once the response is sent
+    request.environ[ENDPOINT_KEY] = request.endpoint
     
     # Skip authentication for static files and certain endpoints
     if (request.path.startswith('/upvrt/static/') or 
-        request.endpoint in ['login', 'callback', 'index', 'tos', 'privacy', 'static', 'health_check', 'debug_static', 'favicon', 'test_static']):
-        logger.info("Skipping authentication for public endpoint")
+        request.endpoint in ['login', 'callback', 'index', 'tos', 'privacy', 'static', 'health_check', 'metrics_endpoint', 'debug_static', 'favicon', 'test_static']):
         return None
         
     # Require authentication for all other endpoints
@@ -293,151 +258,309 @@ DISCORD_REDIRECT_URI = os.getenv('DISCORD_REDIRECT_URI')
 DISCORD_BOT_TOKEN = os.getenv('DISCORD_BOT_TOKEN')
 GUILD_ID = os.getenv('GUILD_ID')
 UPLOAD_FOLDER = 'uploads'
+MAX_UPLOAD_SIZE_MB = int(os.getenv('MAX_UPLOAD_SIZE_MB', 100))
+MAX_UPLOAD_BYTES = MAX_UPLOAD_SIZE_MB * 1024 * 1024
+# Start encoding streamable MP4s (moov atom first) while the upload is still arriving
+STREAMING_ENCODE = os.getenv('STREAMING_ENCODE', '1') == '1'
+WATERMARK_PATH = "/app/assets/watermark.png"
+
+# Every Discord REST call goes through one rate-limit-aware client
+discord_client = DiscordClient(DISCORD_BOT_TOKEN)
+
+# Users recently verified as GUILD_ID members, so a failed member lookup doesn't lock them out
+membership_cache = MembershipCache()
+
+# Guild text channels for the dashboard, served from memory and refreshed in the background
+channel_directory = ChannelDirectory(lambda: discord_client.get_guild_channels(GUILD_ID),
+                                     ttl=int(os.getenv('CHANNEL_CACHE_TTL', 300)),
+                                     retry_after=int(os.getenv('CHANNEL_RETRY_SECONDS', 30)))
+
+# Scrape-time gauges for the pool and task store
+metrics.registry.gauge('upvrt_queue_depth', 'Jobs waiting for a transcode slot',
+                       function=lambda: scheduler.stats()['queued'])
+metrics.registry.gauge('upvrt_transcodes_running', 'Jobs holding a transcode slot',
+                       function=lambda: scheduler.stats()['running'])
+metrics.registry.gauge('upvrt_task_store_size', 'Tasks held in the task store', function=lambda: len(tasks))
+
+# Compressed outputs keyed by input content and encode parameters, so reposts skip the encode
+output_cache = OutputCache(
+    os.getenv('OUTPUT_CACHE_DIR', os.path.join(UPLOAD_FOLDER, 'cache')),
+    int(float(os.getenv('OUTPUT_CACHE_MB', 1024)) * 1024 * 1024)
+)
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES + 1024 * 1024  # Room for multipart headers and form fields
 MAX_DISCORD_SIZE = 10 * 1024 * 1024  # 10MB absolute limit for Discord
 TARGET_SIZE_BYTES = 9.5 * 1024 * 1024  # Target 9.5MB for compression
 
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
+# Per-task working directories on tmpfs when RAM allows, swept by a background janitor
+scratch = ScratchSpace()
 
-def get_video_duration(input_path):
-    """Get video duration using ffprobe."""
-    try:
-        probe = subprocess.run([
-            'ffprobe', '-v', 'error',
-            '-show_entries', 'format=duration',
-            '-of', 'json',
-            input_path
-        ], capture_output=True, text=True, check=True)
-        
-        duration = float(json.loads(probe.stdout)['format']['duration'])
-        return duration
-    except Exception as e:
-        print(f"Error getting video duration: {e}")
-        return None
+# Stage transitions of every job, so a restarted worker can pick up where the last one stopped
+journal = JobJournal()
+
+# Multi-file uploads started in this worker, for their combined progress
+batches = BatchRegistry(tasks.ttl)
 
-def process_video_with_progress(input_path, output_path, task_id):
-    """Process video using FFmpeg with progress tracking."""
+# Transcode pool: concurrent ffmpeg processes and threads given to each one
+scheduler = TranscodeScheduler(
+    slots=int(os.getenv('TRANSCODE_SLOTS', 0)) or None,
+    threads_per_job=int(os.getenv('FFMPEG_THREADS', 0)) or None,
+    estimate_seconds=float(os.getenv('TRANSCODE_ESTIMATE_SECONDS', 60))
+)
+
+# x264 preset and threads per encode, from this host's measured preset speeds and the queue
+encoder_model = ThroughputModel()
+encoder_policy = EncoderPolicy(encoder_model)
+
+_app_ready = False
+
+def create_app():
+    """Finish setting up the app and return it.
+    
+    Importing this module only reads configuration and registers routes.
+    Logging, the upload folder and the static asset manifest are set up
+    here, once, so ``gunicorn --preload`` does the work in the parent
+    process and workers fork from it warm.
+    """
+    global _app_ready
+    if not _app_ready:
+        configure_logging()
+        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+        static_assets.build()
+        # Clear out what crashed or restarted workers left behind
+        scratch.sweep()
+        logger.info(f"UpVRT {VERSION} ready (static folder {app.static_folder}, static URL {app.config['STATIC_URL']})")
+        _app_ready = True
+    return app
+
+def process_video_with_progress(input_path, output_path, task_id, threads=None, ingest=None):
+    """Process video using FFmpeg with progress tracking.
+    
+    When ``ingest`` is an upload still in progress, ffmpeg reads it through a
+    pipe as the bytes arrive instead of waiting for the whole file.
+    """
     try:
         logger.info(f"Starting video processing for task {task_id}")
         logger.info(f"Input path: {input_path}")
         logger.info(f"Output path: {output_path}")
         
-        duration = get_video_duration(input_path)
-        if not duration:
+        streaming = ingest is not None and not ingest.finished
+        with metrics.probe_seconds.time():
+            if streaming:
+                # The moov atom is already on disk, but the content hash is not known yet
+                digest = None
+                media = probe_media(input_path, cache=False)
+            else:
+                digest = ingest.hexdigest() if ingest else content_hash(input_path)
+                media = probe_media(input_path, digest=digest)
+        if not media or not media.duration:
             logger.error(f"Could not determine video duration for task {task_id}")
-            tasks[task_id].fail("Could not determine video duration")
+            tasks.setdefault(task_id, FFmpegProgress()).fail("Could not determine video duration")
             return False
+        duration = media.duration
+        journal.record(task_id, 'probed', duration=duration)
 
-        progress = FFmpegProgress(duration)
-        tasks[task_id] = progress
+        progress = tasks.setdefault(task_id, FFmpegProgress())
+        progress.start(duration)
         logger.info(f"Video duration: {duration} seconds")
+        logger.info(f"Original video: {media.display_width}x{media.display_height} {media.video_codec} "
+                    f"@ {media.frame_rate}fps, audio: {media.audio_codec or 'none'}")
 
-        watermark = "/app/assets/watermark.png"
+        watermark = WATERMARK_PATH
+        
+        # Split the size budget between video and audio
+        plan = plan_bitrates(duration, TARGET_SIZE_BYTES)
+        if plan is None:
+            error = f"Video is too long ({duration:.0f}s) to fit under 10MB"
+            logger.error(f"Video processing failed for task {task_id}: {error}")
+            progress.fail(error)
+            return False
+        video_bitrate_bps, audio_bitrate_bps = plan
+        logger.info(f"Calculated bitrates ({ENCODE_MODE}) - Video: {video_bitrate_bps/1024:.2f}kbps, Audio: {audio_bitrate_bps/1024:.2f}kbps")
         
-        # Get video info for scaling
-        probe = subprocess.run([
-            'ffprobe', '-v', 'error',
-            '-select_streams', 'v:0',
-            '-show_entries', 'stream=width,height',
-            '-of', 'json',
-            input_path
-        ], capture_output=True, text=True, check=True)
+        # Output size and frame rate follow the bitrate budget, keeping the source aspect ratio
+        rendition = choose_rendition(video_bitrate_bps, media.display_width, media.display_height, media.frame_rate)
+        watermark_width, watermark_height = rendition.watermark_size
+        logger.info(f"Output rendition: {rendition.width}x{rendition.height} @ {rendition.frame_rate}fps "
+                    f"({rendition.bits_per_pixel:.3f} bits per pixel)")
         
-        video_info = json.loads(probe.stdout)
-        stream_info = video_info.get('streams', [{}])[0]
-        video_width = stream_info.get('width', 1280)
-        video_height = stream_info.get('height', 720)
-        logger.info(f"Original video dimensions: {video_width}x{video_height}")
+        # Everything that changes the output, for the content-addressed output cache. The preset
+        # is left out: an output made with any preset will do, and a hit skips the encode.
+        encode_params = {
+            'scale': rendition.scale,
+            'frame_rate': rendition.frame_rate,
+            'video_bitrate': video_bitrate_bps,
+            'audio_bitrate': audio_bitrate_bps,
+            'mode': ENCODE_MODE,
+            'watermark': file_version(watermark),
+            'watermark_size': f'{watermark_width}x{watermark_height}'
+        }
         
-        # Calculate bitrate based on target size
-        file_size = os.path.getsize(input_path)
-        audio_bitrate_bps = 96 * 1024  # 96kbps for audio
-        total_bitrate_bps = int((TARGET_SIZE_BYTES * 8) / duration)
-        video_bitrate_bps = total_bitrate_bps - audio_bitrate_bps
-        logger.info(f"Calculated bitrates - Total: {total_bitrate_bps/1024:.2f}kbps, Video: {video_bitrate_bps/1024:.2f}kbps, Audio: {audio_bitrate_bps/1024:.2f}kbps")
+        def cached_output(digest):
+            if not (digest and output_cache.link_to(cache_key(digest, encode_params), output_path)):
+                return False
+            metrics.output_cache_hits.inc(result='hit')
+            output_size = os.path.getsize(output_path)
+            progress.size_report = size_report(output_size, TARGET_SIZE_BYTES)
+            logger.info(f"Output cache hit for task {task_id}, skipping encode ({output_size/1024/1024:.2f}MB)")
+            progress.update(duration)
+            return True
         
-        # Set minimum video bitrate
-        min_video_bitrate_bps = 300 * 1024  # 300kbps minimum
-        if video_bitrate_bps < min_video_bitrate_bps:
-            logger.info(f"Adjusting video bitrate to minimum: {min_video_bitrate_bps/1024:.2f}kbps")
-            video_bitrate_bps = min_video_bitrate_bps
+        if cached_output(digest):
+            return True
+        metrics.output_cache_hits.inc(result='miss')
         
-        # Determine if video is portrait or landscape
-        is_portrait = video_height > video_width
-        scale_dimensions = "720:1280" if is_portrait else "1280:720"
+        # Long, fully received inputs can be split at keyframes and encoded on the cores of this
+        # job's slot plus those of idle slots, as granted by the scheduler
+        load = scheduler.stats()
+        threads_per_job = threads or scheduler.threads_per_job
+        cores = scheduler.claim_threads(task_id, encoder_policy.threads(load, threads_per_job))
+        segments = None
+        workers = default_workers(threads_per_job, cores)
+        if not streaming and SEGMENT_ENCODE_SECONDS and duration >= SEGMENT_ENCODE_SECONDS and workers > 1:
+            segments = plan_segments(duration, keyframe_times(input_path), workers)
+            if len(segments) < 2:
+                segments = None
+        if segments:
+            processes = min(len(segments), workers)
+            scheduler.claim_threads(task_id, processes * threads_per_job)
         
-        # Calculate watermark dimensions (20% of width)
-        watermark_width = int(1280 * 0.2) if not is_portrait else int(720 * 0.2)
-        watermark_height = int(watermark_width * 9 / 16)  # Maintain 16:9 aspect ratio
+        # Slower presets for short clips and an idle queue, faster ones under a backlog
+        pixel_rate = rendition.width * rendition.height * rendition.frame_rate
+        choice = encoder_policy.choose(duration, pixel_rate, load, threads_per_job,
+                                       processes=processes if segments else 1,
+                                       threads=threads_per_job if segments else cores)
+        threads = choice.threads
+        progress.encoder = choice.to_dict()
+        metrics.encoder_presets.inc(preset=choice.preset)
+        logger.info(f"Encoder policy for task {task_id}: preset {choice.preset} with {threads} threads, "
+                    f"predicted {choice.predicted_seconds:.0f}s of a {choice.budget_seconds:.0f}s budget "
+                    f"({choice.reason}; {load['queued']} queued, {load['running']}/{load['slots']} slots busy)")
         
-        # Process video with FFmpeg and capture progress
-        logger.info("Starting FFmpeg processing")
-        process = subprocess.Popen([
-            'ffmpeg', '-i', input_path, '-i', watermark,
-            '-filter_complex', f'[0:v]scale={scale_dimensions}[v];[1:v]scale={watermark_width}:{watermark_height}[wm];[v][wm]overlay=W-w-10:H-h-10:format=auto:alpha=0.7',
-            '-c:v', 'libx264',
-            '-b:v', str(video_bitrate_bps),
-            '-preset', 'fast',
-            '-profile:v', 'baseline',
-            '-level', '3.1',
-            '-metadata:s:v:0', 'rotate=0',
-            '-pix_fmt', 'yuv420p',
-            '-r', '30',
-            '-c:a', 'aac',
-            '-b:a', '96k',
-            '-progress', 'pipe:1',
-            output_path
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
-
-        # Log FFmpeg stderr output in real-time
-        def log_stderr():
-            for line in process.stderr:
-                logger.info(f"FFmpeg: {line.strip()}")
-        stderr_thread = threading.Thread(target=log_stderr)
-        stderr_thread.daemon = True
-        stderr_thread.start()
-
-        # Parse FFmpeg progress output
-        time_pattern = re.compile(r'out_time_ms=(\d+)')
-        while True:
-            line = process.stdout.readline()
-            if not line:
-                break
-            
-            match = time_pattern.search(line)
-            if match:
-                time_ms = int(match.group(1)) / 1000000.0  # Convert microseconds to seconds
-                progress.update(time_ms)
-                if int(time_ms) % 5 == 0:  # Log progress every 5 seconds
-                    logger.info(f"Processing progress: {progress.percent:.1f}% ({time_ms:.1f}s / {duration:.1f}s)")
-
-        process.wait()
+        thread_args = ['-threads', str(threads)] if threads else []
+        
+        def video_args(bitrate_bps):
+            # Watermark input, filter graph and video settings shared by whole-file and segment encodes
+            return [
+                '-i', watermark,
+                '-filter_complex', f'[0:v]scale={rendition.scale}[v];[1:v]scale={watermark_width}:{watermark_height}[wm];[v][wm]overlay=W-w-10:H-h-10:format=auto:alpha=0.7',
+                '-c:v', 'libx264',
+                *rate_control_args(bitrate_bps),
+                '-preset', choice.preset,
+                '-profile:v', 'baseline',
+                '-level', '3.1',
+                '-metadata:s:v:0', 'rotate=0',
+                '-pix_fmt', 'yuv420p',
+                '-r', str(rendition.frame_rate),
+            ]
+        
+        cache_hit = threading.Event()
         
-        if process.returncode == 0:
+        def streamed_source():
+            yield from ingest.follow()
+            # The content hash is known once the upload is in: an output of the same upload
+            # replaces the one still being encoded, which run_ffmpeg then stops
+            if cached_output(ingest.hexdigest()):
+                cache_hit.set()
+        
+        for attempt in range(1, ENCODE_MAX_ATTEMPTS + 1):
+            # Only the first attempt can overlap the upload; retries read the finished file
+            source = streamed_source() if streaming and attempt == 1 else None
+            encode_started = time.monotonic()
+            if segments:
+                segment_bps = segment_bitrate(video_bitrate_bps, duration, len(segments))
+                logger.info(f"Starting segmented FFmpeg processing (attempt {attempt}): {len(segments)} segments, "
+                            f"{workers} at a time with preset {choice.preset} and {threads} threads each")
+                returncode, error = encode_segmented(
+                    segments, f'{output_path}.segments',
+                    lambda start, length, path: [
+                        'ffmpeg', '-hide_banner', '-nostats', '-y',
+                        '-ss', f'{start:.3f}', '-t', f'{length:.3f}', '-i', input_path,
+                        *video_args(segment_bps),
+                        '-an',
+                        *thread_args,
+                        '-progress', 'pipe:1',
+                        path
+                    ],
+                    lambda list_path: [
+                        'ffmpeg', '-hide_banner', '-nostats', '-y',
+                        '-f', 'concat', '-safe', '0', '-i', list_path, '-i', input_path,
+                        '-map', '0:v:0', '-map', '1:a:0?',
+                        '-c:v', 'copy',
+                        '-c:a', 'aac',
+                        '-b:a', str(audio_bitrate_bps),
+                        '-progress', 'pipe:1',
+                        output_path
+                    ],
+                    run_ffmpeg, progress, workers
+                )
+            else:
+                # Process video with FFmpeg and capture progress
+                logger.info(f"Starting FFmpeg processing (attempt {attempt}) with preset {choice.preset} and {threads} threads"
+                            f"{' from the incoming upload' if source else ''}")
+                returncode, error = run_ffmpeg([
+                    'ffmpeg', '-hide_banner', '-nostats', '-y', '-i', 'pipe:0' if source else input_path,
+                    *video_args(video_bitrate_bps),
+                    '-c:a', 'aac',
+                    '-b:a', str(audio_bitrate_bps),
+                    *thread_args,
+                    '-progress', 'pipe:1',
+                    output_path
+                ], progress, duration, source=source, cancel=cache_hit)
+                if cache_hit.is_set():
+                    progress.update(duration)
+                    return True
+            encode_wall = time.monotonic() - encode_started
+            metrics.encode_seconds.observe(encode_wall)
+            
+            if returncode != 0:
+                logger.error(f"Video processing failed for task {task_id}: {error}")
+                progress.fail(error)
+                return False
+            
             # Check if output file exists
             if not os.path.exists(output_path):
                 error = "Output file was not created"
                 logger.error(f"Video processing failed for task {task_id}: {error}")
                 progress.fail(error)
                 return False
-                
-            # Check if compressed file is over Discord's limit
+            
             output_size = os.path.getsize(output_path)
-            logger.info(f"Output file size: {output_size/1024/1024:.2f}MB")
-            if output_size > MAX_DISCORD_SIZE:
-                error = f"File is over 10MB ({output_size/1024/1024:.2f}MB) and cannot be sent to Discord"
-                logger.error(f"Video processing failed for task {task_id}: {error}")
-                progress.fail(error)
-                return False
-                
-            logger.info(f"Video processing completed successfully for task {task_id}")
-            progress.complete()
-            return True
-        else:
-            error = process.stderr.read() if process.stderr else "Unknown error"
-            logger.error(f"Video processing failed for task {task_id}: {error}")
-            progress.fail(error)
-            return False
+            metrics.encode_realtime_factor.observe(duration / max(encode_wall, 0.001))
+            pixels_per_second = rendition.width * rendition.height * rendition.frame_rate * duration / max(encode_wall, 0.001)
+            if segments:
+                speedup = throughput_baseline.speedup(pixels_per_second)
+                if speedup:
+                    metrics.segment_speedup.observe(speedup)
+                logger.info(f"Segmented encode of task {task_id} took {encode_wall:.1f}s, "
+                            f"{f'{speedup:.2f}x' if speedup else 'no baseline for'} the single-process speed")
+            elif not source:
+                # Streamed encodes are paced by the upload, so only file encodes set the baseline
+                throughput_baseline.record(pixels_per_second)
+                metrics.encode_prediction_ratio.observe(encode_wall / max(choice.predicted_seconds, 0.001))
+                encoder_model.record(choice.preset, threads, pixel_rate * duration, encode_wall)
+            metrics.output_size_ratio.observe(output_size / TARGET_SIZE_BYTES)
+            progress.size_report = size_report(output_size, TARGET_SIZE_BYTES)
+            logger.info(f"Size report for task {task_id} (attempt {attempt}): {output_size/1024/1024:.2f}MB "
+                        f"vs {TARGET_SIZE_BYTES/1024/1024:.2f}MB target ({progress.size_report['error_percent']:+.2f}%)")
+            
+            if output_size <= MAX_DISCORD_SIZE:
+                logger.info(f"Video processing completed successfully for task {task_id}")
+                digest = digest or (ingest.hexdigest() if ingest and ingest.finished else None)
+                if digest:
+                    output_cache.put(cache_key(digest, encode_params), output_path)
+                progress.update(duration)
+                return True
+            
+            # Over Discord's limit: predict a bitrate from this attempt's actual size and re-encode
+            video_bitrate_bps = corrected_bitrate(video_bitrate_bps, audio_bitrate_bps, duration, output_size, TARGET_SIZE_BYTES)
+            if video_bitrate_bps < ABSOLUTE_MIN_VIDEO_BITRATE_BPS:
+                break
+            logger.info(f"Output over 10MB, re-encoding task {task_id} at {video_bitrate_bps/1024:.2f}kbps")
+        
+        error = f"File is over 10MB ({output_size/1024/1024:.2f}MB) and cannot be sent to Discord"
+        logger.error(f"Video processing failed for task {task_id}: {error}")
+        progress.fail(error)
+        return False
             
     except Exception as e:
         logger.error(f"Error processing video for task {task_id}: {str(e)}", exc_info=True)
@@ -445,6 +568,56 @@ def process_video_with_progress(input_path, output_path, task_id):
             tasks[task_id].fail(str(e))
         return False
 
+def run_ffmpeg(command, progress, duration, source=None, cancel=None):
+    """Run an ffmpeg command, feeding its -progress output into ``progress``.
+    
+    ``source`` is an optional iterable of input bytes written to ffmpeg's
+    stdin; ffmpeg is killed if the ``cancel`` event is set once it has been
+    fed in full. Returns a (returncode, error) tuple.
+    """
+    process = subprocess.Popen(command, stdin=subprocess.PIPE if source else subprocess.DEVNULL,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    metrics.ffmpeg_active.inc()
+    try:
+        return _follow_ffmpeg(process, progress, duration, source, cancel)
+    finally:
+        metrics.ffmpeg_active.dec()
+
+def _follow_ffmpeg(process, progress, duration, source, cancel=None):
+    """Feed ``source`` to a started ffmpeg, follow its progress and wait for it to exit."""
+    if source is not None:
+        def feed_stdin():
+            try:
+                for chunk in source:
+                    process.stdin.write(chunk)
+                if cancel is not None and cancel.is_set():
+                    logger.info("Stopping ffmpeg, its output is no longer needed")
+                    process.kill()
+            except (BrokenPipeError, IngestAborted) as e:
+                logger.error(f"Stopped feeding ffmpeg input: {str(e)}")
+            finally:
+                try:
+                    process.stdin.close()
+                except BrokenPipeError:
+                    pass
+        feeder_thread = threading.Thread(target=feed_stdin)
+        feeder_thread.daemon = True
+        feeder_thread.start()
+
+    # Keep only the tail of stderr for error reporting
+    stderr = StderrRing(process.stderr)
+    
+    # Parse FFmpeg progress output into structured samples
+    last = follow_progress(process.stdout, lambda sample: progress.update(sample.out_time), duration)
+    
+    process.wait()
+    if last:
+        logger.info(f"FFmpeg finished: {last.out_time:.1f}s encoded at {last.speed or 0:.2f}x, "
+                    f"{last.bitrate_kbps or 0:.0f}kbps, {(last.total_size or 0)/1024/1024:.2f}MB")
+    if process.returncode == 0:
+        return 0, None
+    return process.returncode, stderr.text() or "Unknown error"
+
 @app.route('/upvrt/tos')
 def tos():
     return render_template('tos.html', 
@@ -464,124 +637,599 @@ def health_check():
     """Health check endpoint"""
     return 'ok'
 
+@app.route('/upvrt/metrics')
+def metrics_endpoint():
+    """Prometheus metrics for this worker process."""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    logger.error(f"Upload rejected: larger than {MAX_UPLOAD_SIZE_MB}MB")
+    return f'Please upload videos under {MAX_UPLOAD_SIZE_MB}MB. Larger files may result in poor quality when compressed to a 10MB 720p file.', 413
+
+def run_job(task_id, task_dir, user_id, job, form_ready=None, ingest=None, encoded=False):
+    """Encode a task's upload and post it to Discord, journaling each stage.
+    
+    ``job`` holds the filename and channel; when the encode starts before
+    the upload finishes it is filled in later and ``form_ready`` is set.
+    A job resumed with ``encoded=True`` posts the existing output.
+    """
+    input_path = os.path.join(task_dir, 'input.mp4')
+    output_path = os.path.join(task_dir, 'output.mp4')
+    try:
+        if not encoded:
+            if not process_video_with_progress(input_path, output_path, task_id, threads=scheduler.threads_per_job, ingest=ingest):
+                journal.record(task_id, 'failed', error=tasks[task_id].error if task_id in tasks else None)
+                return
+            journal.record(task_id, 'encoded')
+        
+        if form_ready is not None:
+            form_ready.wait()
+        if job['error']:
+            return
+        if job.get('batch') is not None:
+            # Posted with the rest of the batch by whichever encode finishes last
+            tasks[task_id].set_stage('waiting', 100)
+            return
+        post_outputs(job['channel_id'], user_id, [(task_id, output_path, job['filename'])])
+        
+    except Exception as e:
+        logger.error(f"Error in process_and_upload: {str(e)}", exc_info=True)
+        tasks[task_id].fail(str(e))
+        journal.record(task_id, 'failed', error=str(e))
+    finally:
+        # Clean up files
+        if job.get('batch') is None:
+            scratch.release(task_id)
+        else:
+            finish_batch_item(job['batch'], task_id)
+
+def post_outputs(channel_id, user_id, outputs):
+    """Post encoded outputs in one Discord message and complete their tasks with its link.
+    
+    ``outputs`` lists ``(task_id, output_path, filename)``. A message Discord
+    rejects as too large is split in half and each half posted on its own.
+    """
+    for task_id, _, _ in outputs:
+        tasks[task_id].set_stage('posting', 0)
+    if len(outputs) == 1:
+        message = f"Here's your compressed video! <@{user_id}>"
+    else:
+        message = f"Here are your {len(outputs)} compressed videos! <@{user_id}>"
+    post_started = time.monotonic()
+    error = None
+    try:
+        message_data = discord_client.create_message_with_files(
+            channel_id, message, [(path, filename) for _, path, filename in outputs])
+        metrics.discord_posts.inc(status=200)
+    except requests.HTTPError as e:
+        metrics.discord_posts.inc(status=e.response.status_code)
+        if e.response.status_code in (403, 404):
+            # Channel was deleted or hidden since the dashboard listed it
+            channel_directory.invalidate()
+        error = e
+    except requests.RequestException:
+        metrics.discord_posts.inc(status='error')
+        raise
+    finally:
+        metrics.discord_post_seconds.observe(time.monotonic() - post_started)
+    
+    if error is not None:
+        if error.response.status_code == 413 and len(outputs) > 1:
+            logger.warning(f"Discord rejected {len(outputs)} attachments as too large, posting them in two messages")
+            half = len(outputs) // 2
+            post_outputs(channel_id, user_id, outputs[:half])
+            post_outputs(channel_id, user_id, outputs[half:])
+            return
+        for task_id, _, _ in outputs:
+            tasks[task_id].fail(f'Error uploading to Discord: {error.response.text}')
+            journal.record(task_id, 'failed', error=tasks[task_id].error)
+        return
+    
+    # Get message link
+    message_link = f"https://discord.com/channels/{GUILD_ID}/{channel_id}/{message_data['id']}"
+    for task_id, _, _ in outputs:
+        tasks[task_id].complete(message_link)
+        journal.record(task_id, 'posted', message_link=message_link)
+
+def finish_batch_item(batch, task_id):
+    """Note that one file of a batch is done, and post the batch once all of them are."""
+    progress = tasks.get(task_id)
+    ok = progress is not None and progress.status != 'failed'
+    if not ok:
+        scratch.release(task_id)
+    ready = batch.finish(task_id, ok)
+    if ready is None:
+        return
+    try:
+        messages = plan_messages(ready, max_bytes=MAX_DISCORD_SIZE)
+        logger.info(f"Posting batch {batch.batch_id}: {len(ready)} of {len(batch.items)} videos "
+                    f"in {len(messages)} message(s)")
+        for items in messages:
+            outputs = [(item.task_id, item.output_path, item.filename) for item in items]
+            try:
+                post_outputs(batch.channel_id, batch.user_id, outputs)
+            except Exception as e:
+                logger.error(f"Error posting batch {batch.batch_id}: {str(e)}", exc_info=True)
+                for item in items:
+                    tasks[item.task_id].fail(str(e))
+                    journal.record(item.task_id, 'failed', error=str(e))
+    finally:
+        for item in ready:
+            scratch.release(item.task_id)
+
+def resume_jobs(compact=True):
+    """Requeue jobs a previous worker left unfinished, from their last completed stage.
+    
+    Runs in each worker after it starts (see gunicorn.conf.py), and again
+    every RESCAN_SECONDS. A job is only taken by the worker that manages to
+    lock its scratch directory, so jobs still running in another worker are
+    left alone until that worker exits.
+    """
+    if compact:
+        journal.compact_logged()
+    resumed = []
+    resumed_batches = {}
+    for state in journal.unfinished():
+        task_dir = scratch.adopt(state.task_id)
+        if task_dir is None:
+            if scratch.locate(state.task_id) is None:
+                journal.record(state.task_id, 'failed', error='The upload was lost in a restart, please upload it again')
+            continue
+        data = state.data
+        encoded = state.stage == 'encoded' and os.path.exists(os.path.join(task_dir, 'output.mp4'))
+        if 'channel_id' not in data or state.resumes >= MAX_RESUMES or (
+                not encoded and not os.path.exists(os.path.join(task_dir, 'input.mp4'))):
+            error = ('Processing was interrupted too many times' if state.resumes >= MAX_RESUMES
+                     else 'The upload was lost in a restart, please upload it again')
+            journal.record(state.task_id, 'failed', error=error)
+            scratch.release(state.task_id)
+            continue
+        journal.record(state.task_id, 'resumed', from_stage=state.stage)
+        logger.info(f"Resuming task {state.task_id} after its {state.stage} stage"
+                    f"{', posting the existing output' if encoded else ''}")
+        job = {'filename': data.get('filename'), 'channel_id': data['channel_id'], 'error': None}
+        batch_id = data.get('batch_id')
+        if batch_id:
+            # Files of one batch are still posted together, once all of those resumed here are done
+            if batch_id not in resumed_batches:
+                resumed_batches[batch_id] = Batch(batch_id, data['channel_id'], data.get('user_id'))
+            job['batch'] = resumed_batches[batch_id]
+            job['batch'].add(state.task_id, job['filename'], os.path.join(task_dir, 'output.mp4'))
+        resumed.append((state, task_dir, job, encoded))
+    
+    # Every file is in its batch before any of them is queued, so none posts a batch early
+    for batch in resumed_batches.values():
+        batches.add(batch)
+    for state, task_dir, job, encoded in resumed:
+        tasks[state.task_id] = FFmpegProgress(status='queued')
+        scheduler.submit(state.task_id, run_job, state.task_id, task_dir, state.data.get('user_id'), job, None, None, encoded)
+    if resumed:
+        logger.info(f"Resumed {len(resumed)} unfinished job(s) from the journal"
+                    f"{f', in {len(resumed_batches)} batch(es)' if resumed_batches else ''}")
+    return len(resumed)
+
+def rescan_jobs(interval=RESCAN_SECONDS, stop=None):
+    """Keep looking for unfinished jobs to resume, in a background thread, until ``stop`` is set.
+    
+    During a graceful reload the old worker still holds its jobs' locks when
+    the new one starts, so they can only be taken over once it has exited.
+    """
+    stop = stop or threading.Event()
+    
+    def run():
+        while not stop.wait(interval):
+            try:
+                resume_jobs(compact=False)
+            except Exception as e:
+                logger.error(f"Rescanning the job journal failed: {str(e)}", exc_info=True)
+    thread = threading.Thread(target=run, name='job-rescan', daemon=True)
+    thread.start()
+    return thread
+
 @app.route('/upvrt/upload', methods=['POST'])
 @login_required
 def upload_video():
     logger.info(f"Upload attempt from user {current_user.id} ({current_user.name})")
-    if 'video' not in request.files:
-        logger.error("No video file in request")
-        return 'No video file uploaded', 400
+    
+    # Generate task ID up front so the upload is written straight into its own scratch directory
+    task_id = str(uuid.uuid4())
+    expected_bytes = (request.content_length or MAX_UPLOAD_BYTES) + 2 * MAX_DISCORD_SIZE
+    task_dir = scratch.create(task_id, expected_bytes)
+    input_path = os.path.join(task_dir, 'input.mp4')
+    
+    # Capture user ID before starting background thread
+    user_id = current_user.id
+    
+    # Filled in once the whole form has arrived; an early-started encode waits on it before posting
+    job = {'filename': None, 'channel_id': None, 'error': None}
+    form_ready = threading.Event()
+    
+    def process_and_upload(ingest):
+        run_job(task_id, task_dir, user_id, job, form_ready, ingest)
+    
+    def start_early(ingest):
+        # moov atom arrived ahead of the media data, so ffmpeg can start on the partial upload
+        logger.info(f"Upload for task {task_id} is streamable, queueing encode before the upload finishes")
+        tasks[task_id] = FFmpegProgress(status='queued')
+        scheduler.submit(task_id, process_and_upload, ingest)
+    
+    def reject(message, status=400):
+        logger.error(message)
+        metrics.uploads.inc(outcome='rejected')
+        ingest = request.ingest_file
+        if ingest and ingest.streamable:
+            # The early-started job owns the files and cleans them up
+            job['error'] = message
+            ingest.abort()
+            tasks[task_id].fail(message)
+            form_ready.set()
+        else:
+            if ingest:
+                ingest.abort()
+            scratch.release(task_id)
+        return message, status
+    
+    request.ingest_target = (input_path, MAX_UPLOAD_BYTES, start_early if STREAMING_ENCODE else None)
+    ingest_started = time.monotonic()
+    try:
+        has_video = 'video' in request.files
+    except Exception as e:
+        reject(f"Upload for task {task_id} did not complete: {str(e)}")
+        raise
+    metrics.upload_seconds.observe(time.monotonic() - ingest_started)
+    
+    if not has_video:
+        return reject("No video file uploaded")
         
     file = request.files['video']
     channel_id = request.form.get('channel_id')
     
     if not file or not channel_id:
-        logger.error("Missing required fields")
-        return 'Missing required fields', 400
+        return reject("Missing required fields")
         
     if not file.filename.endswith('.mp4'):
-        logger.error(f"Invalid file type: {file.filename}")
-        return 'Only MP4 files are allowed', 400
-        
-    filename = secure_filename(file.filename)
-    input_path = os.path.join(UPLOAD_FOLDER, filename)
-    output_path = os.path.join(UPLOAD_FOLDER, f'compressed_{filename}')
-    
-    logger.info(f"Saving uploaded file: {filename}")
-    file.save(input_path)
-    
-    # Check file size (100MB limit)
-    file_size = os.path.getsize(input_path)
-    logger.info(f"File size: {file_size / (1024*1024):.2f}MB")
-    if file_size > 100 * 1024 * 1024:
-        logger.error(f"File too large: {file_size / (1024*1024):.2f}MB")
-        os.remove(input_path)
-        return 'Please upload videos under 100MB. Larger files may result in poor quality when compressed to a 10MB 720p file.', 400
-    
-    # Generate task ID and start processing in background
-    task_id = str(uuid.uuid4())
-    logger.info(f"Starting task {task_id} for file {filename}")
+        return reject('Only MP4 files are allowed')
     
-    # Capture user ID before starting background thread
+    ingest = request.ingest_file
+    ingest.finish()
+    metrics.upload_bytes.inc(ingest.size)
+    metrics.uploads.inc(outcome='accepted')
+    job['filename'] = secure_filename(file.filename)
+    job['channel_id'] = channel_id
+    journal.record(task_id, 'uploaded', user_id=user_id, channel_id=channel_id, filename=job['filename'])
+    form_ready.set()
+    logger.info(f"Received {job['filename']} for task {task_id}: {ingest.size / (1024*1024):.2f}MB")
+    
+    if ingest.streamable and STREAMING_ENCODE:
+        queue_position = scheduler.position(task_id)
+    else:
+        # Hand the job to the transcode pool
+        tasks[task_id] = FFmpegProgress(status='queued')
+        queue_position = scheduler.submit(task_id, process_and_upload, ingest)
+    
+    return jsonify({'task_id': task_id, 'queue_position': queue_position})
+
+@app.route('/upvrt/upload/batch', methods=['POST'])
+@login_required
+def upload_batch():
+    """Accept several videos in one request; they are encoded together and posted in as few messages as fit."""
+    batch_id = str(uuid.uuid4())
     user_id = current_user.id
+    logger.info(f"Batch upload attempt from user {user_id} ({current_user.name})")
+    expected_bytes = min(request.content_length or MAX_UPLOAD_BYTES, MAX_UPLOAD_BYTES) + 2 * MAX_DISCORD_SIZE
+    created = []  # (task_id, task_dir) for each file part, in upload order
     
-    def process_and_upload():
-        try:
-            # Process video
-            if not process_video_with_progress(input_path, output_path, task_id):
-                return
-            
-            # Upload to Discord
-            tasks[task_id].set_stage('posting', 0)
-            headers = {
-                'Authorization': f'Bot {DISCORD_BOT_TOKEN}'
-            }
-            
-            with open(output_path, 'rb') as f:
-                files = {
-                    'file': (filename, f)
-                }
-                message = f"Here's your compressed video! <@{user_id}>"
-                response = requests.post(
-                    f'https://discord.com/api/channels/{channel_id}/messages',
-                    headers=headers,
-                    data={'content': message},
-                    files=files
-                )
-                
-                if response.status_code != 200:
-                    tasks[task_id].fail(f'Error uploading to Discord: {response.text}')
-                    return
-                
-                # Get message link
-                message_data = response.json()
-                message_link = f"https://discord.com/channels/{GUILD_ID}/{channel_id}/{message_data['id']}"
-                tasks[task_id].complete(message_link)
-            
-        except Exception as e:
-            logger.error(f"Error in process_and_upload: {str(e)}", exc_info=True)
-            tasks[task_id].fail(str(e))
-        finally:
-            # Clean up files
-            if os.path.exists(input_path):
-                os.remove(input_path)
-            if os.path.exists(output_path):
-                os.remove(output_path)
-    
-    # Start processing thread
-    thread = threading.Thread(target=process_and_upload)
-    thread.start()
+    def ingest_target(filename):
+        if len(created) >= BATCH_MAX_FILES:
+            raise BadRequest(f'Up to {BATCH_MAX_FILES} videos can be uploaded at once')
+        task_id = str(uuid.uuid4())
+        task_dir = scratch.create(task_id, expected_bytes)
+        created.append((task_id, task_dir))
+        return os.path.join(task_dir, 'input.mp4'), MAX_UPLOAD_BYTES
+    
+    def reject(message, status=400):
+        logger.error(message)
+        metrics.uploads.inc(outcome='rejected')
+        for ingest in request.ingest_files:
+            ingest.abort()
+        for task_id, _ in created:
+            scratch.release(task_id)
+        return message, status
+    
+    request.ingest_batch = ingest_target
+    request.body_limit = BATCH_MAX_UPLOAD_BYTES + 1024 * 1024
+    ingest_started = time.monotonic()
+    try:
+        files = request.files.getlist('videos')
+    except Exception as e:
+        reject(f"Batch upload {batch_id} did not complete: {str(e)}")
+        raise
+    metrics.upload_seconds.observe(time.monotonic() - ingest_started)
+    
+    channel_id = request.form.get('channel_id')
+    if not files or not channel_id:
+        return reject("Missing required fields")
+    if len(files) != len(created):
+        return reject("Only video files are allowed in a batch")
+    if not all(file.filename.endswith('.mp4') for file in files):
+        return reject('Only MP4 files are allowed')
+    
+    batch = Batch(batch_id, channel_id, user_id)
+    jobs = []
+    for file, ingest, (task_id, task_dir) in zip(files, request.ingest_files, created):
+        ingest.finish()
+        metrics.upload_bytes.inc(ingest.size)
+        filename = secure_filename(file.filename)
+        batch.add(task_id, filename, os.path.join(task_dir, 'output.mp4'))
+        journal.record(task_id, 'uploaded', user_id=user_id, channel_id=channel_id, filename=filename,
+                       batch_id=batch_id)
+        jobs.append((task_id, task_dir, ingest, {'filename': filename, 'channel_id': channel_id,
+                                                 'error': None, 'batch': batch}))
+    metrics.uploads.inc(len(jobs), outcome='accepted')
+    batches.add(batch)
+    logger.info(f"Received batch {batch_id}: {len(jobs)} videos, "
+                f"{sum(ingest.size for ingest in request.ingest_files) / (1024*1024):.2f}MB")
+    
+    queue_positions = []
+    for task_id, task_dir, ingest, job in jobs:
+        tasks[task_id] = FFmpegProgress(status='queued')
+        queue_positions.append(scheduler.submit(task_id, run_job, task_id, task_dir, user_id, job, None, ingest))
+    
+    return jsonify({'batch_id': batch_id, 'task_ids': batch.task_ids, 'queue_position': min(queue_positions)})
+
+@app.route('/upvrt/batch/<batch_id>')
+@login_required
+def get_batch_progress(batch_id):
+    """Combined progress of a batch, with each file's own progress under ``tasks``."""
+    batch = batches.get(batch_id)
+    if batch is not None:
+        task_ids = batch.task_ids
+    else:
+        # Started in another worker or before a restart
+        task_ids = [state.task_id for state in journal.jobs().values() if state.data.get('batch_id') == batch_id]
+    items = [(task_id, lookup_progress(task_id)) for task_id in task_ids]
+    items = [(task_id, progress) for task_id, progress in items if progress is not None]
+    if not items:
+        return jsonify({'error': 'Batch not found'}), 404
+    return jsonify(batch_payload([progress_payload(task_id, progress) for task_id, progress in items]))
+
+def batch_payload(payloads):
+    """Fold per-file progress payloads into one with the same keys, plus the files and message links."""
+    statuses = [payload['status'] for payload in payloads]
+    if all(status in ('completed', 'failed') for status in statuses):
+        status = 'failed' if all(status == 'failed' for status in statuses) else 'completed'
+    else:
+        status = 'queued' if all(status == 'queued' for status in statuses) else 'processing'
+    # The batch is only as far along as its slowest file
+    stages = ('queued', 'processing', 'waiting', 'posting', 'complete')
+    active = [payload['stage'] for payload in payloads if payload['stage'] in stages]
+    positions = [payload['queue_position'] for payload in payloads if payload['queue_position']]
+    starts = [payload['estimated_start'] for payload in payloads if payload['estimated_start']]
+    errors = [payload['error'] for payload in payloads if payload['error']]
+    links = list(dict.fromkeys(payload['message_link'] for payload in payloads if payload['message_link']))
+    return {
+        'status': status,
+        'stage': min(active, key=stages.index) if active else 'failed',
+        'percent': sum(100 if payload['status'] in ('completed', 'failed') else payload['percent']
+                       for payload in payloads) / len(payloads),
+        'error': '; '.join(errors) if errors else None,
+        'message_link': links[0] if links else None,
+        'message_links': links,
+        'queue_position': min(positions) if positions else None,
+        'estimated_start': max(starts) if starts else None,
+        'size_report': None,
+        'encoder': None,
+        'tasks': payloads
+    }
+
+@app.route('/upvrt/upload/chunked', methods=['POST'])
+@login_required
+def start_chunked_upload():
+    """Start an upload sent in numbered chunks, for connections that may drop part way through."""
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename')
+    channel_id = data.get('channel_id')
+    size = data.get('size')
+    if not filename or not channel_id or not isinstance(size, int) or size <= 0:
+        return "Missing required fields", 400
+    if not filename.endswith('.mp4'):
+        return 'Only MP4 files are allowed', 400
+    if size > MAX_UPLOAD_BYTES:
+        return upload_too_large(None)
+    
+    upload_id = str(uuid.uuid4())
+    # Left unlocked until finalize, so any worker can adopt it and the janitor clears it once abandoned
+    task_dir = scratch.create(upload_id, size + 2 * MAX_DISCORD_SIZE, lock=False)
+    upload = ChunkedUpload.create(task_dir, size, UPLOAD_CHUNK_BYTES, user_id=current_user.id,
+                                  channel_id=str(channel_id), filename=secure_filename(filename))
+    logger.info(f"Chunked upload {upload_id} started by user {current_user.id}: {filename}, "
+                f"{size / (1024*1024):.2f}MB in {upload.chunk_count} chunks")
+    return jsonify(chunked_upload_payload(upload_id, upload))
+
+@app.route('/upvrt/upload/chunked/<upload_id>')
+@login_required
+def get_chunked_upload(upload_id):
+    """Which chunks have arrived, so a client that lost its connection sends only the rest."""
+    upload = find_chunked_upload(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    return jsonify(chunked_upload_payload(upload_id, upload))
+
+@app.route('/upvrt/upload/chunked/<upload_id>/<int:index>', methods=['PUT'])
+@login_required
+def upload_chunk(upload_id, index):
+    """Store one chunk, checked against its SHA-256 in the X-Chunk-SHA256 header."""
+    upload = find_chunked_upload(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    try:
+        stored = upload.write_chunk(index, request.stream, request.headers.get('X-Chunk-SHA256'))
+    except ChunkRejected as e:
+        logger.warning(f"Chunk {index} of upload {upload_id} rejected: {str(e)}")
+        return str(e), e.status
+    if stored:
+        metrics.upload_bytes.inc(upload.chunk_length(index))
+    return jsonify({'index': index, 'stored': stored})
+
+@app.route('/upvrt/upload/chunked/<upload_id>/finalize', methods=['POST'])
+@login_required
+def finalize_chunked_upload(upload_id):
+    """Hand a fully received chunked upload to the transcode queue; its task ID is the upload ID."""
+    state = journal.get(upload_id)
+    if state is not None and state.data.get('user_id') == current_user.id:
+        # Already queued, so a retried finalize gets the same answer
+        return jsonify({'task_id': upload_id, 'queue_position': scheduler.position(upload_id)})
+    upload = find_chunked_upload(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    missing = upload.missing()
+    if missing:
+        return jsonify({'error': f'{len(missing)} chunks have not arrived', 'missing': missing}), 409
+    task_dir = scratch.adopt(upload_id)
+    if task_dir is None:
+        return jsonify({'error': 'Upload is already being finalized'}), 409
     
-    return jsonify({'task_id': task_id})
+    user_id = current_user.id
+    job = {'filename': upload.manifest['filename'], 'channel_id': upload.manifest['channel_id'], 'error': None}
+    metrics.uploads.inc(outcome='accepted')
+    journal.record(upload_id, 'uploaded', user_id=user_id, channel_id=job['channel_id'], filename=job['filename'])
+    logger.info(f"Received {job['filename']} for task {upload_id} in {upload.chunk_count} chunks: "
+                f"{upload.size / (1024*1024):.2f}MB")
+    tasks[upload_id] = FFmpegProgress(status='queued')
+    queue_position = scheduler.submit(upload_id, run_job, upload_id, task_dir, user_id, job)
+    return jsonify({'task_id': upload_id, 'queue_position': queue_position})
+
+def find_chunked_upload(upload_id):
+    """The signed-in user's chunked upload ``upload_id``, or None."""
+    try:
+        uuid.UUID(upload_id)
+    except ValueError:
+        return None
+    task_dir = scratch.locate(upload_id)
+    upload = ChunkedUpload.open(task_dir) if task_dir else None
+    if upload is None or upload.manifest.get('user_id') != current_user.id:
+        return None
+    return upload
+
+def chunked_upload_payload(upload_id, upload):
+    return {
+        'upload_id': upload_id,
+        'size': upload.size,
+        'chunk_size': upload.chunk_size,
+        'chunk_count': upload.chunk_count,
+        'received': upload.received()
+    }
 
 @app.route('/upvrt/progress/<task_id>')
 @login_required
 def get_progress(task_id):
     """Get the progress of a video processing task."""
-    if task_id not in tasks:
+    progress = lookup_progress(task_id)
+    if progress is None:
         return jsonify({'error': 'Task not found'}), 404
     
-    progress = tasks[task_id]
-    return jsonify({
+    return jsonify(progress_payload(task_id, progress))
+
+def lookup_progress(task_id):
+    """The task's progress, or one rebuilt from the job journal when this worker has no record of it."""
+    progress = tasks.get(task_id)
+    if progress is None:
+        state = journal.get(task_id)
+        if state is not None:
+            progress = state.to_progress()
+    return progress
+
+def progress_payload(task_id, progress):
+    """Build the JSON body shared by the progress poll and stream endpoints."""
+    estimated_start = scheduler.estimated_start(task_id)
+    return {
         'status': progress.status,
         'stage': progress.stage,
         'percent': progress.percent,
         'error': progress.error,
-        'message_link': progress.message_link
+        'message_link': progress.message_link,
+        'queue_position': scheduler.position(task_id),
+        'estimated_start': estimated_start.isoformat() if estimated_start else None,
+        'size_report': progress.size_report,
+        'encoder': progress.encoder
+    }
+
+@app.route('/upvrt/progress/<task_id>/stream')
+@login_required
+def stream_progress(task_id):
+    """Stream task progress as Server-Sent Events.
+
+    An event is sent when the stage or queue position changes or the percent
+    moves by at least PROGRESS_STREAM_CONFIG['step'], followed by a final
+    ``completed`` or ``failed`` event. The stream closes itself after
+    ``max_seconds`` so it never outlives a sync worker timeout; EventSource
+    reconnects and picks up the current state. Past ``max_clients`` open
+    streams the request gets a 503 and the dashboard polls instead.
+    """
+    if lookup_progress(task_id) is None:
+        return jsonify({'error': 'Task not found'}), 404
+    if not stream_slots.acquire(blocking=False):
+        return jsonify({'error': 'Too many progress streams, poll instead'}), 503, {'Retry-After': '5'}
+
+    def generate():
+        deadline = time.monotonic() + PROGRESS_STREAM_CONFIG['max_seconds']
+        last_sent = None
+        last_keepalive = time.monotonic()
+        yield f"retry: {PROGRESS_STREAM_CONFIG['retry_ms']}\n\n"
+        while time.monotonic() < deadline:
+            progress = lookup_progress(task_id)
+            if progress is None:
+                yield 'event: failed\ndata: {"status": "failed", "error": "Task not found"}\n\n'
+                return
+            payload = progress_payload(task_id, progress)
+            if progress.status in ('completed', 'failed'):
+                yield f"event: {progress.status}\ndata: {json.dumps(payload)}\n\n"
+                return
+            if (last_sent is None
+                    or payload['stage'] != last_sent['stage']
+                    or payload['queue_position'] != last_sent['queue_position']
+                    or abs(payload['percent'] - last_sent['percent']) >= PROGRESS_STREAM_CONFIG['step']):
+                yield f"event: progress\ndata: {json.dumps(payload)}\n\n"
+                last_sent = payload
+                last_keepalive = time.monotonic()
+            elif time.monotonic() - last_keepalive >= 15:
+                # Comment line keeps proxies from closing an idle stream
+                yield ': keepalive\n\n'
+                last_keepalive = time.monotonic()
+            time.sleep(PROGRESS_STREAM_CONFIG['interval'])
+
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
     })
+    # Runs however the stream ends, including a client that goes away
+    response.call_on_close(stream_slots.release)
+    return response
 
 @app.route('/static/favicon.png')
 @app.route('/static/favicon.ico')
 @app.route('/favicon.ico')
 @app.route('/favicon.png')
 def favicon():
-    """Redirect favicon requests to the static URL."""
-    return redirect(f"{app.config['STATIC_URL']}/favicon.png")
+    """Serve the favicon from static/ if present, otherwise redirect to the static URL."""
+    return favicon_response()
 
 @app.route('/upvrt/static/favicon.ico')
 def static_favicon():
-    """Redirect static favicon requests to the static URL."""
-    return redirect(f"{app.config['STATIC_URL']}/favicon.png")
+    """Same as favicon(), for the prefixed path."""
+    return favicon_response()
+
+def favicon_response():
+    asset, _ = static_assets.lookup('images/favicon.png')
+    if asset is not None:
+        return static_assets.response(asset, request)
+    response = redirect(static_assets.url('images/favicon.png'))
+    response.cache_control.public = True
+    response.cache_control.max_age = STATIC_MAX_AGE  # Browsers otherwise re-request it on every page
+    return response
 
 if __name__ == '__main__':
+    create_app()
+    resume_jobs()
     app.run(debug=True) 
\ No newline at end of file
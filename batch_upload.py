@@ -0,0 +1,97 @@
+import os
+import time
+import threading
+from dataclasses import dataclass
+
+# Discord allows at most 10 attachments on one message
+MAX_FILES = int(os.getenv('BATCH_MAX_FILES', 10))
+MAX_UPLOAD_BYTES = int(float(os.getenv('BATCH_MAX_UPLOAD_MB', 500)) * 1024 * 1024)
+
+
+@dataclass
+class BatchItem:
+    """One file of a batch and, once encoded, its output."""
+
+    task_id: str
+    filename: str
+    output_path: str
+    size: int = 0
+    done: bool = False
+    ok: bool = False
+
+
+class Batch:
+    """Files uploaded in one request, posted together once every encode has finished."""
+
+    def __init__(self, batch_id, channel_id, user_id):
+        self.batch_id = batch_id
+        self.channel_id = channel_id
+        self.user_id = user_id
+        self.created_at = time.time()
+        self.items = []
+        self._posted = False
+        self._lock = threading.Lock()
+
+    @property
+    def task_ids(self):
+        return [item.task_id for item in self.items]
+
+    def add(self, task_id, filename, output_path):
+        self.items.append(BatchItem(task_id, filename, output_path))
+
+    def finish(self, task_id, ok):
+        """Mark one item's encode as done.
+
+        Returns the items to post when this was the last one to finish, and
+        None otherwise, so exactly one caller posts the batch.
+        """
+        with self._lock:
+            item = next(item for item in self.items if item.task_id == task_id)
+            item.done = True
+            item.ok = ok and os.path.exists(item.output_path)
+            if item.ok:
+                item.size = os.path.getsize(item.output_path)
+            if self._posted or not all(item.done for item in self.items):
+                return None
+            self._posted = True
+            return [item for item in self.items if item.ok]
+
+
+def plan_messages(items, max_bytes, max_files=MAX_FILES):
+    """Group items into messages of at most ``max_bytes`` of attachments, as few as the limits allow.
+
+    First-fit decreasing on size; each message lists its items in upload order.
+    """
+    order = {id(item): index for index, item in enumerate(items)}
+    messages = []
+    for item in sorted(items, key=lambda item: item.size, reverse=True):
+        for message in messages:
+            if len(message) < max_files and sum(other.size for other in message) + item.size <= max_bytes:
+                message.append(item)
+                break
+        else:
+            messages.append([item])
+    for message in messages:
+        message.sort(key=lambda item: order[id(item)])
+    messages.sort(key=lambda message: order[id(message[0])])
+    return messages
+
+
+class BatchRegistry:
+    """Batches started in this worker, kept for ``ttl`` seconds for progress lookups."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._batches = {}
+        self._lock = threading.Lock()
+
+    def add(self, batch):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            for batch_id in [key for key, old in self._batches.items() if old.created_at < cutoff]:
+                del self._batches[batch_id]
+            self._batches[batch.batch_id] = batch
+
+    def get(self, batch_id):
+        with self._lock:
+            return self._batches.get(batch_id)
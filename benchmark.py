@@ -0,0 +1,243 @@
+"""Encode benchmark on synthetic clips.
+
+Fixtures are generated with ffmpeg's lavfi sources, so every machine encodes
+the same content. Each fixture is run through ``process_video_with_progress``
+in a fresh process and the results are compared with a stored baseline:
+
+    python benchmark.py                      # run everything, compare with the baseline
+    python benchmark.py --fixtures short_landscape_low
+    python benchmark.py --update-baseline    # record this machine's numbers as the baseline
+
+Exits with status 1 if any fixture regressed by more than the tolerance.
+"""
+import os
+import sys
+import json
+import time
+import resource
+import argparse
+import platform
+import subprocess
+import multiprocessing
+from dataclasses import dataclass
+
+from version import VERSION
+
+FIXTURE_DIR = os.getenv('BENCH_FIXTURE_DIR', os.path.join('uploads', 'bench-fixtures'))
+BASELINE_PATH = os.getenv('BENCH_BASELINE', 'benchmark_baseline.json')
+TOLERANCE = float(os.getenv('BENCH_TOLERANCE', 0.15))  # Allowed relative slowdown
+SIZE_TOLERANCE_POINTS = 5.0  # Allowed growth of the size error, in percentage points
+
+AUDIO_SOURCE = 'sine=frequency=440:sample_rate=48000'
+
+
+@dataclass(frozen=True)
+class Fixture:
+    """A synthetic input clip described as a lavfi video source."""
+
+    name: str
+    source: str  # lavfi source, without size, rate or duration
+    duration: int
+    width: int
+    height: int
+    rate: int = 30
+    filters: str = ''  # Extra video filters, e.g. noise for high motion
+
+    def command(self, path):
+        video = f'{self.source}=size={self.width}x{self.height}:rate={self.rate}'
+        if self.filters:
+            video += f',{self.filters}'
+        return [
+            'ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+            '-f', 'lavfi', '-i', video,
+            '-f', 'lavfi', '-i', AUDIO_SOURCE,
+            '-t', str(self.duration),
+            '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '18', '-pix_fmt', 'yuv420p',
+            '-c:a', 'aac', '-b:a', '192k',
+            '-movflags', '+faststart',
+            path
+        ]
+
+
+# Short and long, portrait and landscape, low and high motion
+FIXTURES = [
+    Fixture('short_landscape_low', 'testsrc2', 15, 1920, 1080),
+    Fixture('short_portrait_high', 'testsrc2', 15, 1080, 1920, filters='noise=alls=60:allf=t'),
+    Fixture('short_landscape_zoom', 'mandelbrot', 20, 1280, 720),
+    Fixture('long_landscape_high', 'testsrc2', 120, 1920, 1080, filters='noise=alls=40:allf=t'),
+    Fixture('long_portrait_low', 'testsrc2', 180, 720, 1280),
+    Fixture('long_portrait_zoom', 'mandelbrot', 90, 720, 1280, rate=60),
+]
+
+
+def fixture_path(fixture, directory=FIXTURE_DIR):
+    return os.path.join(directory, f'{fixture.name}.mp4')
+
+
+def generate_fixture(fixture, directory=FIXTURE_DIR):
+    """Render ``fixture`` once; later runs reuse the file."""
+    path = fixture_path(fixture, directory)
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        temp_path = f'{path}.tmp.mp4'
+        subprocess.run(fixture.command(temp_path), check=True)
+        os.replace(temp_path, path)
+    return path
+
+
+def generate_watermark(directory=FIXTURE_DIR):
+    """A plain semi-transparent PNG for machines without the production watermark."""
+    path = os.path.join(directory, 'watermark.png')
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        subprocess.run([
+            'ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+            '-f', 'lavfi', '-i', 'color=c=white@0.5:size=320x180,format=rgba',
+            '-frames:v', '1', path
+        ], check=True)
+    return path
+
+
+def _usage():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    peak = max(own.ru_maxrss, children.ru_maxrss) * scale
+    return cpu, peak
+
+
+def _run_in_worker(input_path, output_path, watermark, duration):
+    # Runs in a fresh process so CPU time and peak RSS belong to this fixture only
+    import app
+    import metrics
+    from encoder_policy import EncoderPolicy
+    app.create_app()
+    app.output_cache.max_bytes = 0  # Always encode, never reuse an earlier result
+    # The same preset and threads on every run, whatever the host has learned, so results compare
+    app.encoder_policy = EncoderPolicy(app.encoder_model, fixed_preset=os.getenv('ENCODE_PRESET') or 'fast',
+                                       max_threads=app.scheduler.threads_per_job)
+    if watermark:
+        app.WATERMARK_PATH = watermark
+    task_id = f'bench-{os.path.basename(input_path)}'
+    cpu_before, _ = _usage()
+    started = time.monotonic()
+    ok = app.process_video_with_progress(input_path, output_path, task_id, threads=app.scheduler.threads_per_job)
+    wall = time.monotonic() - started
+    cpu_after, peak = _usage()
+    size = os.path.getsize(output_path) if ok else None
+    return {
+        'ok': ok,
+        'wall_seconds': round(wall, 3),
+        'cpu_seconds': round(cpu_after - cpu_before, 3),
+        'peak_rss_mb': round(peak / 1024 / 1024, 1),
+        'realtime_factor': round(duration / wall, 3) if wall else None,
+        'attempts': metrics.encode_seconds.count(),
+        'output_bytes': size,
+        'size_error_percent': round((size - app.TARGET_SIZE_BYTES) / app.TARGET_SIZE_BYTES * 100, 2) if size else None,
+    }
+
+
+def run_fixture(fixture, directory=FIXTURE_DIR, watermark=None):
+    """Encode one fixture in a fresh process and return its measurements."""
+    input_path = generate_fixture(fixture, directory)
+    output_path = os.path.join(directory, f'{fixture.name}.out.mp4')
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1) as pool:
+        result = pool.apply(_run_in_worker, (input_path, output_path, watermark, fixture.duration))
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    return result
+
+
+def compare(results, baseline, tolerance=TOLERANCE, size_points=SIZE_TOLERANCE_POINTS):
+    """List every way ``results`` is worse than ``baseline``; empty means no regression."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if base['ok'] and not result['ok']:
+            regressions.append(f'{name}: encode failed')
+            continue
+        if not result['ok']:
+            continue
+        for key in ('wall_seconds', 'cpu_seconds', 'peak_rss_mb'):
+            if base.get(key) and result[key] > base[key] * (1 + tolerance):
+                regressions.append(f'{name}: {key} {result[key]} vs baseline {base[key]}')
+        if base.get('realtime_factor') and result['realtime_factor'] < base['realtime_factor'] * (1 - tolerance):
+            regressions.append(f"{name}: realtime_factor {result['realtime_factor']} "
+                               f"vs baseline {base['realtime_factor']}")
+        if base.get('size_error_percent') is not None:
+            if abs(result['size_error_percent']) > abs(base['size_error_percent']) + size_points:
+                regressions.append(f"{name}: size_error_percent {result['size_error_percent']} "
+                                   f"vs baseline {base['size_error_percent']}")
+    return regressions
+
+
+def ffmpeg_version():
+    try:
+        output = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.splitlines()[0] if output else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fixtures', nargs='+', choices=[f.name for f in FIXTURES],
+                        help='Fixtures to run (default: all)')
+    parser.add_argument('--output', default='bench_results.json', help='Where to write the results')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='Write the results to the baseline instead of comparing')
+    parser.add_argument('--fixture-dir', default=FIXTURE_DIR)
+    args = parser.parse_args(argv)
+
+    watermark = None
+    if not os.path.exists('/app/assets/watermark.png'):
+        watermark = generate_watermark(args.fixture_dir)
+
+    selected = [f for f in FIXTURES if not args.fixtures or f.name in args.fixtures]
+    results = {}
+    for fixture in selected:
+        print(f'{fixture.name}: {fixture.duration}s {fixture.width}x{fixture.height}@{fixture.rate} ...', flush=True)
+        results[fixture.name] = result = run_fixture(fixture, args.fixture_dir, watermark)
+        print(f"  {'ok' if result['ok'] else 'FAILED'} in {result['wall_seconds']}s "
+              f"({result['realtime_factor']}x realtime, {result['cpu_seconds']}s CPU, "
+              f"{result['peak_rss_mb']}MB peak), size error {result['size_error_percent']}%")
+
+    report = {
+        'version': VERSION,
+        'ffmpeg': ffmpeg_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Baseline written to {args.baseline}')
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f'No baseline at {args.baseline}; run with --update-baseline to record one')
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('cpu_count') != report['cpu_count']:
+        print(f"Warning: baseline was recorded on {baseline.get('cpu_count')} CPUs, this machine has {report['cpu_count']}")
+    regressions = compare(results, baseline['results'], args.tolerance)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    if not regressions:
+        print(f'No regressions against {args.baseline} (tolerance {args.tolerance:.0%})')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
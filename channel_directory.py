@@ -0,0 +1,79 @@
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+TEXT_CHANNEL = 0
+
+
+class ChannelDirectory:
+    """In-memory list of a guild's text channels with stale-while-revalidate refresh.
+
+    Fresh entries are served straight from memory. Once ``ttl`` has passed
+    the stale list is still served while one background thread fetches a
+    new one; only an empty or invalidated directory blocks on Discord.
+    After a failed fetch, Discord is not asked again for ``retry_after``
+    seconds, so an outage does not make every read wait on it.
+    """
+
+    def __init__(self, fetch, ttl=300, retry_after=30):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self._channels = None
+        self._fetched_at = 0.0
+        self._failed_at = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def get(self):
+        """Return the cached text channels, refreshing as needed."""
+        channels = self._channels
+        now = time.monotonic()
+        if self._failed_at is not None and now - self._failed_at < self.retry_after:
+            return channels or []
+        if channels is None:
+            return self.refresh()
+        if now - self._fetched_at >= self.ttl:
+            self._refresh_in_background()
+        return channels
+
+    def refresh(self):
+        """Fetch the channel list now and return it; keeps the old list on failure."""
+        try:
+            channels = [c for c in self.fetch() if c.get('type') == TEXT_CHANNEL]
+        except Exception as e:
+            logger.error(f"Error fetching channel list, retrying in {self.retry_after}s at the earliest: {str(e)}")
+            self._failed_at = time.monotonic()
+            return self._channels or []
+        with self._lock:
+            self._channels = channels
+            self._fetched_at = time.monotonic()
+            self._failed_at = None
+        return channels
+
+    def invalidate(self, drop=False):
+        """Force the next read to revalidate, e.g. after a channel was created or deleted.
+
+        With ``drop`` the cached list is discarded and the next read waits
+        for Discord instead of serving the stale copy.
+        """
+        with self._lock:
+            self._fetched_at = 0.0
+            self._failed_at = None
+            if drop:
+                self._channels = None
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self._refreshing = False
+        threading.Thread(target=run, daemon=True).start()
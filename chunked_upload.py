@@ -0,0 +1,157 @@
+import os
+import re
+import json
+import fcntl
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = int(float(os.getenv('CHUNKED_UPLOAD_CHUNK_MB', 8)) * 1024 * 1024)
+MANIFEST_NAME = 'upload.json'
+CHUNKS_DIR = 'chunks'
+READ_SIZE = 256 * 1024
+SHA256_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+
+class ChunkRejected(ValueError):
+    """A chunk that was not stored; ``status`` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class ChunkedUpload:
+    """An upload sent as numbered chunks, written in place into the task's input file.
+
+    The input is sized up front and each chunk is written at its own offset,
+    so chunks can arrive in any order and in parallel, and nothing is copied
+    when the last one lands. The manifest and a marker per verified chunk
+    sit next to the input in the scratch directory, so every worker on the
+    host sees the same state. A chunk is written at most once: a repeat with
+    the same SHA-256 is acknowledged without reading its body.
+    """
+
+    def __init__(self, path, manifest):
+        self.path = path
+        self.manifest = manifest
+        self.input_path = os.path.join(path, 'input.mp4')
+
+    @classmethod
+    def create(cls, path, size, chunk_size=CHUNK_SIZE, **fields):
+        """Start an upload of ``size`` bytes in ``path``; ``fields`` are kept in the manifest."""
+        manifest = dict(fields, size=size, chunk_size=chunk_size)
+        os.makedirs(os.path.join(path, CHUNKS_DIR), exist_ok=True)
+        with open(os.path.join(path, 'input.mp4'), 'wb') as f:
+            f.truncate(size)
+        temp_path = os.path.join(path, MANIFEST_NAME + '.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, os.path.join(path, MANIFEST_NAME))
+        return cls(path, manifest)
+
+    @classmethod
+    def open(cls, path):
+        """The upload in ``path``, or None if there is none."""
+        try:
+            with open(os.path.join(path, MANIFEST_NAME)) as f:
+                return cls(path, json.load(f))
+        except (OSError, ValueError):
+            return None
+
+    @property
+    def size(self):
+        return self.manifest['size']
+
+    @property
+    def chunk_size(self):
+        return self.manifest['chunk_size']
+
+    @property
+    def chunk_count(self):
+        return max(1, -(-self.size // self.chunk_size))
+
+    def chunk_length(self, index):
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+    def received(self):
+        """Indexes of the chunks stored so far, in order."""
+        try:
+            names = os.listdir(os.path.join(self.path, CHUNKS_DIR))
+        except OSError:
+            return []
+        return sorted(int(name) for name in names if name.isdigit())
+
+    def missing(self):
+        received = set(self.received())
+        return [index for index in range(self.chunk_count) if index not in received]
+
+    def _marker(self, index):
+        return os.path.join(self.path, CHUNKS_DIR, str(index))
+
+    def _recorded_hash(self, index):
+        try:
+            with open(self._marker(index)) as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def write_chunk(self, index, stream, sha256):
+        """Store chunk ``index`` read from ``stream`` if it matches ``sha256``.
+
+        Returns False, without reading ``stream``, when the chunk is already
+        stored with that hash. Raises ChunkRejected otherwise.
+        """
+        if not 0 <= index < self.chunk_count:
+            raise ChunkRejected(f'Chunk {index} is out of range, the upload has {self.chunk_count} chunks')
+        sha256 = (sha256 or '').lower()
+        if not SHA256_PATTERN.fullmatch(sha256):
+            raise ChunkRejected('The X-Chunk-SHA256 header must carry the chunk\'s SHA-256')
+        length = self.chunk_length(index)
+        offset = index * self.chunk_size
+        try:
+            lock = open(self._marker(index) + '.lock', 'w')
+        except FileNotFoundError:
+            # Removed by the scratch janitor after sitting idle
+            raise ChunkRejected('Upload not found', 404)
+        with lock:
+            # Retries of one chunk may race each other, in this worker or another
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            recorded = self._recorded_hash(index)
+            if recorded is not None:
+                if recorded != sha256:
+                    raise ChunkRejected(f'Chunk {index} was already received with different content', 409)
+                return False
+
+            digest = hashlib.sha256()
+            written = 0
+            fd = os.open(self.input_path, os.O_WRONLY)
+            try:
+                while written < length:
+                    data = stream.read(min(READ_SIZE, length - written))
+                    if not data:
+                        break
+                    digest.update(data)
+                    view = memoryview(data)
+                    while view:
+                        count = os.pwrite(fd, view, offset + written)
+                        view = view[count:]
+                        written += count
+            finally:
+                os.close(fd)
+            if written != length:
+                raise ChunkRejected(f'Chunk {index} should be {length} bytes, got {written}')
+            if digest.hexdigest() != sha256:
+                raise ChunkRejected(f'Chunk {index} does not match its SHA-256, please send it again')
+
+            temp_path = self._marker(index) + '.tmp'
+            with open(temp_path, 'w') as f:
+                f.write(sha256)
+            os.replace(temp_path, self._marker(index))
+        # Restarts the idle time after which the scratch janitor drops an unfinished upload
+        try:
+            os.utime(self.path)
+        except FileNotFoundError:
+            pass
+        return True
@@ -0,0 +1,285 @@
+import os
+import re
+import time
+import uuid
+import random
+import threading
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+API_BASE = os.getenv('DISCORD_API_BASE', 'https://discord.com/api')
+POOL_SIZE = int(os.getenv('DISCORD_POOL_SIZE', 10))
+TIMEOUT = (5, float(os.getenv('DISCORD_TIMEOUT', 60)))  # (connect, read) seconds
+MAX_RETRIES = int(os.getenv('DISCORD_MAX_RETRIES', 3))
+BACKOFF_SECONDS = 0.5
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Route parameters that get their own rate limit bucket on Discord's side
+MAJOR_PARAMETERS = ('channel_id', 'guild_id', 'webhook_id')
+
+
+def create_session():
+    """HTTP session with keep-alive connections shared by every Discord call."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+session = create_session()
+
+
+class MultipartFileBody:
+    """multipart/form-data body that reads its attachments from disk as it is sent.
+
+    requests sends any object with ``read`` and ``__len__`` as a streamed
+    body with a Content-Length, so a 10MB video is never held in memory.
+    ``files`` lists further ``(field, path, filename)`` attachments.
+    """
+
+    def __init__(self, fields, file_field=None, file_path=None, filename=None, content_type='video/mp4', files=()):
+        self.boundary = uuid.uuid4().hex
+        attachments = ([(file_field, file_path, filename)] if file_path else []) + list(files)
+        head = b''.join(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+            for name, value in fields.items()
+        )
+        # Byte strings are sent as they are; paths are read from disk
+        self._parts = []
+        for field, path, name in attachments:
+            head += (f'--{self.boundary}\r\nContent-Disposition: form-data; name="{field}"; '
+                     f'filename="{name}"\r\nContent-Type: {content_type}\r\n\r\n').encode()
+            self._parts += [head, path]
+            head = b'\r\n'
+        self._parts.append(head + f'--{self.boundary}--\r\n'.encode())
+        self._length = sum(len(part) if isinstance(part, bytes) else os.path.getsize(part) for part in self._parts)
+        self._file = None
+        self._index = 0
+        self._offset = 0
+
+    @property
+    def content_type(self):
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        size = UPLOAD_CHUNK_SIZE if size is None or size < 0 else size
+        while self._index < len(self._parts):
+            part = self._parts[self._index]
+            if not isinstance(part, bytes):
+                if self._file is None:
+                    self._file = open(part, 'rb')
+                data = self._file.read(size)
+                if data:
+                    return data
+                self._file.close()
+                self._file = None
+            else:
+                data = part[self._offset:self._offset + size]
+                self._offset += len(data)
+                if data:
+                    return data
+            self._index += 1
+            self._offset = 0
+        return b''
+
+    def close(self):
+        if self._file is not None and not self._file.closed:
+            self._file.close()
+
+
+class RateLimitBucket:
+    """Remaining-request budget for one Discord rate limit bucket."""
+
+    __slots__ = ('remaining', 'reset_at', 'lock')
+
+    def __init__(self):
+        self.remaining = 1
+        self.reset_at = 0.0
+        self.lock = threading.Lock()
+
+
+class DiscordClient:
+    """Discord REST client with pooled connections, rate limit buckets and retries.
+
+    Before each request the route's bucket is checked and the caller sleeps
+    until it resets if it is exhausted, so bursts queue behind the limit
+    instead of collecting 429s. 429 and 5xx responses and connection errors
+    are retried up to ``max_retries`` times, honouring Retry-After for 429s
+    and backing off with jitter otherwise.
+    """
+
+    def __init__(self, bot_token=None, api_base=API_BASE, http=None, max_retries=MAX_RETRIES, timeout=TIMEOUT):
+        self.bot_token = bot_token
+        self.api_base = api_base.rstrip('/')
+        self.http = http or session
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._routes = {}  # route key -> bucket hash reported by Discord
+        self._buckets = {}
+        self._global_reset_at = 0.0
+        self._lock = threading.Lock()
+
+    def _route_key(self, method, route, params):
+        major = ':'.join(str(params[name]) for name in MAJOR_PARAMETERS if name in params)
+        return f'{method} {route} {major}'
+
+    def _bucket(self, route_key):
+        with self._lock:
+            key = self._routes.get(route_key, route_key)
+            if key not in self._buckets:
+                self._buckets[key] = RateLimitBucket()
+            return self._buckets[key]
+
+    def _wait_for_bucket(self, bucket):
+        while True:
+            now = time.monotonic()
+            with bucket.lock:
+                wait = max(self._global_reset_at - now, 0.0)
+                if not wait:
+                    if bucket.remaining > 0 or now >= bucket.reset_at:
+                        if now >= bucket.reset_at:
+                            bucket.remaining = max(bucket.remaining, 1)
+                        bucket.remaining -= 1
+                        return
+                    wait = bucket.reset_at - now
+            logger.info(f"Discord rate limit reached, waiting {wait:.2f}s")
+            time.sleep(wait)
+
+    def _update_bucket(self, route_key, bucket, response):
+        headers = response.headers
+        bucket_hash = headers.get('X-RateLimit-Bucket')
+        if bucket_hash:
+            with self._lock:
+                if self._routes.get(route_key) != bucket_hash:
+                    # Share state with every route Discord says lives in the same bucket
+                    self._routes[route_key] = bucket_hash
+                    bucket = self._buckets.setdefault(bucket_hash, bucket)
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset_after = headers.get('X-RateLimit-Reset-After')
+        with bucket.lock:
+            if remaining is not None:
+                bucket.remaining = int(remaining)
+            if reset_after is not None:
+                bucket.reset_at = time.monotonic() + float(reset_after)
+
+    def _retry_after(self, response):
+        try:
+            return float(response.json().get('retry_after'))
+        except (ValueError, TypeError, AttributeError):
+            return float(response.headers.get('Retry-After', 1))
+
+    def _backoff(self, attempt):
+        return BACKOFF_SECONDS * (2 ** attempt) + random.uniform(0, BACKOFF_SECONDS)
+
+    def request(self, method, route, auth=None, body_factory=None, **kwargs):
+        """Send a request to ``route`` (a path template such as ``/channels/{channel_id}``).
+
+        Path parameters are taken from ``kwargs`` by name; the rest are passed
+        to requests. ``body_factory`` builds a fresh body for each attempt.
+        Returns the final response, which may still be an error.
+        """
+        params = {name: kwargs.pop(name) for name in re.findall(r'{(\w+)}', route)}
+        url = self.api_base + route.format(**params)
+        route_key = self._route_key(method, route, params)
+        if auth:
+            # User tokens are rate limited separately from each other and from the bot
+            route_key += f' {hash(auth)}'
+        headers = kwargs.pop('headers', {})
+        # auth=None means the bot token; auth=False sends no Authorization header
+        if auth is None and self.bot_token:
+            headers['Authorization'] = f'Bot {self.bot_token}'
+        elif auth:
+            headers['Authorization'] = auth
+
+        for attempt in range(self.max_retries + 1):
+            bucket = self._bucket(route_key)
+            self._wait_for_bucket(bucket)
+            body = body_factory() if body_factory else None
+            if body is not None:
+                kwargs['data'] = body
+                headers['Content-Type'] = body.content_type
+            try:
+                response = self.http.request(method, url, headers=headers, timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"Discord {method} {route} failed ({str(e)}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+                continue
+            finally:
+                if body is not None:
+                    body.close()
+
+            self._update_bucket(route_key, bucket, response)
+            if response.status_code == 429:
+                delay = self._retry_after(response)
+                if response.headers.get('X-RateLimit-Global'):
+                    self._global_reset_at = time.monotonic() + delay
+            elif response.status_code >= 500:
+                delay = self._backoff(attempt)
+            else:
+                return response
+            if attempt == self.max_retries:
+                return response
+            logger.warning(f"Discord {method} {route} returned {response.status_code}, retrying in {delay:.2f}s")
+            time.sleep(delay)
+        return response
+
+    def _json(self, response):
+        response.raise_for_status()
+        return response.json()
+
+    def exchange_code(self, code, client_id, client_secret, redirect_uri, scope):
+        """Exchange an OAuth2 authorization code for tokens."""
+        return self._json(self.request('POST', '/oauth2/token', auth=False, data={
+            'client_id': client_id,
+            'client_secret': client_secret,
+            'grant_type': 'authorization_code',
+            'code': code,
+            'redirect_uri': redirect_uri,
+            'scope': scope
+        }))
+
+    def get_current_user(self, access_token):
+        return self._json(self.request('GET', '/users/@me', auth=f'Bearer {access_token}'))
+
+    def get_current_user_guild_member(self, access_token, guild_id):
+        """The user's member object in ``guild_id``, or None when they are not in it."""
+        response = self.request('GET', '/users/@me/guilds/{guild_id}/member',
+                                auth=f'Bearer {access_token}', guild_id=guild_id)
+        if response.status_code == 404:
+            return None
+        return self._json(response)
+
+    def get_guild_channels(self, guild_id):
+        return self._json(self.request('GET', '/guilds/{guild_id}/channels', guild_id=guild_id))
+
+    def create_message(self, channel_id, content, file_path=None, filename=None):
+        """Post a message, streaming an optional attachment from disk."""
+        if file_path is None:
+            return self._json(self.request('POST', '/channels/{channel_id}/messages',
+                                           channel_id=channel_id, json={'content': content}))
+        return self._json(self.request(
+            'POST', '/channels/{channel_id}/messages', channel_id=channel_id,
+            body_factory=lambda: MultipartFileBody({'content': content}, 'file', file_path,
+                                                   filename or os.path.basename(file_path))
+        ))
+
+    def create_message_with_files(self, channel_id, content, files):
+        """Post one message carrying several attachments, given as ``(path, filename)`` pairs."""
+        if len(files) == 1:
+            return self.create_message(channel_id, content, *files[0])
+        attachments = [(f'files[{index}]', path, filename or os.path.basename(path))
+                       for index, (path, filename) in enumerate(files)]
+        return self._json(self.request(
+            'POST', '/channels/{channel_id}/messages', channel_id=channel_id,
+            body_factory=lambda: MultipartFileBody({'content': content}, files=attachments)
+        ))
@@ -0,0 +1,209 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+import logging
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+# x264 presets from fastest to slowest
+PRESETS = ('ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium', 'slow', 'slower')
+# Typical x264 speed of each preset relative to fast, used until this host has measured it
+RELATIVE_SPEED = {'ultrafast': 4.5, 'superfast': 3.2, 'veryfast': 2.3, 'faster': 1.5, 'fast': 1.0,
+                  'medium': 0.75, 'slow': 0.45, 'slower': 0.2}
+# Output pixels per second one thread encodes with the fast preset before calibration, about 720p30 at 1.3x
+DEFAULT_PIXELS_PER_THREAD = 36e6
+THREAD_SCALING = 0.8  # x264 throughput grows with threads ** THREAD_SCALING
+MAX_THREADS = 16  # x264 gains little past this
+SMOOTHING = 0.3
+
+ENCODE_PRESET = os.getenv('ENCODE_PRESET', '')  # Fixes the preset, turning the policy off
+FASTEST_PRESET = os.getenv('ENCODE_PRESET_FASTEST', 'superfast')
+SLOWEST_PRESET = os.getenv('ENCODE_PRESET_SLOWEST', 'medium')
+TARGET_SECONDS = float(os.getenv('ENCODE_TARGET_SECONDS', 120))
+MODEL_PATH = os.getenv('ENCODER_MODEL_PATH', os.path.join('uploads', 'encoder_model.json'))
+
+
+class ThroughputModel:
+    """Encode speed of each preset on this host, in output pixels per second per thread.
+
+    Starts from typical ratios between x264 presets, is calibrated with
+    ``calibrate()`` and keeps learning from finished encodes. A preset this
+    host has not measured yet is scaled from the nearest one it has.
+    """
+
+    def __init__(self, path=MODEL_PATH):
+        self.path = path
+        self._speeds = None  # preset -> pixels per second per thread, read on first use
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._speeds is None:
+            self._speeds = {}
+            try:
+                with open(self.path) as f:
+                    speeds = json.load(f)['speeds']
+                self._speeds = {preset: float(speed) for preset, speed in speeds.items() if preset in RELATIVE_SPEED}
+            except (OSError, ValueError, KeyError, TypeError, AttributeError):
+                pass
+        return self._speeds
+
+    def measured(self):
+        with self._lock:
+            return dict(self._load())
+
+    def speed(self, preset):
+        speeds = self.measured()
+        if preset in speeds:
+            return speeds[preset]
+        if not speeds:
+            return DEFAULT_PIXELS_PER_THREAD * RELATIVE_SPEED[preset]
+        nearest = min(speeds, key=lambda known: abs(PRESETS.index(known) - PRESETS.index(preset)))
+        return speeds[nearest] * RELATIVE_SPEED[preset] / RELATIVE_SPEED[nearest]
+
+    def predict_seconds(self, preset, threads, pixels):
+        """Wall seconds to encode ``pixels`` output pixels with ``preset`` on ``threads`` threads."""
+        return pixels / (self.speed(preset) * threads ** THREAD_SCALING)
+
+    def record(self, preset, threads, pixels, seconds, replace=False):
+        """Fold a finished encode into the preset's speed, or replace it, and save the model."""
+        measured = pixels / max(seconds, 0.001) / threads ** THREAD_SCALING
+        with self._lock:
+            speeds = self._load()
+            known = None if replace else speeds.get(preset)
+            speeds[preset] = measured if known is None else known + SMOOTHING * (measured - known)
+            snapshot = dict(speeds)
+        self._save(snapshot)
+
+    def _save(self, speeds):
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            temp_path = f'{self.path}.{os.getpid()}.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump({'speeds': speeds, 'updated': time.time()}, f, indent=2)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save the encoder model to {self.path}: {e}")
+
+
+@dataclass(frozen=True)
+class EncoderChoice:
+    preset: str
+    threads: int
+    predicted_seconds: float
+    budget_seconds: float
+    reason: str
+
+    def to_dict(self):
+        return {
+            'preset': self.preset,
+            'threads': self.threads,
+            'predicted_seconds': round(self.predicted_seconds, 1),
+            'budget_seconds': round(self.budget_seconds, 1),
+            'reason': self.reason
+        }
+
+
+class EncoderPolicy:
+    """Picks the x264 preset and thread count for each encode.
+
+    Each encode gets a share of ``target_seconds``: with ``queued`` jobs
+    waiting on ``slots`` slots, the last of them starts after about
+    ``queued / slots`` encodes, so the budget is ``target / (1 + queued /
+    slots)``. The slowest allowed preset predicted to finish within it is
+    used, as slower presets compress better at the same bitrate. With no
+    queue, a job may also use the share of cores of each slot left idle;
+    the scheduler caps that so running jobs never hold more than the cores.
+    """
+
+    def __init__(self, model, fastest=FASTEST_PRESET, slowest=SLOWEST_PRESET, target_seconds=TARGET_SECONDS,
+                 fixed_preset=ENCODE_PRESET, cpu_count=None, max_threads=MAX_THREADS):
+        self.model = model
+        self.presets = PRESETS[PRESETS.index(fastest):PRESETS.index(slowest) + 1]
+        if not self.presets:
+            raise ValueError(f'ENCODE_PRESET_FASTEST ({fastest}) is slower than ENCODE_PRESET_SLOWEST ({slowest})')
+        self.target_seconds = target_seconds
+        self.fixed_preset = fixed_preset
+        self.cpu_count = cpu_count or os.cpu_count() or 1
+        self.max_threads = max_threads
+
+    def threads(self, load, threads_per_job):
+        """Threads wanted by a job: its slot's share of the cores plus that of each idle slot."""
+        slots = max(load['slots'], 1)
+        if load['queued'] or load['running'] >= slots:
+            return threads_per_job
+        idle = slots - max(load['running'], 1)
+        return max(threads_per_job, min(self.max_threads, self.cpu_count // slots * (idle + 1)))
+
+    def choose(self, duration, pixel_rate, load, threads_per_job, processes=1, threads=None):
+        """Choose for a clip of ``duration`` seconds at ``pixel_rate`` output pixels per second.
+
+        ``load`` is the scheduler's ``stats()``, counting this job as running.
+        ``processes`` above 1 means a segmented encode, which already spreads
+        over the cores with ``threads_per_job`` threads per process.
+        ``threads`` is the count the scheduler granted, when it has claimed.
+        """
+        if threads is None:
+            threads = threads_per_job if processes > 1 else self.threads(load, threads_per_job)
+        pixels = duration * pixel_rate / processes
+        budget = self.target_seconds / (1 + load['queued'] / max(load['slots'], 1))
+
+        def predict(preset):
+            return self.model.predict_seconds(preset, threads, pixels)
+
+        if self.fixed_preset:
+            return EncoderChoice(self.fixed_preset, threads, predict(self.fixed_preset), budget, 'fixed')
+        for preset in reversed(self.presets):
+            predicted = predict(preset)
+            if predicted <= budget:
+                return EncoderChoice(preset, threads, predicted, budget, 'within budget')
+        return EncoderChoice(self.presets[0], threads, predict(self.presets[0]), budget, 'over budget')
+
+
+def calibration_command(preset, threads, seconds, width=1280, height=720, rate=30):
+    return [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+        '-f', 'lavfi', '-i', f'testsrc2=size={width}x{height}:rate={rate},noise=alls=20:allf=t',
+        '-t', str(seconds),
+        '-c:v', 'libx264', '-preset', preset, '-profile:v', 'baseline', '-b:v', '1500k',
+        '-threads', str(threads),
+        '-f', 'null', '-'
+    ]
+
+
+def calibrate(model, presets=PRESETS, threads=None, seconds=10, width=1280, height=720, rate=30):
+    """Time a synthetic encode with each preset and record it; returns {preset: realtime factor}."""
+    threads = threads or max(1, os.cpu_count() or 1)
+    factors = {}
+    for preset in presets:
+        started = time.monotonic()
+        subprocess.run(calibration_command(preset, threads, seconds, width, height, rate), check=True)
+        wall = time.monotonic() - started
+        model.record(preset, threads, width * height * rate * seconds, wall, replace=True)
+        factors[preset] = seconds / wall
+    return factors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the speed of each x264 preset on this host')
+    parser.add_argument('--threads', type=int, help='Threads per encode (default: all cores)')
+    parser.add_argument('--seconds', type=int, default=10, help='Length of the synthetic 720p30 clip')
+    parser.add_argument('--presets', nargs='+', choices=PRESETS, default=list(PRESETS))
+    parser.add_argument('--model', default=MODEL_PATH)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    factors = calibrate(ThroughputModel(args.model), args.presets, args.threads, args.seconds)
+    for preset, factor in factors.items():
+        print(f'{preset:>10}: {factor:.2f}x realtime')
+    print(f'Model written to {args.model}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
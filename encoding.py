@@ -0,0 +1,60 @@
+import os
+
+# Audio bitrates tried in order until the video share clears the quality floor
+AUDIO_BITRATES_BPS = (96 * 1024, 64 * 1024, 48 * 1024)
+MIN_VIDEO_BITRATE_BPS = 300 * 1024  # Below this quality drops off quickly
+ABSOLUTE_MIN_VIDEO_BITRATE_BPS = 64 * 1024  # Below this the clip is not worth encoding
+CONTAINER_OVERHEAD = 0.02  # MP4 headers and interleaving
+
+ENCODE_MODE = os.getenv('ENCODE_MODE', 'vbv')  # vbv or abr
+VBV_BUFFER_SECONDS = float(os.getenv('VBV_BUFFER_SECONDS', 2.0))
+ENCODE_MAX_ATTEMPTS = max(1, int(os.getenv('ENCODE_MAX_ATTEMPTS', 2)))  # The first encode always runs
+CORRECTION_MARGIN = 0.97  # Aim a little under target on the corrective pass
+
+
+def plan_bitrates(duration, target_bytes, mode=None):
+    """Split the size budget into (video_bps, audio_bps), or None if it cannot fit.
+
+    In ``vbv`` mode the video rate is also capped with maxrate/bufsize, which
+    can let up to one buffer's worth of extra bits through, so the buffer is
+    taken out of the budget up front.
+    """
+    mode = mode or ENCODE_MODE
+    budget_bits = target_bytes * 8 * (1 - CONTAINER_OVERHEAD)
+    buffer_seconds = VBV_BUFFER_SECONDS if mode == 'vbv' else 0
+    for audio_bps in AUDIO_BITRATES_BPS:
+        video_bps = int((budget_bits - audio_bps * duration) / (duration + buffer_seconds))
+        if video_bps >= MIN_VIDEO_BITRATE_BPS:
+            return video_bps, audio_bps
+    if video_bps < ABSOLUTE_MIN_VIDEO_BITRATE_BPS:
+        return None
+    return video_bps, AUDIO_BITRATES_BPS[-1]
+
+
+def rate_control_args(video_bps, mode=None):
+    """libx264 rate-control arguments for the chosen encode mode."""
+    mode = mode or ENCODE_MODE
+    args = ['-b:v', str(video_bps)]
+    if mode == 'vbv':
+        args += ['-maxrate', str(video_bps), '-bufsize', str(int(video_bps * VBV_BUFFER_SECONDS))]
+    return args
+
+
+def corrected_bitrate(video_bps, audio_bps, duration, output_bytes, target_bytes):
+    """Predict the video bitrate that lands under target from a previous attempt's size.
+
+    Audio is encoded at a fixed rate, so only the video share of the output
+    is scaled.
+    """
+    audio_bytes = audio_bps * duration / 8
+    video_bytes = max(output_bytes - audio_bytes, 1)
+    return int(video_bps * (target_bytes - audio_bytes) / video_bytes * CORRECTION_MARGIN)
+
+
+def size_report(output_bytes, target_bytes):
+    """How far an encode landed from the target size."""
+    return {
+        'output_bytes': output_bytes,
+        'target_bytes': int(target_bytes),
+        'error_percent': round((output_bytes - target_bytes) / target_bytes * 100, 2)
+    }
@@ -0,0 +1,86 @@
+import os
+from dataclasses import dataclass
+
+# Output boxes as (long edge, short edge), best first; the source is fitted inside one
+RUNGS = ((1280, 720), (960, 540), (854, 480), (640, 360), (426, 240))
+# Frame rates tried on the smallest rung when even it is starved of bits
+FALLBACK_FRAME_RATES = (24, 15)
+DEFAULT_FRAME_RATE = 30
+
+MIN_BITS_PER_PIXEL = float(os.getenv('LADDER_MIN_BITS_PER_PIXEL', 0.05))
+MAX_FRAME_RATE = float(os.getenv('MAX_OUTPUT_FPS', DEFAULT_FRAME_RATE))
+WATERMARK_WIDTH_FRACTION = 0.2
+
+
+@dataclass(frozen=True)
+class Rendition:
+    """Output size and frame rate chosen for an encode."""
+
+    width: int
+    height: int
+    frame_rate: float
+    bits_per_pixel: float
+
+    @property
+    def scale(self):
+        return f'{self.width}:{self.height}'
+
+    @property
+    def watermark_size(self):
+        """Watermark overlay (width, height): a fifth of the output width at 16:9."""
+        width = _even(self.width * WATERMARK_WIDTH_FRACTION)
+        return width, _even(width * 9 / 16)
+
+
+def _even(value):
+    # libx264 with yuv420p needs even dimensions
+    return max(2, int(round(value / 2)) * 2)
+
+
+def _fit(width, height, long_edge, short_edge):
+    """Largest size with the source aspect ratio inside the box, never upscaled."""
+    box_width, box_height = (short_edge, long_edge) if height > width else (long_edge, short_edge)
+    factor = min(box_width / width, box_height / height, 1.0)
+    return _even(width * factor), _even(height * factor)
+
+
+def bits_per_pixel(video_bps, width, height, frame_rate):
+    return video_bps / (width * height * frame_rate)
+
+
+def choose_rendition(video_bps, width=None, height=None, frame_rate=None,
+                     min_bpp=None, max_frame_rate=None):
+    """Pick the output size and frame rate for a video bitrate budget.
+
+    Walks down the ladder until a rung gets at least ``min_bpp`` bits per
+    pixel. If even the smallest rung does not, its frame rate is lowered
+    too. ``width`` and ``height`` are the displayed source size; without
+    them a 16:9 landscape source is assumed.
+    """
+    min_bpp = MIN_BITS_PER_PIXEL if min_bpp is None else min_bpp
+    max_frame_rate = max_frame_rate or MAX_FRAME_RATE
+    if not width or not height:
+        width, height = RUNGS[0]
+    rate = min(frame_rate or DEFAULT_FRAME_RATE, max_frame_rate)
+
+    sizes = []
+    for long_edge, short_edge in RUNGS:
+        size = _fit(width, height, long_edge, short_edge)
+        if size not in sizes:
+            sizes.append(size)
+    for output_width, output_height in sizes:
+        bpp = bits_per_pixel(video_bps, output_width, output_height, rate)
+        if bpp >= min_bpp:
+            return Rendition(output_width, output_height, rate, round(bpp, 4))
+
+    # Still starved at the smallest size: trade motion smoothness for detail
+    output_width, output_height = sizes[-1]
+    for fallback in FALLBACK_FRAME_RATES:
+        if fallback >= rate:
+            continue
+        rate = fallback
+        bpp = bits_per_pixel(video_bps, output_width, output_height, rate)
+        if bpp >= min_bpp:
+            break
+    bpp = bits_per_pixel(video_bps, output_width, output_height, rate)
+    return Rendition(output_width, output_height, rate, round(bpp, 4))
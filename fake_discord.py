@@ -0,0 +1,206 @@
+"""Local stand-in for the Discord REST API, for load tests.
+
+Implements the endpoints the app calls: the OAuth token exchange,
+``/users/@me``, the user's guilds and guild membership, the guild's
+channels and posting a message with attachments. Any OAuth code is
+accepted and names the user, so a load driver can sign in as many users
+as it likes. Responses can be slowed down and rate limited:
+
+    python fake_discord.py --port 7100 --latency-ms 80 --jitter-ms 40 --inject-429 0.02
+
+and the app pointed at it:
+
+    DISCORD_API_BASE=http://127.0.0.1:7100/api GUILD_ID=1 DISCORD_BOT_TOKEN=fake gunicorn wsgi:app
+
+``GET /fake/stats`` returns request, 429 and attachment counts.
+"""
+import sys
+import zlib
+import time
+import random
+import argparse
+import threading
+import itertools
+from flask import Flask, jsonify, request
+
+MB = 1024 * 1024
+
+
+class Buckets:
+    """Fixed-window rate limit buckets keyed like Discord's: route plus major parameter and caller."""
+
+    def __init__(self, limit, reset_seconds):
+        self.limit = limit
+        self.reset_seconds = reset_seconds
+        self._windows = {}  # key -> (window start, used)
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """Use one request from ``key``'s bucket; returns (allowed, remaining, reset_after)."""
+        now = time.monotonic()
+        with self._lock:
+            started, used = self._windows.get(key, (now, 0))
+            if now - started >= self.reset_seconds:
+                started, used = now, 0
+            allowed = used < self.limit
+            if allowed:
+                used += 1
+            self._windows[key] = (started, used)
+        return allowed, max(self.limit - used, 0), max(self.reset_seconds - (now - started), 0.0)
+
+
+def create_fake_discord(guild_id='1', channel_count=3, latency_ms=0.0, jitter_ms=0.0, inject_429=0.0,
+                        bucket_limit=5, bucket_reset=1.0, max_file_bytes=10 * MB, max_request_bytes=25 * MB,
+                        max_attachments=10, seed=None):
+    app = Flask('fake_discord')
+    app.config['MAX_CONTENT_LENGTH'] = max_request_bytes
+    rng = random.Random(seed)
+    ids = itertools.count(1_000_000_000_000_000)
+    buckets = Buckets(bucket_limit, bucket_reset)
+    stats = {'requests': 0, 'rate_limited': 0, 'messages': 0, 'attachments': 0, 'attachment_bytes': 0,
+             'too_large': 0}
+    stats_lock = threading.Lock()
+    channels = [{'id': str(100 + index), 'name': f'channel-{index}', 'type': 0, 'position': index}
+                for index in range(channel_count)]
+
+    def count(key, amount=1):
+        with stats_lock:
+            stats[key] += amount
+
+    def user_for(token):
+        # Tokens are "fake-<code>", and the code names the user
+        name = token.split('fake-', 1)[-1] or 'user'
+        return {'id': str(10 ** 17 + zlib.crc32(name.encode())), 'username': name, 'discriminator': '0',
+                'avatar': None, 'global_name': name}
+
+    def bearer():
+        auth = request.headers.get('Authorization', '')
+        return auth[len('Bearer '):] if auth.startswith('Bearer ') else None
+
+    def error(status, message, code=0):
+        return jsonify({'message': message, 'code': code}), status
+
+    @app.before_request
+    def simulate():
+        if request.path.startswith('/fake/'):
+            return None
+        count('requests')
+        delay = latency_ms + rng.uniform(-jitter_ms, jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+        rule = request.url_rule.rule if request.url_rule else request.path
+        view_args = request.view_args or {}
+        major = view_args.get('channel_id') or view_args.get('guild') or ''
+        key = f"{request.method} {rule} {major} {request.headers.get('Authorization', '')}"
+        allowed, remaining, reset_after = buckets.take(key)
+        headers = {'X-RateLimit-Limit': str(bucket_limit), 'X-RateLimit-Remaining': str(remaining),
+                   'X-RateLimit-Reset-After': f'{reset_after:.3f}',
+                   'X-RateLimit-Bucket': f'{zlib.crc32(rule.encode()):08x}'}
+        request.environ['fake.ratelimit'] = headers
+        if not allowed or (inject_429 and rng.random() < inject_429):
+            count('rate_limited')
+            retry_after = reset_after if not allowed else rng.uniform(0.1, 0.5)
+            body = {'message': 'You are being rate limited.', 'retry_after': round(retry_after, 3), 'global': False}
+            return jsonify(body), 429, {**headers, 'Retry-After': f'{retry_after:.3f}', 'X-RateLimit-Scope': 'user'}
+        return None
+
+    @app.after_request
+    def rate_limit_headers(response):
+        for name, value in request.environ.get('fake.ratelimit', {}).items():
+            response.headers.setdefault(name, value)
+        return response
+
+    @app.errorhandler(413)
+    def too_large(e):
+        count('too_large')
+        return error(413, 'Request entity too large', 40005)
+
+    @app.route('/api/oauth2/token', methods=['POST'])
+    def token():
+        code = request.form.get('code')
+        if not code:
+            return error(400, 'invalid_grant')
+        return jsonify({'access_token': f'fake-{code}', 'token_type': 'Bearer', 'expires_in': 604800,
+                        'refresh_token': f'refresh-{code}', 'scope': request.form.get('scope', '')})
+
+    @app.route('/api/users/@me')
+    def current_user():
+        token = bearer()
+        if not token:
+            return error(401, '401: Unauthorized')
+        return jsonify(user_for(token))
+
+    @app.route('/api/users/@me/guilds')
+    def current_user_guilds():
+        if not bearer():
+            return error(401, '401: Unauthorized')
+        return jsonify([{'id': guild_id, 'name': 'Fake Guild', 'owner': False, 'permissions': '0'}])
+
+    @app.route('/api/users/@me/guilds/<guild>/member')
+    def current_user_member(guild):
+        token = bearer()
+        if not token:
+            return error(401, '401: Unauthorized')
+        if guild != guild_id or token.startswith('fake-outsider'):
+            return error(404, 'Unknown Guild', 10004)
+        return jsonify({'user': user_for(token), 'roles': [], 'joined_at': '2024-01-01T00:00:00+00:00'})
+
+    @app.route('/api/guilds/<guild>/channels')
+    def guild_channels(guild):
+        if guild != guild_id:
+            return error(404, 'Unknown Guild', 10004)
+        return jsonify(channels)
+
+    @app.route('/api/channels/<channel_id>/messages', methods=['POST'])
+    def create_message(channel_id):
+        if not any(channel['id'] == channel_id for channel in channels):
+            return error(404, 'Unknown Channel', 10003)
+        files = list(request.files.values())
+        if len(files) > max_attachments:
+            return error(400, f'Must be {max_attachments} or fewer in length.', 50035)
+        attachments = []
+        for file in files:
+            file.stream.seek(0, 2)
+            size = file.stream.tell()
+            if size > max_file_bytes:
+                count('too_large')
+                return error(413, 'Request entity too large', 40005)
+            attachments.append({'id': str(next(ids)), 'filename': file.filename, 'size': size})
+        count('messages')
+        count('attachments', len(attachments))
+        count('attachment_bytes', sum(attachment['size'] for attachment in attachments))
+        content = request.form.get('content') if files else (request.get_json(silent=True) or {}).get('content')
+        return jsonify({'id': str(next(ids)), 'channel_id': channel_id, 'content': content,
+                        'attachments': attachments})
+
+    @app.route('/fake/stats')
+    def fake_stats():
+        with stats_lock:
+            return jsonify(dict(stats))
+
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7100)
+    parser.add_argument('--guild-id', default='1')
+    parser.add_argument('--latency-ms', type=float, default=50, help='Added to every response')
+    parser.add_argument('--jitter-ms', type=float, default=20)
+    parser.add_argument('--inject-429', type=float, default=0.0, help='Fraction of requests answered with a 429')
+    parser.add_argument('--bucket-limit', type=int, default=5, help='Requests per route bucket per window')
+    parser.add_argument('--bucket-reset', type=float, default=1.0, help='Bucket window in seconds')
+    parser.add_argument('--max-file-mb', type=float, default=10)
+    parser.add_argument('--max-request-mb', type=float, default=25)
+    args = parser.parse_args(argv)
+    app = create_fake_discord(args.guild_id, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                              inject_429=args.inject_429, bucket_limit=args.bucket_limit,
+                              bucket_reset=args.bucket_reset, max_file_bytes=int(args.max_file_mb * MB),
+                              max_request_bytes=int(args.max_request_mb * MB))
+    app.run(host=args.host, port=args.port, threaded=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
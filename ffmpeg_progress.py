@@ -0,0 +1,116 @@
+import os
+import time
+import threading
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+STDERR_LINES = int(os.getenv('FFMPEG_STDERR_LINES', 50))
+PROGRESS_LOG_SECONDS = float(os.getenv('FFMPEG_PROGRESS_LOG_SECONDS', 10))
+
+
+@dataclass
+class ProgressSample:
+    """One ``-progress`` block from ffmpeg."""
+
+    out_time: float = 0.0  # Seconds of output written
+    frame: Optional[int] = None
+    fps: Optional[float] = None
+    speed: Optional[float] = None  # Encoded seconds per wall second
+    bitrate_kbps: Optional[float] = None
+    total_size: Optional[int] = None
+    finished: bool = False
+
+
+def _number(value, cast=float, suffix=b''):
+    value = value.strip()
+    if suffix and value.endswith(suffix):
+        value = value[:-len(suffix)]
+    try:
+        return cast(value)
+    except ValueError:
+        return None  # ffmpeg writes N/A before the first frame
+
+
+def parse_progress(lines):
+    """Turn ``-progress`` key=value lines into ProgressSamples.
+
+    ffmpeg ends every block with a ``progress=continue`` or ``progress=end``
+    line; one sample is yielded per block.
+    """
+    sample = ProgressSample()
+    for line in lines:
+        key, sep, value = line.partition(b'=')
+        if not sep:
+            continue
+        key = key.strip()
+        if key == b'out_time_us' or (key == b'out_time_ms' and not sample.out_time):
+            # out_time_ms is also in microseconds, a long-standing ffmpeg quirk
+            micros = _number(value, int)
+            if micros is not None and micros >= 0:
+                sample.out_time = micros / 1000000.0
+        elif key == b'frame':
+            sample.frame = _number(value, int)
+        elif key == b'fps':
+            sample.fps = _number(value)
+        elif key == b'speed':
+            sample.speed = _number(value, suffix=b'x')
+        elif key == b'bitrate':
+            sample.bitrate_kbps = _number(value, suffix=b'kbits/s')
+        elif key == b'total_size':
+            sample.total_size = _number(value, int)
+        elif key == b'progress':
+            sample.finished = value.strip() == b'end'
+            yield sample
+            sample = ProgressSample()
+
+
+class StderrRing:
+    """Drains an ffmpeg stderr pipe, keeping only the last ``maxlen`` lines.
+
+    Lines go to the debug log rather than INFO, and the tail is kept so the
+    real error message is available when the encode fails.
+    """
+
+    def __init__(self, stream, maxlen=STDERR_LINES, label='FFmpeg'):
+        self.lines = deque(maxlen=maxlen)
+        self._stream = stream
+        self._label = label
+        self._thread = threading.Thread(target=self._drain, daemon=True)
+        self._thread.start()
+
+    def _drain(self):
+        debug = logger.isEnabledFor(logging.DEBUG)
+        for raw in self._stream:
+            line = raw.decode(errors='replace').rstrip()
+            if line:
+                self.lines.append(line)
+                if debug:
+                    logger.debug(f"{self._label}: {line}")
+
+    def text(self, timeout=5):
+        """The retained stderr tail, once the pipe has been drained."""
+        self._thread.join(timeout)
+        return '\n'.join(self.lines)
+
+
+def follow_progress(stdout, on_sample, duration=None, label='FFmpeg'):
+    """Feed every progress sample to ``on_sample`` and log a summary at most every few seconds.
+
+    Returns the last sample seen.
+    """
+    last = None
+    last_log = time.monotonic()
+    for sample in parse_progress(stdout):
+        last = sample
+        on_sample(sample)
+        now = time.monotonic()
+        if now - last_log >= PROGRESS_LOG_SECONDS:
+            last_log = now
+            total = f" / {duration:.1f}s" if duration else ''
+            logger.info(f"{label} progress: {sample.out_time:.1f}s{total} at {sample.fps or 0:.1f}fps, "
+                        f"{sample.speed or 0:.2f}x, {sample.bitrate_kbps or 0:.0f}kbps")
+    return last
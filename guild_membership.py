@@ -0,0 +1,63 @@
+import os
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+MEMBERSHIP_CACHE_SECONDS = float(os.getenv('MEMBERSHIP_CACHE_SECONDS', 6 * 3600))
+MEMBERSHIP_CACHE_SIZE = 10000
+
+
+class NotAMember(Exception):
+    """The signed-in user is not in the guild."""
+
+
+class MembershipCache:
+    """User IDs recently verified as guild members, each remembered for ``ttl`` seconds."""
+
+    def __init__(self, ttl=MEMBERSHIP_CACHE_SECONDS, max_size=MEMBERSHIP_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._verified = {}  # user_id -> time verified
+        self._lock = threading.Lock()
+
+    def add(self, user_id):
+        with self._lock:
+            if len(self._verified) >= self.max_size:
+                cutoff = time.monotonic() - self.ttl
+                self._verified = {key: at for key, at in self._verified.items() if at >= cutoff}
+                if len(self._verified) >= self.max_size:
+                    # Still full of live entries: drop the oldest
+                    del self._verified[min(self._verified, key=self._verified.get)]
+            self._verified[user_id] = time.monotonic()
+
+    def verified(self, user_id):
+        with self._lock:
+            at = self._verified.get(user_id)
+        return at is not None and time.monotonic() - at < self.ttl
+
+    def discard(self, user_id):
+        with self._lock:
+            self._verified.pop(user_id, None)
+
+
+def verify_member(client, access_token, guild_id, cache):
+    """Return the Discord user behind ``access_token`` if they belong to ``guild_id``.
+
+    The user's ``/users/@me`` identity is checked against the cache first,
+    so logging in again within the TTL skips the rate-limited
+    ``/users/@me/guilds/{guild_id}/member`` lookup, which replaces a scan of
+    every guild the user is in. Raises NotAMember if they are not in the
+    guild, and forgets any earlier verification of them.
+    """
+    user = client.get_current_user(access_token)
+    if cache.verified(user['id']):
+        logger.debug(f"User {user['id']} was verified as a member within the cache TTL")
+        return user
+    member = client.get_current_user_guild_member(access_token, guild_id)
+    if member is None:
+        cache.discard(user['id'])
+        raise NotAMember()
+    cache.add(user['id'])
+    return member.get('user') or user
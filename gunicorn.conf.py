@@ -0,0 +1,35 @@
+"""Gunicorn settings and hooks; gunicorn loads this file from the working directory on its own.
+
+The default is one gthread worker. Each request gets its own thread, so a
+slow upload body, an OAuth callback waiting on Discord or an open progress
+stream no longer holds up everyone else's polls. Transcodes are limited by
+the worker's scheduler, so adding workers also multiplies encoder
+concurrency and needs TASK_STORE=sqlite to share progress between them.
+"""
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:7001')
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.getenv('GUNICORN_WORKERS', 1))
+threads = int(os.getenv('GUNICORN_THREADS', 32))
+# Idle keep-alive connections the gthread worker holds open, on top of busy threads
+worker_connections = int(os.getenv('GUNICORN_CONNECTIONS', 1000))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+# A gthread worker heartbeats from its main loop, so this bounds a hung worker, not a long request
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+preload_app = True
+
+
+def when_ready(server):
+    if workers > 1 and os.getenv('TASK_STORE', 'memory') != 'sqlite':
+        server.log.warning(f"{workers} workers with TASK_STORE=memory: progress polls that reach "
+                           f"another worker will miss the task; set TASK_STORE=sqlite")
+
+
+def post_worker_init(worker):
+    # Resume here rather than in the --preload parent: the transcode threads
+    # would not survive the fork into the workers
+    from app import resume_jobs, rescan_jobs
+    resume_jobs()
+    rescan_jobs()
@@ -0,0 +1,167 @@
+import os
+import struct
+import hashlib
+import threading
+import logging
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+logger = logging.getLogger(__name__)
+
+FOLLOW_CHUNK_SIZE = 256 * 1024
+MAX_SCANNED_BOXES = 32
+
+
+class IngestAborted(IOError):
+    """Raised to readers following an upload that did not finish."""
+
+
+class IngestFile:
+    """Write target for one uploaded file part.
+
+    Werkzeug's multipart parser writes each chunk here as the request body
+    arrives, so the upload lands directly in its final location with the
+    size limit enforced and the content hash computed along the way. Other
+    threads can ``follow()`` the file while it is still being written.
+    """
+
+    def __init__(self, path, max_bytes=None, on_streamable=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.streamable = None  # True once a complete moov box is seen before mdat
+        self.finished = False
+        self.aborted = False
+        self._on_streamable = on_streamable
+        self._file = open(path, 'w+b', buffering=0)
+        self._hash = hashlib.sha256()
+        self._next_box = 0
+        self._boxes_scanned = 0
+        self._cond = threading.Condition()
+
+    def write(self, data):
+        if self.max_bytes is not None and self.size + len(data) > self.max_bytes:
+            raise RequestEntityTooLarge()
+        self._file.write(data)
+        self._hash.update(data)
+        with self._cond:
+            self.size += len(data)
+            self._cond.notify_all()
+        if self.streamable is None:
+            self._scan_boxes()
+        return len(data)
+
+    def _scan_boxes(self):
+        # Walk top-level MP4 boxes: moov before mdat means ffmpeg can decode from a pipe
+        while self.streamable is None and self._next_box + 16 <= self.size:
+            header = os.pread(self._file.fileno(), 16, self._next_box)
+            box_size, box_type = struct.unpack('>I4s', header[:8])
+            if box_size == 1:
+                box_size = struct.unpack('>Q', header[8:16])[0]
+            if box_type == b'mdat' or box_size < 8 or self._boxes_scanned >= MAX_SCANNED_BOXES:
+                self.streamable = False
+                return
+            if box_type == b'moov':
+                if self._next_box + box_size > self.size:
+                    return  # Wait for the rest of the moov box
+                self.streamable = True
+                if self._on_streamable:
+                    self._on_streamable(self)
+                return
+            self._next_box += box_size
+            self._boxes_scanned += 1
+
+    def finish(self):
+        """Mark the upload complete; followers drain the rest and stop."""
+        with self._cond:
+            self.finished = True
+            self._cond.notify_all()
+        if self.streamable is None:
+            self.streamable = False
+
+    def abort(self):
+        """Mark the upload failed; followers raise IngestAborted."""
+        with self._cond:
+            self.aborted = True
+            self._cond.notify_all()
+        self.close()
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+    def follow(self, chunk_size=FOLLOW_CHUNK_SIZE):
+        """Yield the file's bytes as they arrive until the upload finishes."""
+        position = 0
+        with open(self.path, 'rb') as f:
+            while True:
+                with self._cond:
+                    while position >= self.size and not (self.finished or self.aborted):
+                        self._cond.wait()
+                    if self.aborted:
+                        raise IngestAborted(f"Upload to {self.path} was interrupted")
+                    if position >= self.size:
+                        return
+                data = f.read(min(chunk_size, self.size - position))
+                position += len(data)
+                yield data
+
+    # File-like methods Werkzeug's FileStorage needs
+    def seek(self, offset, whence=0):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def readline(self, size=-1):
+        return self._file.readline(size)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+
+class IngestRequest(Request):
+    """Request that streams uploaded files straight into IngestFiles.
+
+    A view opts in by setting ``ingest_target`` to ``(path, max_bytes,
+    on_streamable)`` before touching ``request.files``; only the first file
+    is streamed. A view taking several files sets ``ingest_batch`` instead,
+    a callable that gets each file's name and returns ``(path, max_bytes)``,
+    and may raise ``body_limit`` above the app's MAX_CONTENT_LENGTH.
+    """
+
+    ingest_target = None
+    ingest_file = None
+    ingest_batch = None
+    body_limit = None
+
+    @property
+    def ingest_files(self):
+        return self.__dict__.setdefault('_ingest_files', [])
+
+    @property
+    def max_content_length(self):
+        if self.body_limit is not None:
+            return self.body_limit
+        return super().max_content_length
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.ingest_batch is not None:
+            path, max_bytes = self.ingest_batch(filename)
+            ingest = IngestFile(path, max_bytes=max_bytes)
+            self.ingest_files.append(ingest)
+            return ingest
+        if self.ingest_target is None or self.ingest_file is not None:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        path, max_bytes, on_streamable = self.ingest_target
+        if not (filename or '').lower().endswith('.mp4'):
+            on_streamable = None
+        self.ingest_file = IngestFile(path, max_bytes=max_bytes, on_streamable=on_streamable)
+        return self.ingest_file
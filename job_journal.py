@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import fcntl
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Optional
+
+from task_store import FFmpegProgress
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_PATH = os.getenv('JOB_JOURNAL_PATH', os.path.join('uploads', 'jobs.jsonl'))
+MAX_RESUMES = int(os.getenv('JOB_MAX_RESUMES', 2))
+# Seconds between looks for unfinished jobs whose worker has gone, e.g. after a graceful reload
+RESCAN_SECONDS = int(os.getenv('JOB_RESCAN_SECONDS', 60))
+# Finished jobs stay in the journal this long so a restarted worker can still report them
+KEEP_FINISHED_SECONDS = int(os.getenv('TASK_TTL_SECONDS', 3600))
+# Appending past this size compacts the journal; it grows again by as much before the next try
+COMPACT_BYTES = int(float(os.getenv('JOB_JOURNAL_COMPACT_MB', 8)) * 1024 * 1024)
+
+# Stage transitions in the order a job makes them
+STAGES = ('uploaded', 'probed', 'encoded', 'posted')
+FINAL_STAGES = ('posted', 'failed')
+
+
+@dataclass
+class JobState:
+    """A job's latest stage and everything recorded about it, folded from the journal."""
+
+    task_id: str
+    stage: Optional[str] = None
+    data: dict = field(default_factory=dict)
+    resumes: int = 0
+    updated_at: float = 0.0
+
+    @property
+    def finished(self):
+        return self.stage in FINAL_STAGES
+
+    def apply(self, record):
+        stage = record['stage']
+        self.updated_at = record.get('time', self.updated_at)
+        self.data.update({k: v for k, v in record.items() if k not in ('task_id', 'stage', 'time')})
+        if stage == 'resumed':
+            self.resumes += 1
+        elif self.finished:
+            return  # Nothing moves a job on once it has been posted or has failed
+        elif stage == 'failed' or (self.stage is None and stage in STAGES):
+            self.stage = stage
+        elif stage in STAGES and STAGES.index(stage) > STAGES.index(self.stage):
+            # Stages can be written out of order by an encode that overlaps the upload
+            self.stage = stage
+
+    def to_progress(self):
+        """Progress for a job this worker is not running, e.g. after a restart."""
+        progress = FFmpegProgress(status='queued')
+        if self.stage == 'posted':
+            progress.complete(self.data.get('message_link'))
+        elif self.stage == 'failed':
+            progress.fail(self.data.get('error') or 'Job failed')
+        return progress
+
+
+class JobJournal:
+    """Append-only JSONL log of job stage transitions, shared by every worker.
+
+    Each record is one line, appended and fsynced under an flock so lines
+    from different workers never interleave. Reading folds the records for
+    each task into a JobState. The folded states are kept in memory and
+    only the lines appended since the last read are parsed, unless the file
+    was replaced by a compaction.
+    """
+
+    def __init__(self, path=JOURNAL_PATH, compact_bytes=COMPACT_BYTES):
+        self.path = path
+        self._lock_path = f'{path}.lock'
+        self.compact_bytes = compact_bytes
+        self._compact_at = compact_bytes
+        self._states = {}
+        self._file_key = None  # (inode, size, mtime) the states were folded from
+        self._offset = 0
+        self._index_lock = threading.Lock()
+
+    def _locked(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        lock = open(self._lock_path, 'a')
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock
+
+    def record(self, task_id, stage, **data):
+        line = json.dumps({'task_id': task_id, 'stage': stage, 'time': time.time(), **data}) + '\n'
+        try:
+            with self._locked():
+                with open(self.path, 'a') as f:
+                    f.write(line)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    size = f.tell()
+        except OSError as e:
+            # Losing resumability must not fail the job itself
+            logger.error(f"Could not journal {stage} for task {task_id}: {e}")
+            return
+        if self.compact_bytes and size >= self._compact_at:
+            self.compact_logged()
+
+    def _records(self):
+        try:
+            with open(self.path) as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+        for line in lines:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue  # A line cut short by a crash
+
+    def _fold(self, states, lines):
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # A line cut short by a crash
+            task_id = record.get('task_id')
+            if task_id and record.get('stage'):
+                states.setdefault(task_id, JobState(task_id)).apply(record)
+
+    def jobs(self):
+        with self._index_lock:
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                self._states, self._file_key, self._offset = {}, None, 0
+                return {}
+            key = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            if key != self._file_key:
+                if self._file_key is None or stat.st_ino != self._file_key[0] or stat.st_size < self._offset:
+                    self._states, self._offset = {}, 0
+                with open(self.path, 'rb') as f:
+                    f.seek(self._offset)
+                    data = f.read()
+                # A line still being written is folded once its newline lands
+                end = data.rfind(b'\n') + 1
+                self._fold(self._states, data[:end].decode('utf-8', 'replace').splitlines())
+                self._offset += end
+                self._file_key = key
+            return dict(self._states)
+
+    def get(self, task_id):
+        return self.jobs().get(task_id)
+
+    def unfinished(self):
+        return [state for state in self.jobs().values() if not state.finished]
+
+    def compact(self, keep_finished=KEEP_FINISHED_SECONDS, now=None):
+        """Rewrite the journal without jobs that finished more than ``keep_finished`` seconds ago."""
+        cutoff = (now or time.time()) - keep_finished
+        with self._locked():
+            states = self.jobs()
+            keep = {task_id for task_id, state in states.items()
+                    if not state.finished or state.updated_at >= cutoff}
+            if len(keep) == len(states):
+                return 0
+            temp_path = f'{self.path}.tmp-{os.getpid()}'
+            with open(temp_path, 'w') as f:
+                for record in self._records():
+                    if record.get('task_id') in keep:
+                        f.write(json.dumps(record) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        return len(states) - len(keep)
+
+    def compact_logged(self, **kwargs):
+        """``compact()``, logging instead of raising when the journal can't be rewritten."""
+        try:
+            removed = self.compact(**kwargs)
+        except OSError as e:
+            logger.error(f"Could not compact the job journal {self.path}: {e}")
+            return 0
+        finally:
+            try:
+                size = os.path.getsize(self.path)
+            except OSError:
+                size = 0
+            self._compact_at = max(self.compact_bytes, 2 * size)
+        if removed:
+            logger.info(f"Compacted the job journal, dropping {removed} finished job(s)")
+        return removed
@@ -0,0 +1,157 @@
+"""End-to-end load driver: simulated users upload clips and follow them to completion.
+
+Run the app against the fake Discord API (see fake_discord.py), then:
+
+    python load_driver.py --levels 1,2,4,8 --jobs 4
+
+Each level runs that many users at once. Every user signs in through the
+app's OAuth callback with a made-up code, which the fake API accepts. The
+user then uploads the clip, polls /upvrt/progress/<task_id> until the job
+completes or fails, and repeats ``--jobs`` times. For each level the driver
+reports jobs per minute, end-to-end latency percentiles and the error rate.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+
+import requests
+
+from benchmark import Fixture, generate_fixture, FIXTURE_DIR
+from load_test import percentile
+
+
+def sign_in(base_url, name):
+    """A session signed in as ``name`` through the app's OAuth callback."""
+    session = requests.Session()
+    response = session.get(f'{base_url}/upvrt/callback', params={'code': name}, timeout=60)
+    response.raise_for_status()
+    cookie = response.cookies.get('upvrt_session')
+    if not cookie or 'var success = true' not in response.text:
+        raise RuntimeError(f'Sign-in failed for {name}')
+    # The cookie is marked Secure, so send it by hand over plain http
+    session.headers['Cookie'] = f'upvrt_session={cookie}'
+    return session
+
+
+def run_job(session, base_url, clip, channel_id, poll_interval, timeout):
+    """Upload ``clip`` and follow it; returns (ok, seconds, upload_seconds, error)."""
+    started = time.monotonic()
+    with open(clip, 'rb') as f:
+        response = session.post(f'{base_url}/upvrt/upload', data={'channel_id': channel_id},
+                                files={'video': (os.path.basename(clip), f, 'video/mp4')}, timeout=600)
+    upload_seconds = time.monotonic() - started
+    if response.status_code != 200:
+        return False, time.monotonic() - started, upload_seconds, f'upload {response.status_code}'
+    task_id = response.json()['task_id']
+    while time.monotonic() - started < timeout:
+        time.sleep(poll_interval)
+        response = session.get(f'{base_url}/upvrt/progress/{task_id}', timeout=60)
+        if response.status_code == 404:
+            continue  # Not visible to this worker yet
+        if response.status_code != 200:
+            return False, time.monotonic() - started, upload_seconds, f'progress {response.status_code}'
+        progress = response.json()
+        if progress['status'] == 'completed':
+            return True, time.monotonic() - started, upload_seconds, None
+        if progress['status'] == 'failed':
+            return False, time.monotonic() - started, upload_seconds, progress.get('error') or 'failed'
+    return False, time.monotonic() - started, upload_seconds, 'timed out'
+
+
+def run_level(base_url, users, jobs, clip, channel_id, poll_interval, timeout):
+    results = []
+    lock = threading.Lock()
+
+    def user(index):
+        try:
+            session = sign_in(base_url, f'loaduser-{users}-{index}')
+        except (requests.RequestException, RuntimeError) as e:
+            with lock:
+                results.extend([(False, 0.0, 0.0, f'sign-in: {e}')] * jobs)
+            return
+        for _ in range(jobs):
+            try:
+                result = run_job(session, base_url, clip, channel_id, poll_interval, timeout)
+            except requests.RequestException as e:
+                result = (False, 0.0, 0.0, str(e))
+            with lock:
+                results.append(result)
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=user, args=(index,), daemon=True) for index in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    latencies = [seconds for ok, seconds, _, _ in results if ok]
+    errors = {}
+    for ok, _, _, error in results:
+        if not ok:
+            errors[error] = errors.get(error, 0) + 1
+    return {
+        'users': users,
+        'jobs': len(results),
+        'completed': len(latencies),
+        'jobs_per_minute': round(len(latencies) / elapsed * 60, 2) if elapsed else None,
+        'p50_seconds': percentile(latencies, 0.5),
+        'p95_seconds': percentile(latencies, 0.95),
+        'p99_seconds': percentile(latencies, 0.99),
+        'upload_p50_seconds': percentile([upload for ok, _, upload, _ in results if ok], 0.5),
+        'error_rate': round(1 - len(latencies) / len(results), 3) if results else None,
+        'errors': errors,
+        'elapsed_seconds': round(elapsed, 1),
+    }
+
+
+def fmt(seconds):
+    return '-' if seconds is None else f'{seconds:.1f}s'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:7001')
+    parser.add_argument('--fake-discord', default='http://127.0.0.1:7100',
+                        help='Fake Discord API, for its request and 429 counts')
+    parser.add_argument('--levels', default='1,2,4,8', help='Comma-separated numbers of concurrent users')
+    parser.add_argument('--jobs', type=int, default=3, help='Uploads per user at each level')
+    parser.add_argument('--clip', help='MP4 to upload (default: a generated test clip)')
+    parser.add_argument('--clip-seconds', type=int, default=20)
+    parser.add_argument('--channel-id', default='100', help="Channel to post to; the fake API's first is 100")
+    parser.add_argument('--poll-interval', type=float, default=1.0)
+    parser.add_argument('--job-timeout', type=float, default=900)
+    parser.add_argument('--output', default='load_results.json')
+    args = parser.parse_args(argv)
+
+    clip = args.clip or generate_fixture(Fixture(f'e2e_{args.clip_seconds}s', 'testsrc2', args.clip_seconds,
+                                                 1280, 720, filters='noise=alls=20:allf=t'), FIXTURE_DIR)
+    base_url = args.url.rstrip('/')
+    levels = []
+    print(f"{'users':>5} {'jobs':>5} {'done':>5} {'jobs/min':>9} {'p50':>7} {'p95':>7} {'p99':>7} "
+          f"{'upload':>7} {'errors':>7}", flush=True)
+    for users in (int(level) for level in args.levels.split(',')):
+        result = run_level(base_url, users, args.jobs, clip, args.channel_id, args.poll_interval, args.job_timeout)
+        levels.append(result)
+        print(f"{users:>5} {result['jobs']:>5} {result['completed']:>5} {result['jobs_per_minute']:>9} "
+              f"{fmt(result['p50_seconds']):>7} {fmt(result['p95_seconds']):>7} {fmt(result['p99_seconds']):>7} "
+              f"{fmt(result['upload_p50_seconds']):>7} {result['error_rate']:>7.1%}", flush=True)
+        for error, count in result['errors'].items():
+            print(f'      {count} x {error}')
+
+    report = {'url': base_url, 'clip': clip, 'levels': levels}
+    try:
+        report['fake_discord'] = requests.get(f"{args.fake_discord.rstrip('/')}/fake/stats", timeout=5).json()
+        print(f"fake Discord: {report['fake_discord']}")
+    except (requests.RequestException, ValueError):
+        pass
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    return 1 if any(level['error_rate'] for level in levels) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
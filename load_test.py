@@ -0,0 +1,194 @@
+"""Load test: concurrent slow uploaders and progress pollers against a running server.
+
+Uploaders send MP4-sized bodies at a throttled rate, like users on slow
+links, under a non-MP4 filename. Each body is streamed through the real
+upload path into scratch space and then rejected, so nothing is encoded or
+posted to Discord. Pollers request progress once a second, as the
+dashboard does. The run reports poll latency while the uploads are in
+flight:
+
+    SECRET_KEY=... gunicorn wsgi:app                 # in one shell
+    SECRET_KEY=... python load_test.py --uploaders 20 --pollers 100
+
+Requests are signed in with a session cookie minted from SECRET_KEY, so the
+server must run with the same key. Exits with status 1 if the poll p95 is
+over --max-p95-ms or any request failed.
+"""
+import os
+import sys
+import time
+import uuid
+import argparse
+import threading
+
+import requests
+
+CHUNK_SIZE = 64 * 1024
+
+
+def session_cookie(secret_key, user_id='loadtest'):
+    """A signed session cookie for a made-up user, as the OAuth callback would set."""
+    from flask import Flask
+    app = Flask(__name__)
+    app.secret_key = secret_key
+    serializer = app.session_interface.get_signing_serializer(app)
+    return serializer.dumps({
+        '_permanent': True,
+        '_user_id': user_id,
+        '_fresh': True,
+        'user_data': {'id': user_id, 'username': 'loadtest', 'discriminator': '0', 'avatar': None},
+    })
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def add(self, latency, status):
+        with self.lock:
+            self.latencies.append(latency)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def error(self):
+        with self.lock:
+            self.errors += 1
+
+
+class ThrottledBody:
+    """A multipart upload of ``size`` zero bytes, read no faster than ``rate_bps``.
+
+    Having ``read`` and ``__len__`` makes requests send it with a
+    Content-Length, as a browser would, rather than chunked.
+    """
+
+    def __init__(self, size, rate_bps):
+        self.boundary = uuid.uuid4().hex
+        self._head = (f'--{self.boundary}\r\nContent-Disposition: form-data; name="channel_id"\r\n\r\n0\r\n'
+                      f'--{self.boundary}\r\nContent-Disposition: form-data; name="video"; '
+                      f'filename="loadtest.bin"\r\nContent-Type: application/octet-stream\r\n\r\n').encode()
+        self._tail = f'\r\n--{self.boundary}--\r\n'.encode()
+        self._size = size
+        self._rate = rate_bps
+        self._position = 0
+        self._started = None
+
+    @property
+    def content_type(self):
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __len__(self):
+        return len(self._head) + self._size + len(self._tail)
+
+    def read(self, size=-1):
+        size = CHUNK_SIZE if size is None or size < 0 else size
+        if self._started is None:
+            self._started = time.monotonic()
+        start, end = self._position, min(self._position + size, len(self))
+        self._position = end
+        data = bytearray(end - start)
+        if start < len(self._head):
+            head = self._head[start:end]
+            data[:len(head)] = head
+        tail_start = len(self._head) + self._size
+        if end > tail_start:
+            tail = self._tail[max(0, start - tail_start):end - tail_start]
+            data[len(data) - len(tail):] = tail
+        if self._rate:
+            ahead = self._position / self._rate - (time.monotonic() - self._started)
+            if ahead > 0:
+                time.sleep(ahead)
+        return bytes(data)
+
+
+def upload_loop(base_url, cookie, size, rate_bps, deadline, stats):
+    session = requests.Session()
+    session.headers['Cookie'] = f'upvrt_session={cookie}'
+    while time.monotonic() < deadline:
+        body = ThrottledBody(size, rate_bps)
+        started = time.monotonic()
+        try:
+            response = session.post(f'{base_url}/upvrt/upload', data=body,
+                                    headers={'Content-Type': body.content_type}, timeout=600)
+            # 400 "Only MP4 files are allowed" means the whole body was read
+            stats.add(time.monotonic() - started, response.status_code)
+        except requests.RequestException:
+            stats.error()
+
+
+def poll_loop(base_url, cookie, interval, deadline, stats):
+    session = requests.Session()
+    session.headers['Cookie'] = f'upvrt_session={cookie}'
+    task_id = uuid.uuid4()
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        try:
+            # Unknown task: the full auth, task store and journal lookup, answered with a 404
+            response = session.get(f'{base_url}/upvrt/progress/{task_id}', timeout=30)
+            stats.add(time.monotonic() - started, response.status_code)
+        except requests.RequestException:
+            stats.error()
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:7001')
+    parser.add_argument('--uploaders', type=int, default=10)
+    parser.add_argument('--pollers', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=60, help='Seconds to run')
+    parser.add_argument('--upload-mb', type=float, default=50, help='Size of each upload')
+    parser.add_argument('--upload-kbps', type=float, default=2000,
+                        help='Per-uploader send rate in kilobytes per second, 0 for unthrottled')
+    parser.add_argument('--poll-interval', type=float, default=1.0)
+    parser.add_argument('--max-p95-ms', type=float, default=500)
+    args = parser.parse_args(argv)
+
+    secret_key = os.getenv('SECRET_KEY')
+    if not secret_key:
+        parser.error('SECRET_KEY must be set, to the same value the server runs with')
+    cookie = session_cookie(secret_key)
+    base_url = args.url.rstrip('/')
+    deadline = time.monotonic() + args.duration
+    uploads, polls = Stats(), Stats()
+    threads = [threading.Thread(target=upload_loop, daemon=True,
+                                args=(base_url, cookie, int(args.upload_mb * 1024 * 1024),
+                                      args.upload_kbps * 1024, deadline, uploads))
+               for _ in range(args.uploaders)]
+    threads += [threading.Thread(target=poll_loop, daemon=True,
+                                 args=(base_url, cookie, args.poll_interval, deadline, polls))
+                for _ in range(args.pollers)]
+    print(f'{args.uploaders} uploaders ({args.upload_mb:g}MB at {args.upload_kbps:g}KB/s) and '
+          f'{args.pollers} pollers against {base_url} for {args.duration:g}s', flush=True)
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        # Uploads still in flight at the deadline are allowed to finish
+        thread.join()
+
+    p50, p95, p99 = (percentile(polls.latencies, f) for f in (0.5, 0.95, 0.99))
+    print(f'polls:   {len(polls.latencies)} ok, {polls.errors} errors, statuses {polls.statuses}')
+    if p50 is not None:
+        print(f'         p50 {p50 * 1000:.0f}ms  p95 {p95 * 1000:.0f}ms  p99 {p99 * 1000:.0f}ms  '
+              f'max {max(polls.latencies) * 1000:.0f}ms')
+    print(f'uploads: {len(uploads.latencies)} done, {uploads.errors} errors, statuses {uploads.statuses}')
+    if uploads.latencies:
+        print(f'         median {percentile(uploads.latencies, 0.5):.1f}s per upload')
+    failed = polls.errors or uploads.errors or set(polls.statuses) - {404} or set(uploads.statuses) - {400}
+    if failed or p95 is None or p95 * 1000 > args.max_p95_ms:
+        print('FAILED')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,179 @@
+import os
+import json
+import hashlib
+import subprocess
+import threading
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+PROBE_CACHE_SIZE = int(os.getenv('PROBE_CACHE_SIZE', 256))
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class MediaInfo:
+    """Everything the encode pipeline needs to know about an input file."""
+
+    duration: float
+    size: int
+    format_name: Optional[str] = None
+    format_bitrate: Optional[int] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    rotation: int = 0
+    video_codec: Optional[str] = None
+    video_bitrate: Optional[int] = None
+    frame_rate: Optional[float] = None
+    audio_codec: Optional[str] = None
+    audio_bitrate: Optional[int] = None
+    audio_channels: Optional[int] = None
+    audio_channel_layout: Optional[str] = None
+    audio_sample_rate: Optional[int] = None
+
+    @property
+    def has_video(self):
+        return self.video_codec is not None
+
+    @property
+    def has_audio(self):
+        return self.audio_codec is not None
+
+    @property
+    def display_width(self):
+        """Width as shown to the viewer, after applying rotation."""
+        return self.height if abs(self.rotation) % 180 == 90 else self.width
+
+    @property
+    def display_height(self):
+        return self.width if abs(self.rotation) % 180 == 90 else self.height
+
+    @property
+    def is_portrait(self):
+        return (self.display_height or 0) > (self.display_width or 0)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def content_hash(path):
+    """SHA-256 of a file's contents, read in 1MB chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _frame_rate(value):
+    # ffprobe reports rates as a fraction such as 30000/1001
+    try:
+        numerator, _, denominator = value.partition('/')
+        rate = float(numerator) / float(denominator or 1)
+    except (AttributeError, ValueError, ZeroDivisionError):
+        return None
+    return round(rate, 3) if rate > 0 else None
+
+
+def _rotation(stream):
+    rotation = _int(stream.get('tags', {}).get('rotate'))
+    if rotation is None:
+        for side_data in stream.get('side_data_list', []):
+            if 'rotation' in side_data:
+                rotation = _int(side_data['rotation'])
+                break
+    return (rotation or 0) % 360
+
+
+def parse_probe(data, size):
+    """Build a MediaInfo from ``ffprobe -show_format -show_streams`` JSON."""
+    fmt = data.get('format', {})
+    streams = data.get('streams', [])
+    video = next((s for s in streams if s.get('codec_type') == 'video'), {})
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), {})
+    duration = float(fmt.get('duration') or video.get('duration') or 0)
+    return MediaInfo(
+        duration=duration,
+        size=size,
+        format_name=fmt.get('format_name'),
+        format_bitrate=_int(fmt.get('bit_rate')),
+        width=_int(video.get('width')),
+        height=_int(video.get('height')),
+        rotation=_rotation(video),
+        video_codec=video.get('codec_name'),
+        video_bitrate=_int(video.get('bit_rate')),
+        frame_rate=_frame_rate(video.get('avg_frame_rate')) or _frame_rate(video.get('r_frame_rate')),
+        audio_codec=audio.get('codec_name'),
+        audio_bitrate=_int(audio.get('bit_rate')),
+        audio_channels=_int(audio.get('channels')),
+        audio_channel_layout=audio.get('channel_layout'),
+        audio_sample_rate=_int(audio.get('sample_rate')),
+    )
+
+
+class ProbeCache:
+    """LRU of MediaInfo keyed by input content hash."""
+
+    def __init__(self, max_entries=PROBE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            info = self._entries.get(key)
+            if info is not None:
+                self._entries.move_to_end(key)
+            return info
+
+    def put(self, key, info):
+        with self._lock:
+            self._entries[key] = info
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+probe_cache = ProbeCache()
+
+
+def probe_media(input_path, digest=None, cache=True):
+    """Probe an input once with ffprobe and return its MediaInfo.
+
+    Results are cached by content hash, so re-uploads and retries of the same
+    file skip ffprobe. Pass ``cache=False`` for files still being written.
+    Returns None if the file cannot be probed.
+    """
+    if cache:
+        digest = digest or content_hash(input_path)
+        info = probe_cache.get(digest)
+        if info is not None:
+            logger.info(f"Probe cache hit for {os.path.basename(input_path)}")
+            return info
+    try:
+        probe = subprocess.run([
+            'ffprobe', '-v', 'error',
+            '-show_format', '-show_streams',
+            '-of', 'json',
+            input_path
+        ], capture_output=True, text=True, check=True)
+        info = parse_probe(json.loads(probe.stdout), os.path.getsize(input_path))
+    except Exception as e:
+        logger.error(f"Error probing {input_path}: {e}")
+        return None
+    if cache and info.duration > 0:
+        probe_cache.put(digest, info)
+    return info
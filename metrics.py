@@ -0,0 +1,187 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from a fast API call up to a long encode
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _label_text(labelnames, values):
+    if not labelnames:
+        return ''
+    pairs = ','.join(f'{name}="{value}"' for name, value in zip(labelnames, values))
+    return '{' + pairs + '}'
+
+
+def _format(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f'{self.name}{_label_text(self.labelnames, key)} {_format(value)}' for key, value in items]
+
+
+class Gauge(Metric):
+    """Gauge that is either set directly or read from a callback at scrape time."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, function=None):
+        super().__init__(name, documentation)
+        self._value = 0
+        self._function = function
+
+    def set(self, value):
+        self._value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def value(self):
+        return self._function() if self._function else self._value
+
+    def _samples(self):
+        return [f'{self.name} {_format(self.value())}']
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label key -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of a ``with`` block."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def count(self, **labels):
+        series = self._series.get(self._key(labels))
+        return series[-1] if series else 0
+
+    def _samples(self):
+        lines = []
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            for bound, bucket_count in zip(self.buckets, series):
+                labels = _label_text(self.labelnames + ('le',), key + (_format(bound),))
+                lines.append(f'{self.name}_bucket{labels} {bucket_count}')
+            labels = _label_text(self.labelnames + ('le',), key + ('+Inf',))
+            lines.append(f'{self.name}_bucket{labels} {series[-1]}')
+            plain = _label_text(self.labelnames, key)
+            lines.append(f'{self.name}_sum{plain} {_format(series[-2])}')
+            lines.append(f'{self.name}_count{plain} {series[-1]}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def render(self):
+        """Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+upload_seconds = registry.histogram('upvrt_upload_ingest_seconds', 'Time to receive an upload body')
+upload_bytes = registry.counter('upvrt_upload_bytes_total', 'Bytes received in uploads')
+uploads = registry.counter('upvrt_uploads_total', 'Upload requests by outcome', ['outcome'])
+probe_seconds = registry.histogram('upvrt_probe_seconds', 'Time spent probing inputs')
+encode_seconds = registry.histogram('upvrt_encode_seconds', 'Wall time of each ffmpeg encode')
+encode_realtime_factor = registry.histogram(
+    'upvrt_encode_realtime_factor', 'Encoded seconds per wall second',
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 16, 32)
+)
+output_size_ratio = registry.histogram(
+    'upvrt_output_size_ratio', 'Output size relative to TARGET_SIZE_BYTES',
+    buckets=(0.5, 0.7, 0.8, 0.9, 0.95, 1.0, 1.05, 1.1, 1.25)
+)
+segment_speedup = registry.histogram(
+    'upvrt_segment_speedup', 'Segmented encode throughput relative to single-process encodes',
+    buckets=(0.5, 1, 1.5, 2, 3, 4, 6, 8, 12, 16)
+)
+encoder_presets = registry.counter('upvrt_encoder_presets_total', 'Encodes by the x264 preset chosen', ['preset'])
+encode_prediction_ratio = registry.histogram(
+    'upvrt_encode_prediction_ratio', 'Encode wall time relative to the encoder policy\'s prediction',
+    buckets=(0.5, 0.75, 0.9, 1.1, 1.25, 1.5, 2, 4)
+)
+output_cache_hits = registry.counter('upvrt_output_cache_total', 'Output cache lookups by result', ['result'])
+discord_post_seconds = registry.histogram('upvrt_discord_post_seconds', 'Latency of Discord message posts')
+discord_posts = registry.counter('upvrt_discord_posts_total', 'Discord message posts by status code', ['status'])
+login_seconds = registry.histogram('upvrt_login_seconds', 'Time spent in the OAuth callback on Discord calls')
+logins = registry.counter('upvrt_logins_total', 'OAuth logins by outcome', ['outcome'])
+ffmpeg_active = registry.gauge('upvrt_ffmpeg_active', 'ffmpeg processes currently running')
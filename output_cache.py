@@ -0,0 +1,119 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(content_digest, params):
+    """Key for an encode: input content hash plus every parameter that changes the output."""
+    encoded = json.dumps(params, sort_keys=True)
+    return hashlib.sha256(f'{content_digest}:{encoded}'.encode()).hexdigest()
+
+
+def file_version(path):
+    """Cheap version stamp for an asset such as the watermark."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return 'missing'
+    return f'{stat.st_size}-{int(stat.st_mtime)}'
+
+
+class OutputCache:
+    """Disk cache of compressed outputs with a byte budget and LRU eviction.
+
+    Entries are written to a temporary name and renamed into place, so a
+    reader never sees a partial file. Recency is tracked with file mtimes,
+    which every gunicorn worker sharing the directory can see.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.mp4')
+
+    def get(self, key):
+        """Return the cached file for ``key`` and mark it recently used, or None."""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def put(self, key, source_path):
+        """Store a copy of ``source_path`` under ``key``."""
+        if not self.enabled:
+            return None
+        if os.path.getsize(source_path) > self.max_bytes:
+            return None
+        path = self._path(key)
+        temp_path = f'{path}.tmp-{os.getpid()}-{threading.get_ident()}'
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            try:
+                # A hard link costs nothing when the cache shares the upload volume
+                os.link(source_path, temp_path)
+            except OSError:
+                shutil.copyfile(source_path, temp_path)
+            os.replace(temp_path, path)
+        except OSError as e:
+            # A full or read-only cache must never fail the job itself
+            logger.warning(f"Could not cache output {key}: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return None
+        self.evict()
+        return path
+
+    def link_to(self, key, destination):
+        """Place the cached file for ``key`` at ``destination``; False on a miss."""
+        path = self.get(key)
+        if path is None:
+            return False
+        try:
+            os.link(path, destination)
+        except FileExistsError:
+            os.remove(destination)
+            os.link(path, destination)
+        except OSError:
+            shutil.copyfile(path, destination)
+        return True
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits its budget."""
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and entry.name.endswith('.mp4'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+            return total
+
+    def size(self):
+        if not os.path.isdir(self.directory):
+            return 0
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory)
+                   if entry.is_file() and entry.name.endswith('.mp4'))
@@ -0,0 +1,160 @@
+import os
+import sys
+import time
+import queue
+import atexit
+import random
+import logging
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = '%(asctime)s [%(levelname)s] %(message)s'
+LOG_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_ASYNC = os.getenv('LOG_ASYNC', '1') == '1'
+
+# Fraction of requests logged per endpoint; polling and static endpoints are sampled by default
+DEFAULT_SAMPLING = 'get_progress=0.05,get_batch_progress=0.05,stream_progress=0.2,serve_static=0.1,health_check=0,metrics_endpoint=0'
+DEFAULT_LEVELS = ''
+SLOW_REQUEST_MS = float(os.getenv('REQUEST_LOG_SLOW_MS', 1000))
+
+# WSGI environ key the app stores the matched Flask endpoint under
+ENDPOINT_KEY = 'upvrt.endpoint'
+
+request_logger = logging.getLogger('upvrt.requests')
+_configured = False
+
+
+def parse_routes(value, cast):
+    """Parse ``endpoint=value,...`` settings, skipping malformed entries."""
+    routes = {}
+    for item in (value or '').split(','):
+        endpoint, sep, setting = item.strip().partition('=')
+        if not sep:
+            continue
+        try:
+            routes[endpoint.strip()] = cast(setting.strip())
+        except (ValueError, KeyError):
+            continue
+    return routes
+
+
+def _level(name):
+    level = logging.getLevelName(name.upper())
+    if not isinstance(level, int):
+        raise ValueError(name)
+    return level
+
+
+def configure_logging(level=LOG_LEVEL, use_queue=LOG_ASYNC):
+    """Send log records through a queue so request threads never wait on the stream.
+
+    The root logger gets a QueueHandler, and a QueueListener thread does the
+    formatting and writing. Calling this again is a no-op.
+    """
+    global _configured
+    if _configured:
+        return
+    root = logging.getLogger()
+    root.setLevel(level)
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT, LOG_DATE_FORMAT))
+    if use_queue:
+        queue_handler = QueueHandler(queue.SimpleQueue())
+        root.addHandler(queue_handler)
+        _start_listener(queue_handler, handler)
+        # Threads do not survive fork, so each gunicorn worker forked from a
+        # --preload parent needs a listener (and a fresh queue) of its own
+        os.register_at_fork(after_in_child=lambda: _start_listener(queue_handler, handler, new_queue=True))
+    else:
+        root.addHandler(handler)
+    _configured = True
+
+
+def _start_listener(queue_handler, handler, new_queue=False):
+    if new_queue:
+        queue_handler.queue = queue.SimpleQueue()
+    listener = QueueListener(queue_handler.queue, handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)  # Flush whatever is still queued on shutdown
+
+
+class RequestTimer:
+    """WSGI middleware that logs one structured line per request.
+
+    The line carries the method, path, endpoint, status, response size and
+    duration, and is written once the response body has been sent, so
+    streamed responses report their full length. Each endpoint can be
+    sampled and given its own level; server errors and requests whose
+    headers took longer than ``slow_ms`` are always logged.
+    """
+
+    def __init__(self, app, sampling=None, levels=None, slow_ms=SLOW_REQUEST_MS, logger=request_logger):
+        self.app = app
+        self.sampling = parse_routes(os.getenv('REQUEST_LOG_SAMPLING', DEFAULT_SAMPLING), float) \
+            if sampling is None else sampling
+        self.levels = parse_routes(os.getenv('REQUEST_LOG_LEVELS', DEFAULT_LEVELS), _level) \
+            if levels is None else levels
+        self.slow_ms = slow_ms
+        self.logger = logger
+
+    def __call__(self, environ, start_response):
+        started = time.perf_counter()
+        state = {'status': None, 'bytes': 0}
+
+        def timed_start_response(status, headers, exc_info=None):
+            state['status'] = int(status.split(' ', 1)[0])
+            state['header_ms'] = (time.perf_counter() - started) * 1000
+            state['length'] = next((value for name, value in headers if name.lower() == 'content-length'), None)
+            return start_response(status, headers, exc_info)
+
+        try:
+            body = self.app(environ, timed_start_response)
+        except Exception:
+            state['status'] = 500
+            self._log(environ, state, started)
+            raise
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if isinstance(file_wrapper, type) and isinstance(body, file_wrapper):
+            # Leave the server's sendfile path alone and take the size from the headers
+            state['bytes'] = int(state.get('length') or 0)
+            self._log(environ, state, started)
+            return body
+        return _TimedBody(body, lambda: self._log(environ, state, started), state)
+
+    def _log(self, environ, state, started):
+        duration_ms = (time.perf_counter() - started) * 1000
+        endpoint = environ.get(ENDPOINT_KEY)
+        status = state['status'] or 0
+        header_ms = state.get('header_ms', duration_ms)
+        rate = self.sampling.get(endpoint, 1.0)
+        # Slowness is judged on time to headers, so long-lived event streams are not all "slow"
+        if status < 500 and header_ms < self.slow_ms and (rate <= 0 or (rate < 1 and random.random() >= rate)):
+            return
+        level = logging.ERROR if status >= 500 else self.levels.get(endpoint, logging.INFO)
+        if not self.logger.isEnabledFor(level):
+            return
+        self.logger.log(level, f"request method={environ.get('REQUEST_METHOD')} path={environ.get('PATH_INFO')} "
+                               f"endpoint={endpoint} status={status} bytes={state['bytes']} "
+                               f"header_ms={header_ms:.1f} duration_ms={duration_ms:.1f} remote={environ.get('REMOTE_ADDR')}"
+                               f"{f' sample={rate:g}' if rate < 1 else ''}")
+
+
+class _TimedBody:
+    """Response iterable that counts bytes and logs when the server closes it."""
+
+    def __init__(self, body, on_close, state):
+        self._body = body
+        self._on_close = on_close
+        self._state = state
+
+    def __iter__(self):
+        for chunk in self._body:
+            self._state['bytes'] += len(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self._body, 'close'):
+                self._body.close()
+        finally:
+            self._on_close()
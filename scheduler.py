@@ -0,0 +1,117 @@
+import os
+import heapq
+import threading
+import time
+import logging
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+
+def default_slots():
+    """One transcode slot per two cores, never fewer than one."""
+    return max(1, (os.cpu_count() or 1) // 2)
+
+
+class TranscodeScheduler:
+    """Fixed pool of transcode workers fed from a FIFO queue.
+
+    Each submitted job runs on one of ``slots`` worker threads. Jobs that
+    arrive while every slot is busy wait in submission order, so the
+    number of concurrent ffmpeg processes never exceeds ``slots``.
+    """
+
+    def __init__(self, slots=None, threads_per_job=None, estimate_seconds=60.0, cpu_count=None):
+        self.slots = slots or default_slots()
+        self.cpu_count = cpu_count or os.cpu_count() or 1
+        self.threads_per_job = threads_per_job or max(1, self.cpu_count // self.slots)
+        self.average_seconds = float(estimate_seconds)
+        self._queue = deque()
+        self._running = {}
+        self._threads = {}  # task_id -> threads granted by claim_threads while it runs
+        self._cond = threading.Condition()
+        self._workers = []
+
+    def _ensure_workers(self):
+        # Workers are started lazily so importing the app never spawns threads
+        while len(self._workers) < self.slots:
+            worker = threading.Thread(target=self._work, name=f'transcode-{len(self._workers)}', daemon=True)
+            self._workers.append(worker)
+            worker.start()
+
+    def submit(self, task_id, fn, *args, **kwargs):
+        """Queue ``fn(*args, **kwargs)`` and return its 1-based queue position."""
+        with self._cond:
+            self._ensure_workers()
+            self._queue.append((task_id, fn, args, kwargs))
+            position = len(self._queue)
+            self._cond.notify()
+        logger.info(f"Queued task {task_id} at position {position} ({len(self._running)}/{self.slots} slots busy)")
+        return position
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                task_id, fn, args, kwargs = self._queue.popleft()
+                started = time.monotonic()
+                self._running[task_id] = started
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"Unhandled error in transcode job {task_id}: {str(e)}", exc_info=True)
+            finally:
+                elapsed = time.monotonic() - started
+                with self._cond:
+                    self._running.pop(task_id, None)
+                    self._threads.pop(task_id, None)
+                    # Exponential moving average keeps estimates tracking recent load
+                    self.average_seconds = 0.8 * self.average_seconds + 0.2 * elapsed
+
+    def position(self, task_id):
+        """Return the 1-based queue position of a waiting task, 0 if running, None if unknown."""
+        with self._cond:
+            if task_id in self._running:
+                return 0
+            for index, entry in enumerate(self._queue):
+                if entry[0] == task_id:
+                    return index + 1
+        return None
+
+    def estimated_start(self, task_id):
+        """Estimate when a queued task will start, as an aware UTC datetime."""
+        with self._cond:
+            waiting = [entry[0] for entry in self._queue]
+            if task_id not in waiting:
+                return None
+            now = time.monotonic()
+            average = self.average_seconds
+            # Seconds until each slot frees up, assuming running jobs take the average time
+            free_at = [max(0.0, average - (now - started)) for started in self._running.values()]
+            free_at += [0.0] * (self.slots - len(free_at))
+            heapq.heapify(free_at)
+            for _ in range(waiting.index(task_id)):
+                heapq.heappush(free_at, heapq.heappop(free_at) + average)
+            wait = free_at[0]
+        return datetime.now(timezone.utc) + timedelta(seconds=wait)
+
+    def claim_threads(self, task_id, wanted):
+        """Grant a running job up to ``wanted`` encoder threads, at least one.
+
+        Jobs that have not claimed any hold ``threads_per_job``. The grant is
+        capped so the threads held by all running jobs stay within the cores;
+        claiming again replaces the job's earlier grant.
+        """
+        with self._cond:
+            held = sum(self._threads.get(running, self.threads_per_job)
+                       for running in self._running if running != task_id)
+            granted = max(1, min(wanted, self.cpu_count - held))
+            if task_id in self._running:
+                self._threads[task_id] = granted
+            return granted
+
+    def stats(self):
+        with self._cond:
+            return {'queued': len(self._queue), 'running': len(self._running), 'slots': self.slots}
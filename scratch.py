@@ -0,0 +1,225 @@
+import os
+import time
+import fcntl
+import shutil
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+TMPFS_DIR = os.getenv('SCRATCH_TMPFS_DIR', '/dev/shm/upvrt-scratch')  # Empty disables tmpfs
+DISK_DIR = os.getenv('SCRATCH_DIR', os.path.join('uploads', 'scratch'))
+RAM_RESERVE_BYTES = int(float(os.getenv('SCRATCH_RAM_RESERVE_MB', 512)) * 1024 * 1024)
+BUDGET_BYTES = int(float(os.getenv('SCRATCH_BUDGET_MB', 4096)) * 1024 * 1024)
+MAX_AGE_SECONDS = float(os.getenv('SCRATCH_MAX_AGE_SECONDS', 3600))
+SWEEP_SECONDS = float(os.getenv('SCRATCH_SWEEP_SECONDS', 300))
+LOCK_NAME = '.lock'
+PENDING_NAME = '.pending'  # Marks a directory made with lock=False that adopt() has not taken yet
+CREATE_GRACE_SECONDS = 60  # A directory this young may not have taken its lock yet
+
+
+def available_memory():
+    """MemAvailable from /proc/meminfo in bytes, or None where it is not readable."""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def directory_size(path):
+    """Bytes allocated under ``path``; sparse files count only the blocks written."""
+    total = 0
+    for directory, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.lstat(os.path.join(directory, filename)).st_blocks * 512
+            except OSError:
+                continue  # Removed while walking
+    return total
+
+
+class ScratchSpace:
+    """Per-task working directories, on tmpfs when RAM allows and on disk otherwise.
+
+    Each task directory holds an flock on its ``.lock`` file for as long as
+    the task runs. The lock is dropped by the kernel when a worker dies, so
+    the janitor can tell live directories, including those of other gunicorn
+    workers, from ones left behind by a crash. Leftovers are kept for
+    ``max_age`` seconds, or until the total size goes over ``budget_bytes``,
+    and the oldest go first.
+    """
+
+    def __init__(self, tmpfs_dir=TMPFS_DIR, disk_dir=DISK_DIR, budget_bytes=BUDGET_BYTES,
+                 max_age=MAX_AGE_SECONDS, ram_reserve=RAM_RESERVE_BYTES, sweep_interval=SWEEP_SECONDS):
+        self.tmpfs_dir = tmpfs_dir if tmpfs_dir and os.path.isdir(os.path.dirname(tmpfs_dir)) else None
+        self.disk_dir = disk_dir
+        self.budget_bytes = budget_bytes
+        self.max_age = max_age
+        self.ram_reserve = ram_reserve
+        self.sweep_interval = sweep_interval
+        self._locks = {}  # task_id -> open lock file
+        self._lock = threading.Lock()
+        self._janitor = None
+
+    @property
+    def roots(self):
+        return [root for root in (self.tmpfs_dir, self.disk_dir) if root]
+
+    def _tmpfs_room(self):
+        if not self.tmpfs_dir:
+            return 0
+        try:
+            free = shutil.disk_usage(os.path.dirname(self.tmpfs_dir)).free
+        except OSError:
+            return 0
+        memory = available_memory()
+        if memory is not None:
+            # tmpfs pages come out of RAM, so leave the encoder its share
+            free = min(free, memory - self.ram_reserve)
+        return free
+
+    def create(self, task_id, expected_bytes=None, lock=True):
+        """Make the directory for ``task_id`` and return its path.
+
+        With ``lock=False`` the directory is left for ``adopt`` to lock later.
+        Until then the janitor removes it only once it is ``max_age`` idle,
+        never to get back under budget.
+        """
+        self._start_janitor()
+        root = self.disk_dir
+        if self.tmpfs_dir and expected_bytes and expected_bytes < self._tmpfs_room():
+            root = self.tmpfs_dir
+        path = os.path.join(root, task_id)
+        os.makedirs(path, exist_ok=True)
+        if lock:
+            lock_file = open(os.path.join(path, LOCK_NAME), 'w')
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            with self._lock:
+                self._locks[task_id] = lock_file
+        else:
+            open(os.path.join(path, PENDING_NAME), 'w').close()
+        logger.info(f"Scratch directory for task {task_id}: {path}")
+        if expected_bytes and self.usage() + expected_bytes > self.budget_bytes:
+            self.sweep()
+        return path
+
+    def locate(self, task_id):
+        """Existing directory for ``task_id`` under any root, or None."""
+        for root in self.roots:
+            path = os.path.join(root, task_id)
+            if os.path.isdir(path):
+                return path
+        return None
+
+    def adopt(self, task_id):
+        """Lock the directory a dead worker left for ``task_id`` and return its path.
+
+        Returns None if there is no such directory or a live worker holds it.
+        """
+        path = self.locate(task_id)
+        if path is None:
+            return None
+        lock = open(os.path.join(path, LOCK_NAME), 'a')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            return None
+        with self._lock:
+            self._locks[task_id] = lock
+        try:
+            os.remove(os.path.join(path, PENDING_NAME))
+        except FileNotFoundError:
+            pass
+        return path
+
+    def release(self, task_id):
+        """Delete the task's directory and drop its lock."""
+        with self._lock:
+            lock = self._locks.pop(task_id, None)
+        path = self.locate(task_id)
+        if path is not None:
+            shutil.rmtree(path, ignore_errors=True)
+        if lock is not None:
+            lock.close()
+
+    def _entries(self):
+        for root in self.roots:
+            try:
+                entries = list(os.scandir(root))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    yield entry
+
+    def _is_live(self, path):
+        try:
+            with open(os.path.join(path, LOCK_NAME), 'a') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+        return False
+
+    def usage(self):
+        return sum(directory_size(entry.path) for entry in self._entries())
+
+    def sweep(self, now=None):
+        """Remove leftovers past ``max_age``, then the oldest ones while over budget.
+
+        Pending directories, made with ``lock=False`` and not adopted yet, are
+        only removed once they are ``max_age`` idle. Returns the number of
+        bytes still in use.
+        """
+        now = now or time.time()
+        live_bytes = 0
+        leftovers = []
+        for entry in self._entries():
+            size = directory_size(entry.path)
+            try:
+                modified = entry.stat().st_mtime
+            except OSError:
+                continue
+            pending = os.path.exists(os.path.join(entry.path, PENDING_NAME))
+            if now - modified < CREATE_GRACE_SECONDS or self._is_live(entry.path):
+                live_bytes += size
+            elif pending and now - modified < self.max_age:
+                live_bytes += size
+            else:
+                leftovers.append((modified, size, entry.path))
+
+        total = live_bytes + sum(size for _, size, _ in leftovers)
+        for modified, size, path in sorted(leftovers):
+            if now - modified < self.max_age and total <= self.budget_bytes:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            logger.info(f"Removed scratch directory {path} ({size / 1024 / 1024:.1f}MB, "
+                        f"{(now - modified) / 60:.0f} minutes old)")
+        if total > self.budget_bytes:
+            logger.warning(f"Scratch space is {total / 1024 / 1024:.0f}MB with only live tasks left, "
+                           f"over the {self.budget_bytes / 1024 / 1024:.0f}MB budget")
+        return total
+
+    def _start_janitor(self):
+        # Started on first use rather than at import, so forked workers each get one
+        with self._lock:
+            if self._janitor is not None and self._janitor.is_alive():
+                return
+            self._janitor = threading.Thread(target=self._run_janitor, name='scratch-janitor', daemon=True)
+            self._janitor.start()
+
+    def _run_janitor(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Scratch janitor failed: {e}")
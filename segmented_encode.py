@@ -0,0 +1,176 @@
+import os
+import bisect
+import shutil
+import threading
+import subprocess
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from encoding import ENCODE_MODE, VBV_BUFFER_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Inputs at least this long are split and encoded in parallel; 0 disables the mode
+SEGMENT_ENCODE_SECONDS = float(os.getenv('SEGMENT_ENCODE_SECONDS', 0))
+SEGMENT_WORKERS = int(os.getenv('SEGMENT_WORKERS', 0))  # 0 means the job's cores / FFMPEG_THREADS
+MIN_SEGMENT_SECONDS = float(os.getenv('SEGMENT_MIN_SECONDS', 10))
+BASELINE_SMOOTHING = 0.3
+
+
+def default_workers(threads_per_job=None, cores=None):
+    """Segment encodes to run at once with ``threads_per_job`` threads each, within ``cores``."""
+    fit = max(1, (cores or os.cpu_count() or 1) // (threads_per_job or 1))
+    if SEGMENT_WORKERS:
+        return min(SEGMENT_WORKERS, fit) if cores else SEGMENT_WORKERS
+    return fit
+
+
+def keyframe_times(path):
+    """Timestamps of the video keyframes in ``path``, read from packet flags without decoding."""
+    try:
+        probe = subprocess.run([
+            'ffprobe', '-v', 'error',
+            '-select_streams', 'v:0',
+            '-show_entries', 'packet=pts_time,flags',
+            '-of', 'csv=p=0',
+            path
+        ], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.error(f"Error reading keyframes from {path}: {e}")
+        return []
+    times = []
+    for line in probe.stdout.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags:
+            try:
+                times.append(float(pts_time))
+            except ValueError:
+                continue  # N/A on some packets
+    return sorted(times)
+
+
+def plan_segments(duration, keyframes, count, min_length=MIN_SEGMENT_SECONDS):
+    """Split ``duration`` into up to ``count`` (start, end) ranges cut at keyframes.
+
+    Cuts go to the keyframe nearest each even split, so every segment starts
+    on a keyframe, and segments shorter than ``min_length`` are merged away.
+    """
+    count = max(1, min(count, int(duration // min_length) if min_length else count))
+    boundaries = [0.0]
+    for index in range(1, count):
+        ideal = duration * index / count
+        cut = ideal
+        if keyframes:
+            position = bisect.bisect_left(keyframes, ideal)
+            nearby = keyframes[max(position - 1, 0):position + 1]
+            cut = min(nearby, key=lambda t: abs(t - ideal))
+        if cut - boundaries[-1] >= min_length and duration - cut >= min_length:
+            boundaries.append(cut)
+    boundaries.append(duration)
+    return list(zip(boundaries, boundaries[1:]))
+
+
+def segment_bitrate(video_bps, duration, count, mode=None):
+    """Video bitrate for each segment so the joined output keeps to the planned size.
+
+    Every segment starts with a full VBV buffer, so in ``vbv`` mode each one
+    can overshoot by a buffer's worth instead of once for the whole clip.
+    """
+    mode = mode or ENCODE_MODE
+    if mode != 'vbv' or count <= 1:
+        return video_bps
+    return int(video_bps * (duration + VBV_BUFFER_SECONDS) / (duration + count * VBV_BUFFER_SECONDS))
+
+
+class CombinedProgress:
+    """Sums the encoded time of every segment into one FFmpegProgress."""
+
+    def __init__(self, progress, count):
+        self._progress = progress
+        self._times = [0.0] * count
+        self._lock = threading.Lock()
+
+    def segment(self, index):
+        return _SegmentProgress(self, index)
+
+    def _update(self, index, time):
+        with self._lock:
+            self._times[index] = time
+            total = sum(self._times)
+        self._progress.update(total)
+
+
+class _SegmentProgress:
+    __slots__ = ('_combined', '_index')
+
+    def __init__(self, combined, index):
+        self._combined = combined
+        self._index = index
+
+    def update(self, time):
+        self._combined._update(self._index, time)
+
+
+class _NoProgress:
+    def update(self, time):
+        pass
+
+
+class ThroughputBaseline:
+    """Recent single-process encode throughput, for reporting the segmented speedup.
+
+    Throughput is measured in output pixels per wall second, so clips of
+    different lengths and resolutions can be compared.
+    """
+
+    def __init__(self):
+        self.pixels_per_second = None
+        self._lock = threading.Lock()
+
+    def record(self, pixels_per_second):
+        with self._lock:
+            if self.pixels_per_second is None:
+                self.pixels_per_second = pixels_per_second
+            else:
+                self.pixels_per_second += BASELINE_SMOOTHING * (pixels_per_second - self.pixels_per_second)
+
+    def speedup(self, pixels_per_second):
+        """How many times faster than the single-process path, or None before any baseline."""
+        if not self.pixels_per_second:
+            return None
+        return pixels_per_second / self.pixels_per_second
+
+
+throughput_baseline = ThroughputBaseline()
+
+
+def encode_segmented(segments, work_dir, segment_command, join_command, run, progress, workers):
+    """Encode ``segments`` in parallel, then join them without re-encoding.
+
+    ``segment_command(start, length, path)`` and ``join_command(list_path)``
+    build the ffmpeg commands and ``run(command, progress, duration)``
+    executes one, returning (returncode, error) like ``run_ffmpeg``.
+    Returns (returncode, error) for the whole encode.
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    combined = CombinedProgress(progress, len(segments))
+    paths = [os.path.join(work_dir, f'segment-{index:03d}.mp4') for index in range(len(segments))]
+
+    def encode(index):
+        start, end = segments[index]
+        return run(segment_command(start, end - start, paths[index]), combined.segment(index), end - start)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(encode, range(len(segments))))
+        for index, (returncode, error) in enumerate(results):
+            if returncode != 0:
+                return returncode, f"Segment {index + 1} of {len(segments)} failed: {error}"
+
+        list_path = os.path.join(work_dir, 'segments.txt')
+        with open(list_path, 'w') as f:
+            for path in paths:
+                f.write(f"file '{os.path.abspath(path)}'\n")
+        return run(join_command(list_path), _NoProgress(), None)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
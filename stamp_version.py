@@ -0,0 +1,57 @@
+"""Write the git commit into version.py so the app never shells out to git at runtime.
+
+    python stamp_version.py                                   # read the commit from git
+    python stamp_version.py --commit abc1234 --message "..."  # e.g. from Docker build args
+
+Leaves version.py unchanged when no commit is given and git is unavailable.
+"""
+import os
+import re
+import sys
+import argparse
+import subprocess
+
+VERSION_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'version.py')
+
+
+def git_commit():
+    """(short hash, subject) of HEAD, or None outside a git checkout."""
+    try:
+        result = subprocess.run(['git', 'log', '-1', '--pretty=format:%h%n%s'],
+                                capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    commit, _, message = result.stdout.partition('\n')
+    return commit, message
+
+
+def stamp(source, commit, message):
+    """Return version.py ``source`` with COMMIT and COMMIT_MESSAGE replaced."""
+    source = re.sub(r'^COMMIT = .*$', lambda _: f'COMMIT = {commit!r}', source, count=1, flags=re.M)
+    return re.sub(r'^COMMIT_MESSAGE = .*$', lambda _: f'COMMIT_MESSAGE = {message!r}', source, count=1, flags=re.M)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--commit', default='')
+    parser.add_argument('--message', default='')
+    parser.add_argument('--file', default=VERSION_FILE)
+    args = parser.parse_args(argv)
+
+    commit, message = args.commit, args.message
+    if not commit:
+        found = git_commit()
+        if found is None:
+            print('No commit given and git is unavailable; version.py left as is')
+            return 0
+        commit, message = found
+    with open(args.file) as f:
+        source = f.read()
+    with open(args.file, 'w') as f:
+        f.write(stamp(source, commit, message))
+    print(f'Stamped {args.file} with {commit}: {message}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
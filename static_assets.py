@@ -0,0 +1,129 @@
+import os
+import gzip
+import hashlib
+import mimetypes
+import logging
+from flask import Response, send_file
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only gzip copies are made
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Fingerprinted URLs change whenever the content does, so they can be cached for a year
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+PLAIN_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', 3600))
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml',
+                      'application/xml', 'image/x-icon', 'image/vnd.microsoft.icon')
+MIN_COMPRESS_BYTES = 512
+DIGEST_LENGTH = 12
+
+
+class Asset:
+    """One file under static/, with its fingerprint and precompressed copies."""
+
+    __slots__ = ('name', 'path', 'digest', 'mimetype', 'fingerprinted', 'encodings')
+
+    def __init__(self, name, path, digest, mimetype):
+        self.name = name
+        self.path = path
+        self.digest = digest
+        self.mimetype = mimetype
+        stem, ext = os.path.splitext(name)
+        self.fingerprinted = f'{stem}.{digest}{ext}'
+        self.encodings = {}  # Content-Encoding -> compressed bytes
+
+
+class StaticAssets:
+    """Fingerprints and precompresses static files once, at startup.
+
+    Each file is served under its logical name and under a name containing
+    its content hash; the hashed name is marked immutable. Text assets get
+    gzip (and brotli, when installed) copies held in memory.
+    """
+
+    def __init__(self, root, url_prefix='/upvrt/static', external_url=None):
+        self.root = root
+        self.url_prefix = url_prefix.rstrip('/')
+        self.external_url = external_url.rstrip('/') if external_url else None
+        self._by_name = {}
+        self._by_fingerprint = {}
+
+    def build(self):
+        by_name = {}
+        for directory, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            for filename in filenames:
+                if filename.startswith('.'):
+                    continue
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, self.root).replace(os.sep, '/')
+                by_name[name] = self._load(name, path)
+        self._by_name = by_name
+        self._by_fingerprint = {asset.fingerprinted: asset for asset in by_name.values()}
+        compressed = sum(1 for asset in by_name.values() if asset.encodings)
+        logger.info(f"Static assets: {len(by_name)} fingerprinted, {compressed} precompressed")
+        return self
+
+    def _load(self, name, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        asset = Asset(name, path, hashlib.sha256(data).hexdigest()[:DIGEST_LENGTH], mimetype)
+        if len(data) >= MIN_COMPRESS_BYTES and mimetype.startswith(COMPRESSIBLE_TYPES):
+            candidates = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                candidates['br'] = brotli.compress(data, quality=11)
+            for encoding, body in candidates.items():
+                # Only keep copies that are worth the Vary header
+                if len(body) < len(data) * 0.9:
+                    asset.encodings[encoding] = body
+        return asset
+
+    def __contains__(self, name):
+        return name in self._by_name
+
+    def url(self, name):
+        """URL for a static file: fingerprinted when it is local, else on STATIC_URL."""
+        asset = self._by_name.get(name)
+        if asset is not None:
+            return f'{self.url_prefix}/{asset.fingerprinted}'
+        if self.external_url:
+            # STATIC_URL points at the images directory itself
+            return f"{self.external_url}/{name[len('images/'):] if name.startswith('images/') else name}"
+        return f'{self.url_prefix}/{name}'
+
+    def lookup(self, filename):
+        """(asset, immutable) for a requested path, or (None, False)."""
+        asset = self._by_fingerprint.get(filename)
+        if asset is not None:
+            return asset, True
+        return self._by_name.get(filename), False
+
+    def _encoding(self, asset, accept_encoding):
+        accepted = {part.split(';')[0].strip() for part in (accept_encoding or '').split(',')}
+        for encoding in ('br', 'gzip'):
+            if encoding in asset.encodings and encoding in accepted:
+                return encoding
+        return None
+
+    def response(self, asset, request, immutable=False):
+        """Serve ``asset`` with caching headers, a precompressed body when accepted, and 304s."""
+        encoding = self._encoding(asset, request.headers.get('Accept-Encoding'))
+        if encoding:
+            response = Response(asset.encodings[encoding], mimetype=asset.mimetype)
+            response.headers['Content-Encoding'] = encoding
+            response.set_etag(f'{asset.digest}-{encoding}')
+        else:
+            response = send_file(asset.path, mimetype=asset.mimetype, etag=asset.digest, conditional=False)
+        if asset.encodings:
+            response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        if immutable:
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.max_age = PLAIN_MAX_AGE
+        return response.make_conditional(request)
@@ -0,0 +1,270 @@
+import os
+import json
+import sqlite3
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ('completed', 'failed')
+
+
+class FFmpegProgress:
+    """Progress record for one upload task.
+
+    Records are bound to a task store when assigned into it. Stage changes
+    are written through immediately; percent updates from the ffmpeg loop
+    are flushed at most once per store ``flush_interval``.
+    """
+
+    __slots__ = ('duration', 'current_time', 'status', 'stage', 'percent', 'error',
+                 'message_link', 'finished_at', 'size_report', 'encoder', '_store', '_task_id', '_flushed_at')
+
+    FIELDS = ('duration', 'current_time', 'status', 'stage', 'percent', 'error',
+              'message_link', 'finished_at', 'size_report', 'encoder')
+
+    def __init__(self, duration=None, status='processing'):
+        self.duration = duration
+        self.current_time = 0
+        self.status = status
+        self.stage = status  # queued, uploading, processing, posting, complete, failed
+        self.percent = 0
+        self.error = None
+        self.message_link = None
+        self.finished_at = None
+        self.size_report = None
+        self.encoder = None  # Preset and threads the encoder policy chose
+        self._store = None
+        self._task_id = None
+        self._flushed_at = 0.0
+
+    def update(self, time):
+        self.current_time = time
+        if self.duration:
+            self.percent = min((time / self.duration) * 100, 100)
+        self._changed()
+
+    def start(self, duration):
+        self.duration = duration
+        self.status = 'processing'
+        self.stage = 'processing'
+        self.percent = 0
+        self._changed(force=True)
+
+    def set_stage(self, stage, percent=None):
+        self.stage = stage
+        if percent is not None:
+            self.percent = percent
+        self._changed(force=True)
+
+    def complete(self, message_link=None):
+        self.status = 'completed'
+        self.percent = 100
+        self.stage = 'complete'
+        self.message_link = message_link
+        self.finished_at = time.time()
+        self._changed(force=True)
+
+    def fail(self, error):
+        self.status = 'failed'
+        self.error = error
+        self.stage = 'failed'
+        self.finished_at = time.time()
+        self._changed(force=True)
+
+    def _changed(self, force=False):
+        if self._store is not None:
+            self._store.flush(self, force=force)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data):
+        progress = cls()
+        for field in cls.FIELDS:
+            if field in data:
+                setattr(progress, field, data[field])
+        return progress
+
+
+class TaskStore:
+    """Dict-like mapping of task_id to FFmpegProgress with TTL eviction.
+
+    Subclasses implement ``_load``, ``_save``, ``_delete``, ``_evict_before``
+    and ``__len__``.
+    """
+
+    def __init__(self, ttl=3600, flush_interval=1.0):
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self._last_evict = 0.0
+
+    def __setitem__(self, task_id, progress):
+        progress._store = self
+        progress._task_id = task_id
+        self.flush(progress, force=True)
+
+    def __getitem__(self, task_id):
+        progress = self.get(task_id)
+        if progress is None:
+            raise KeyError(task_id)
+        return progress
+
+    def __contains__(self, task_id):
+        return self.get(task_id) is not None
+
+    def __delitem__(self, task_id):
+        self._delete(task_id)
+
+    def get(self, task_id, default=None):
+        progress = self._load(task_id)
+        return default if progress is None else progress
+
+    def setdefault(self, task_id, progress):
+        existing = self.get(task_id)
+        if existing is not None:
+            return existing
+        self[task_id] = progress
+        return progress
+
+    def flush(self, progress, force=False):
+        """Persist a bound record, batching unforced writes by ``flush_interval``."""
+        now = time.monotonic()
+        if not force and now - progress._flushed_at < self.flush_interval:
+            return
+        progress._flushed_at = now
+        self._save(progress._task_id, progress)
+        self.maybe_evict()
+
+    def maybe_evict(self):
+        """Drop finished tasks older than the TTL, at most once a minute."""
+        now = time.time()
+        if now - self._last_evict < 60:
+            return
+        self._last_evict = now
+        evicted = self._evict_before(now - self.ttl)
+        if evicted:
+            logger.info(f"Evicted {evicted} finished tasks from task store")
+
+
+class MemoryTaskStore(TaskStore):
+    """Per-process task store backed by a dict."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._tasks = {}
+        self._lock = threading.Lock()
+
+    def _load(self, task_id):
+        return self._tasks.get(task_id)
+
+    def _save(self, task_id, progress):
+        with self._lock:
+            self._tasks[task_id] = progress
+
+    def _delete(self, task_id):
+        with self._lock:
+            del self._tasks[task_id]
+
+    def _evict_before(self, cutoff):
+        with self._lock:
+            expired = [task_id for task_id, progress in self._tasks.items()
+                       if progress.status in FINISHED_STATUSES and (progress.finished_at or 0) < cutoff]
+            for task_id in expired:
+                del self._tasks[task_id]
+        return len(expired)
+
+    def __len__(self):
+        return len(self._tasks)
+
+
+class SQLiteTaskStore(TaskStore):
+    """Task store shared by every worker process through one SQLite file.
+
+    Records owned by this process are kept live in memory so the encode
+    thread keeps mutating the same object; other processes read the last
+    flushed copy from the database.
+    """
+
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._local = {}
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def _connection(self):
+        # Connections must not cross a fork, so reopen after gunicorn forks a worker
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS tasks ('
+                'task_id TEXT PRIMARY KEY, data TEXT NOT NULL, finished_at REAL)'
+            )
+            self._pid = os.getpid()
+        return self._conn
+
+    def _load(self, task_id):
+        if task_id in self._local:
+            return self._local[task_id]
+        with self._lock:
+            row = self._connection().execute('SELECT data FROM tasks WHERE task_id = ?', (task_id,)).fetchone()
+        if row is None:
+            return None
+        # Bind the copy so changes made through it are written back
+        progress = FFmpegProgress.from_dict(json.loads(row[0]))
+        progress._store = self
+        progress._task_id = task_id
+        return progress
+
+    def _save(self, task_id, progress):
+        self._local[task_id] = progress
+        with self._lock:
+            self._connection().execute(
+                'INSERT OR REPLACE INTO tasks (task_id, data, finished_at) VALUES (?, ?, ?)',
+                (task_id, json.dumps(progress.to_dict()), progress.finished_at)
+            )
+        if progress.status in FINISHED_STATUSES:
+            # Nothing will mutate a finished record again, so stop holding it
+            self._local.pop(task_id, None)
+
+    def _delete(self, task_id):
+        self._local.pop(task_id, None)
+        with self._lock:
+            self._connection().execute('DELETE FROM tasks WHERE task_id = ?', (task_id,))
+
+    def _evict_before(self, cutoff):
+        with self._lock:
+            cursor = self._connection().execute(
+                'DELETE FROM tasks WHERE finished_at IS NOT NULL AND finished_at < ?', (cutoff,)
+            )
+        return cursor.rowcount
+
+    def __len__(self):
+        with self._lock:
+            return self._connection().execute('SELECT COUNT(*) FROM tasks').fetchone()[0]
+
+
+def default_sqlite_path():
+    """Prefer shared memory so progress writes never touch the disk."""
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else 'uploads'
+    return os.path.join(directory, 'upvrt-tasks.db')
+
+
+def create_task_store(backend=None, path=None, ttl=None, flush_interval=None):
+    """Build the task store selected by TASK_STORE (memory or sqlite)."""
+    backend = backend or os.getenv('TASK_STORE', 'memory')
+    kwargs = {
+        'ttl': ttl if ttl is not None else int(os.getenv('TASK_TTL_SECONDS', 3600)),
+        'flush_interval': flush_interval if flush_interval is not None else float(os.getenv('TASK_FLUSH_SECONDS', 1.0)),
+    }
+    if backend == 'memory':
+        return MemoryTaskStore(**kwargs)
+    if backend == 'sqlite':
+        return SQLiteTaskStore(path or os.getenv('TASK_STORE_PATH') or default_sqlite_path(), **kwargs)
+    raise ValueError(f"Unknown task store backend: {backend}")
@@ -1,5 +1,23 @@
 import os
 import sys
+import pytest
 
 # Add the project root directory to Python path
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))) 
\ No newline at end of file
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+@pytest.fixture
+def queued_jobs(monkeypatch, tmp_path):
+    """Point the app at scratch space and a job journal under ``tmp_path`` and stop it running jobs.
+
+    Returns the list the scheduler's submissions go to, as ``(task_id, fn, args)``.
+    """
+    import app as app_module
+    from scratch import ScratchSpace
+    from job_journal import JobJournal
+    submissions = []
+    monkeypatch.setattr(app_module, 'scratch', ScratchSpace(tmpfs_dir=None, disk_dir=str(tmp_path / 'scratch')))
+    monkeypatch.setattr(app_module, 'journal', JobJournal(str(tmp_path / 'jobs.jsonl')))
+    monkeypatch.setattr(app_module.scheduler, 'submit',
+                        lambda task_id, fn, *args: submissions.append((task_id, fn, args)) or len(submissions))
+    return submissions
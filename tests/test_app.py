@@ -1,5 +1,8 @@
+import os
 import pytest
-from app import app
+from app import create_app
+
+app = create_app()
 
 @pytest.fixture
 def client():
@@ -8,6 +11,12 @@ def client():
     with app.test_client() as client:
         yield client
 
+def log_in(client):
+    """Put a Discord user in the session as the OAuth callback would"""
+    with client.session_transaction() as sess:
+        sess['user_data'] = {'id': '1', 'username': 'test', 'discriminator': '0', 'avatar': None}
+        sess['_user_id'] = '1'
+
 def test_index_route(client):
     """Test the index route returns 200"""
     rv = client.get('/upvrt/')  # Updated to use correct route
@@ -19,6 +28,14 @@ def test_health_check(client):
     assert rv.status_code == 200
     assert b'ok' in rv.data.lower()
 
+def test_metrics_endpoint_is_public(client):
+    """Metrics are served without logging in"""
+    rv = client.get('/upvrt/metrics')
+    assert rv.status_code == 200
+    assert rv.mimetype == 'text/plain'
+    assert b'# TYPE upvrt_queue_depth gauge' in rv.data
+    assert b'upvrt_task_store_size ' in rv.data
+
 def test_privacy_route(client):
     """Test privacy policy route returns 200"""
     rv = client.get('/upvrt/privacy')
@@ -27,4 +44,226 @@ def test_privacy_route(client):
 def test_tos_route(client):
     """Test terms of service route returns 200"""
     rv = client.get('/upvrt/tos')
-    assert rv.status_code == 200 
\ No newline at end of file
+    assert rv.status_code == 200
+
+def test_callback_logs_in_with_member_lookup(client, monkeypatch):
+    """Test the OAuth callback signs in a guild member from a single member lookup"""
+    import app as app_module
+    monkeypatch.setattr(app_module.discord_client, 'exchange_code', lambda *args: {'access_token': 'user'})
+    monkeypatch.setattr(app_module.discord_client, 'get_current_user', lambda token: {
+        'id': '5', 'username': 'member', 'discriminator': '0', 'avatar': None})
+    monkeypatch.setattr(app_module.discord_client, 'get_current_user_guild_member', lambda token, guild_id: {
+        'user': {'id': '5', 'username': 'member', 'discriminator': '0', 'avatar': None}})
+    rv = client.get('/upvrt/callback?code=abc')
+    assert rv.status_code == 200
+    assert b'var success = true;' in rv.data
+
+def test_callback_refuses_non_members(client, monkeypatch):
+    """Test the OAuth callback refuses a user the member lookup finds outside the guild"""
+    import app as app_module
+    monkeypatch.setattr(app_module.discord_client, 'exchange_code', lambda *args: {'access_token': 'user'})
+    monkeypatch.setattr(app_module.discord_client, 'get_current_user', lambda token: {
+        'id': '6', 'username': 'outsider', 'discriminator': '0', 'avatar': None})
+    monkeypatch.setattr(app_module.discord_client, 'get_current_user_guild_member', lambda token, guild_id: None)
+    rv = client.get('/upvrt/callback?code=abc')
+    assert b'var success = false;' in rv.data
+    assert b'must be a member' in rv.data
+
+def test_progress_stream_sends_final_event(client):
+    """Test the progress stream ends with a completed event"""
+    from app import tasks
+    from task_store import FFmpegProgress
+    tasks['stream-task'] = FFmpegProgress()
+    tasks['stream-task'].complete('https://discord.com/channels/1/2/3')
+    log_in(client)
+    rv = client.get('/upvrt/progress/stream-task/stream')
+    assert rv.status_code == 200
+    assert rv.mimetype == 'text/event-stream'
+    body = rv.get_data(as_text=True)
+    assert 'event: completed' in body
+    assert 'https://discord.com/channels/1/2/3' in body
+
+def test_progress_stream_slots_are_limited(client, monkeypatch):
+    """Test streams past the limit get a 503 and a closed stream frees its slot"""
+    import threading
+    import app as app_module
+    from task_store import FFmpegProgress
+    monkeypatch.setattr(app_module, 'stream_slots', threading.BoundedSemaphore(1))
+    app_module.tasks['slot-task'] = FFmpegProgress()
+    app_module.tasks['slot-task'].complete()
+    log_in(client)
+    first = client.get('/upvrt/progress/slot-task/stream', buffered=False)
+    assert first.status_code == 200
+    assert client.get('/upvrt/progress/slot-task/stream').status_code == 503
+    first.close()
+    rv = client.get('/upvrt/progress/slot-task/stream')
+    assert rv.status_code == 200
+    rv.close()
+
+def test_progress_stream_unknown_task(client):
+    """Test the progress stream returns 404 for unknown tasks"""
+    log_in(client)
+    rv = client.get('/upvrt/progress/missing/stream')
+    assert rv.status_code == 404
+
+def test_upload_streams_to_task_file(client, queued_jobs, tmp_path):
+    """Test uploads are written straight into the task's scratch directory and queued"""
+    import io
+    import app as app_module
+    log_in(client)
+    rv = client.post('/upvrt/upload', data={
+        'video': (io.BytesIO(b'\x00' * 1024), 'clip.mp4'),
+        'channel_id': '123'
+    }, content_type='multipart/form-data')
+    assert rv.status_code == 200
+    task_id = rv.get_json()['task_id']
+    assert [submitted for submitted, _, _ in queued_jobs] == [task_id]
+    input_path = os.path.join(str(tmp_path), 'scratch', task_id, 'input.mp4')
+    assert os.path.getsize(input_path) == 1024
+    state = app_module.journal.get(task_id)
+    assert state.stage == 'uploaded' and state.data['channel_id'] == '123'
+    app_module.scratch.release(task_id)
+    assert not os.path.exists(os.path.dirname(input_path))
+
+def test_upload_over_limit_is_rejected(client, monkeypatch, tmp_path):
+    """Test oversized uploads are rejected while streaming"""
+    import io
+    import app as app_module
+    from scratch import ScratchSpace
+    monkeypatch.setattr(app_module, 'MAX_UPLOAD_BYTES', 512)
+    monkeypatch.setattr(app_module, 'scratch', ScratchSpace(tmpfs_dir=None, disk_dir=str(tmp_path)))
+    log_in(client)
+    rv = client.post('/upvrt/upload', data={
+        'video': (io.BytesIO(b'\x00' * 1024), 'clip.mp4'),
+        'channel_id': '123'
+    }, content_type='multipart/form-data')
+    assert rv.status_code == 413
+    assert os.listdir(str(tmp_path)) == []  # The rejected upload's scratch directory is gone
+
+def test_batch_upload_posts_together(client, queued_jobs, monkeypatch, tmp_path):
+    """Test a multi-file upload is encoded per file and posted as one message"""
+    import io
+    import app as app_module
+
+    def fake_encode(input_path, output_path, task_id, threads=None, ingest=None):
+        with open(output_path, 'wb') as f:
+            f.write(b'\x00' * 100)
+        return True
+    monkeypatch.setattr(app_module, 'process_video_with_progress', fake_encode)
+    posts = []
+    monkeypatch.setattr(app_module.discord_client, 'create_message_with_files',
+                        lambda channel_id, content, files: posts.append(files) or {'id': '9'})
+
+    log_in(client)
+    rv = client.post('/upvrt/upload/batch', data={
+        'videos': [(io.BytesIO(b'\x00' * 512), 'a.mp4'), (io.BytesIO(b'\x00' * 256), 'b.mp4')],
+        'channel_id': '123'
+    }, content_type='multipart/form-data')
+    assert rv.status_code == 200
+    result = rv.get_json()
+    assert len(result['task_ids']) == 2 and len(queued_jobs) == 2
+
+    for _, fn, args in queued_jobs:
+        fn(*args)
+    assert [[filename for _, filename in files] for files in posts] == [['a.mp4', 'b.mp4']]
+    progress = client.get(f"/upvrt/batch/{result['batch_id']}").get_json()
+    assert progress['status'] == 'completed'
+    assert len(progress['message_links']) == 1 and progress['message_links'][0].endswith('/123/9')
+    assert os.listdir(str(tmp_path / 'scratch')) == []
+
+def test_batch_upload_rejects_non_mp4(client, monkeypatch, tmp_path):
+    """Test a batch with a non-MP4 file is rejected and its scratch directories removed"""
+    import io
+    import app as app_module
+    from scratch import ScratchSpace
+    monkeypatch.setattr(app_module, 'scratch', ScratchSpace(tmpfs_dir=None, disk_dir=str(tmp_path)))
+    log_in(client)
+    rv = client.post('/upvrt/upload/batch', data={
+        'videos': [(io.BytesIO(b'\x00' * 16), 'a.mp4'), (io.BytesIO(b'\x00' * 16), 'b.mov')],
+        'channel_id': '123'
+    }, content_type='multipart/form-data')
+    assert rv.status_code == 400
+    assert os.listdir(str(tmp_path)) == []
+
+def test_chunked_upload_resumes_and_finalizes(client, queued_jobs, monkeypatch):
+    """Test a chunked upload takes chunks in any order, retried ones once, and queues the job on finalize"""
+    import hashlib
+    import app as app_module
+    monkeypatch.setattr(app_module, 'UPLOAD_CHUNK_BYTES', 4096)
+    log_in(client)
+    payload = os.urandom(10000)
+
+    rv = client.post('/upvrt/upload/chunked', json={'filename': 'clip.mp4', 'size': len(payload), 'channel_id': '123'})
+    assert rv.status_code == 200
+    upload = rv.get_json()
+    upload_id, chunk_size = upload['upload_id'], upload['chunk_size']
+    assert upload['chunk_count'] == 3 and upload['received'] == []
+
+    def put(index, data=None):
+        chunk = payload[index * chunk_size:(index + 1) * chunk_size]
+        return client.put(f'/upvrt/upload/chunked/{upload_id}/{index}', data=data or chunk,
+                          headers={'X-Chunk-SHA256': hashlib.sha256(chunk).hexdigest()})
+
+    assert put(1, b'\x00' * 4096).status_code == 400
+    assert put(1).get_json()['stored'] is True
+    assert put(1).get_json()['stored'] is False
+    rv = client.post(f'/upvrt/upload/chunked/{upload_id}/finalize')
+    assert rv.status_code == 409 and rv.get_json()['missing'] == [0, 2]
+    assert client.get(f'/upvrt/upload/chunked/{upload_id}').get_json()['received'] == [1]
+
+    assert put(0).status_code == 200 and put(2).status_code == 200
+    rv = client.post(f'/upvrt/upload/chunked/{upload_id}/finalize')
+    assert rv.get_json() == {'task_id': upload_id, 'queue_position': 1}
+    task_id, task_dir, user_id, job = queued_jobs[0][2]
+    assert task_id == upload_id and user_id == '1'
+    assert job['filename'] == 'clip.mp4' and job['channel_id'] == '123'
+    with open(os.path.join(task_dir, 'input.mp4'), 'rb') as f:
+        assert f.read() == payload
+    # Finalizing again returns the same task rather than queueing a second job
+    assert client.post(f'/upvrt/upload/chunked/{upload_id}/finalize').get_json()['task_id'] == upload_id
+    assert len(queued_jobs) == 1
+
+def test_chunked_upload_rejects_bad_starts(client, monkeypatch, tmp_path):
+    """Test a chunked upload must be an MP4 under the size limit, and is private to its user"""
+    import app as app_module
+    from scratch import ScratchSpace
+    monkeypatch.setattr(app_module, 'scratch', ScratchSpace(tmpfs_dir=None, disk_dir=str(tmp_path)))
+    log_in(client)
+    assert client.post('/upvrt/upload/chunked', json={'filename': 'a.mov', 'size': 10, 'channel_id': '1'}).status_code == 400
+    assert client.post('/upvrt/upload/chunked', json={'filename': 'a.mp4', 'channel_id': '1'}).status_code == 400
+    too_big = app_module.MAX_UPLOAD_BYTES + 1
+    assert client.post('/upvrt/upload/chunked', json={'filename': 'a.mp4', 'size': too_big, 'channel_id': '1'}).status_code == 413
+    upload_id = client.post('/upvrt/upload/chunked', json={'filename': 'a.mp4', 'size': 10, 'channel_id': '1'}).get_json()['upload_id']
+    with client.session_transaction() as sess:
+        sess['user_data'] = {'id': '2', 'username': 'other', 'discriminator': '0', 'avatar': None}
+        sess['_user_id'] = '2'
+    assert client.get(f'/upvrt/upload/chunked/{upload_id}').status_code == 404
+    assert client.get('/upvrt/upload/chunked/..').status_code == 404
+
+def test_static_asset_is_fingerprinted_and_immutable(client):
+    """Templates link fingerprinted static URLs that are cached for good"""
+    from app import static_assets
+    url = static_assets.url('images/progress-bg.png')
+    assert url != '/upvrt/static/images/progress-bg.png'
+    rv = client.get(url)
+    assert rv.status_code == 200
+    assert 'immutable' in rv.headers['Cache-Control']
+    assert client.get(url, headers={'If-None-Match': rv.headers['ETag']}).status_code == 304
+
+def test_run_ffmpeg_stops_once_cancelled_after_input():
+    """A streamed encode whose output turned up in the cache is killed once its input is fed"""
+    import sys
+    import time
+    import threading
+    from app import run_ffmpeg
+    from task_store import FFmpegProgress
+    cancel = threading.Event()
+
+    def source():
+        yield b'x' * 1024
+        cancel.set()
+    started = time.monotonic()
+    returncode, _ = run_ffmpeg([sys.executable, '-c', 'import sys, time; sys.stdin.read(); time.sleep(30)'],
+                               FFmpegProgress(), 1.0, source=source(), cancel=cancel)
+    assert returncode != 0
+    assert time.monotonic() - started < 10
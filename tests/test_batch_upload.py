@@ -0,0 +1,51 @@
+from batch_upload import Batch, BatchItem, BatchRegistry, plan_messages
+
+MB = 1024 * 1024
+
+
+def items(*sizes):
+    return [BatchItem(f't{index}', f'{index}.mp4', f'/tmp/{index}.mp4', size=size * MB)
+            for index, size in enumerate(sizes)]
+
+
+def test_plan_packs_into_fewest_messages():
+    """Outputs are packed by size so three 9MB-ish clips and small ones share messages"""
+    messages = plan_messages(items(9, 2, 9, 3, 9, 1), max_files=10, max_bytes=25 * MB)
+    assert len(messages) == 2
+    assert all(sum(item.size for item in message) <= 25 * MB for message in messages)
+    # Upload order is kept within and across messages
+    assert [item.task_id for item in messages[0]] == ['t0', 't1', 't2', 't3', 't5']
+    assert [item.task_id for item in messages[1]] == ['t4']
+
+
+def test_plan_respects_attachment_count():
+    messages = plan_messages(items(*[1] * 12), max_files=10, max_bytes=100 * MB)
+    assert [len(message) for message in messages] == [10, 2]
+
+
+def test_plan_puts_oversized_item_on_its_own():
+    messages = plan_messages(items(30, 1), max_files=10, max_bytes=25 * MB)
+    assert [[item.task_id for item in message] for message in messages] == [['t0'], ['t1']]
+
+
+def test_batch_posts_once_after_last_finish(tmp_path):
+    batch = Batch('b', '123', '1')
+    for name in ('a', 'b', 'c'):
+        batch.add(name, f'{name}.mp4', str(tmp_path / f'{name}.mp4'))
+    (tmp_path / 'a.mp4').write_bytes(b'x' * 10)
+    (tmp_path / 'c.mp4').write_bytes(b'x' * 20)
+    assert batch.finish('a', True) is None
+    assert batch.finish('b', False) is None
+    ready = batch.finish('c', True)
+    assert [item.task_id for item in ready] == ['a', 'c']
+    assert [item.size for item in ready] == [10, 20]
+
+
+def test_registry_forgets_expired_batches():
+    registry = BatchRegistry(ttl=60)
+    old = Batch('old', '1', '1')
+    old.created_at -= 120
+    registry.add(old)
+    registry.add(Batch('new', '1', '1'))
+    assert registry.get('old') is None
+    assert registry.get('new') is not None
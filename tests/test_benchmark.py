@@ -0,0 +1,40 @@
+from benchmark import FIXTURES, Fixture, compare
+
+BASELINE = {
+    'clip': {'ok': True, 'wall_seconds': 10.0, 'cpu_seconds': 40.0, 'peak_rss_mb': 200.0,
+             'realtime_factor': 3.0, 'size_error_percent': -4.0},
+}
+
+
+def result(**overrides):
+    return {'clip': dict(BASELINE['clip'], **overrides)}
+
+
+def test_fixtures_cover_orientation_and_length():
+    assert len({f.name for f in FIXTURES}) == len(FIXTURES)
+    assert any(f.height > f.width for f in FIXTURES)
+    assert any(f.width > f.height for f in FIXTURES)
+    assert min(f.duration for f in FIXTURES) < 30 < max(f.duration for f in FIXTURES)
+
+
+def test_fixture_command_uses_lavfi_sources():
+    command = Fixture('noisy', 'testsrc2', 5, 640, 360, filters='noise=alls=60:allf=t').command('out.mp4')
+    assert 'testsrc2=size=640x360:rate=30,noise=alls=60:allf=t' in command
+    assert command[command.index('-t') + 1] == '5'
+    assert command[-1] == 'out.mp4'
+
+
+def test_within_tolerance_is_not_a_regression():
+    assert compare(result(wall_seconds=11.0, realtime_factor=2.7), BASELINE, tolerance=0.15) == []
+
+
+def test_slower_encode_is_a_regression():
+    regressions = compare(result(wall_seconds=12.0, realtime_factor=2.5), BASELINE, tolerance=0.15)
+    assert len(regressions) == 2
+    assert regressions[0].startswith('clip: wall_seconds')
+
+
+def test_size_error_and_failures_are_regressions():
+    assert compare(result(size_error_percent=-10.0), BASELINE, size_points=5)
+    assert compare(result(ok=False), BASELINE) == ['clip: encode failed']
+    assert compare({'new_clip': BASELINE['clip']}, BASELINE) == []
@@ -0,0 +1,60 @@
+import time
+from channel_directory import ChannelDirectory
+
+CHANNELS = [
+    {'id': '1', 'name': 'general', 'type': 0},
+    {'id': '2', 'name': 'voice', 'type': 2},
+]
+
+
+def test_first_read_fetches_and_filters_text_channels():
+    calls = []
+    directory = ChannelDirectory(lambda: calls.append(1) or CHANNELS, ttl=60)
+    assert directory.get() == [CHANNELS[0]]
+    assert directory.get() == [CHANNELS[0]]
+    assert len(calls) == 1
+
+
+def test_stale_list_served_while_refreshing():
+    responses = [CHANNELS, [{'id': '3', 'name': 'clips', 'type': 0}]]
+    directory = ChannelDirectory(lambda: responses.pop(0), ttl=60)
+    directory.get()
+    directory.invalidate()
+
+    assert directory.get() == [CHANNELS[0]]
+    deadline = time.time() + 5
+    while directory.get()[0]['id'] != '3' and time.time() < deadline:
+        time.sleep(0.01)
+    assert directory.get()[0]['id'] == '3'
+
+
+def test_failed_refresh_keeps_previous_list():
+    responses = [CHANNELS]
+
+    def fetch():
+        if not responses:
+            raise IOError('discord down')
+        return responses.pop(0)
+    directory = ChannelDirectory(fetch, ttl=60)
+    directory.get()
+    assert directory.refresh() == [CHANNELS[0]]
+    directory.invalidate(drop=True)
+    assert directory.get() == []
+
+
+def test_failed_fetch_is_not_retried_until_backoff_passes():
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        raise IOError('discord down')
+    directory = ChannelDirectory(fetch, ttl=60, retry_after=0.2)
+    assert directory.get() == []
+    assert directory.get() == []
+    assert len(calls) == 1
+    time.sleep(0.25)
+    assert directory.get() == []
+    assert len(calls) == 2
+    directory.invalidate()  # An explicit refresh asks Discord straight away
+    directory.get()
+    assert len(calls) == 3
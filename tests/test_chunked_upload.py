@@ -0,0 +1,63 @@
+import io
+import hashlib
+import pytest
+from chunked_upload import ChunkedUpload, ChunkRejected
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.fixture
+def payload():
+    return bytes(range(256)) * 40  # 10240 bytes: chunks of 4096, 4096 and 2048
+
+
+def test_chunks_assemble_in_place_in_any_order(tmp_path, payload):
+    upload = ChunkedUpload.create(str(tmp_path), len(payload), chunk_size=4096, filename='a.mp4')
+    assert upload.chunk_count == 3 and upload.chunk_length(2) == 2048
+    for index in (2, 0, 1):
+        chunk = payload[index * 4096:(index + 1) * 4096]
+        assert upload.write_chunk(index, io.BytesIO(chunk), sha256(chunk)) is True
+    assert upload.missing() == []
+    with open(upload.input_path, 'rb') as f:
+        assert f.read() == payload
+
+
+def test_repeated_chunk_is_not_read_again(tmp_path, payload):
+    upload = ChunkedUpload.create(str(tmp_path), len(payload), chunk_size=4096)
+    chunk = payload[:4096]
+    upload.write_chunk(0, io.BytesIO(chunk), sha256(chunk))
+    repeat = io.BytesIO(chunk)
+    assert upload.write_chunk(0, repeat, sha256(chunk).upper()) is False
+    assert repeat.tell() == 0
+    with pytest.raises(ChunkRejected) as e:
+        upload.write_chunk(0, io.BytesIO(b'x' * 4096), sha256(b'x' * 4096))
+    assert e.value.status == 409
+
+
+def test_damaged_or_short_chunk_is_not_recorded(tmp_path, payload):
+    upload = ChunkedUpload.create(str(tmp_path), len(payload), chunk_size=4096)
+    chunk = payload[:4096]
+    with pytest.raises(ChunkRejected, match='SHA-256'):
+        upload.write_chunk(0, io.BytesIO(b'\xff' + chunk[1:]), sha256(chunk))
+    with pytest.raises(ChunkRejected, match='4096 bytes'):
+        upload.write_chunk(0, io.BytesIO(chunk[:100]), sha256(chunk))
+    with pytest.raises(ChunkRejected):
+        upload.write_chunk(0, io.BytesIO(chunk), 'not-a-hash')
+    with pytest.raises(ChunkRejected, match='out of range'):
+        upload.write_chunk(3, io.BytesIO(chunk), sha256(chunk))
+    assert upload.received() == []
+    # A good resend replaces the damaged bytes
+    assert upload.write_chunk(0, io.BytesIO(chunk), sha256(chunk)) is True
+    assert upload.received() == [0]
+
+
+def test_reopened_upload_sees_received_chunks(tmp_path, payload):
+    upload = ChunkedUpload.create(str(tmp_path), len(payload), chunk_size=4096, user_id='1')
+    chunk = payload[4096:8192]
+    upload.write_chunk(1, io.BytesIO(chunk), sha256(chunk))
+    reopened = ChunkedUpload.open(str(tmp_path))
+    assert reopened.manifest['user_id'] == '1'
+    assert reopened.missing() == [0, 2]
+    assert ChunkedUpload.open(str(tmp_path / 'missing')) is None
@@ -0,0 +1,118 @@
+import time
+import pytest
+import requests
+import discord_api
+from discord_api import DiscordClient, MultipartFileBody
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self._body = body or {}
+        self.headers = headers or {}
+        self.text = str(self._body)
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(response=self)
+
+
+class FakeHTTP:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        body = kwargs.get('data')
+        if hasattr(body, 'read'):
+            kwargs['data'] = b''.join(iter(lambda: body.read(7), b''))
+        self.calls.append((method, url, kwargs))
+        return self.responses.pop(0)
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(discord_api, 'BACKOFF_SECONDS', 0.001)
+
+
+def test_retries_429_using_retry_after():
+    http = FakeHTTP([FakeResponse(429, {'retry_after': 0.01}), FakeResponse(200, {'id': '42'})])
+    client = DiscordClient('token', api_base='http://discord.test', http=http)
+    assert client.get_guild_channels('9') == {'id': '42'}
+    assert len(http.calls) == 2
+    assert http.calls[0][1] == 'http://discord.test/guilds/9/channels'
+    assert http.calls[0][2]['headers']['Authorization'] == 'Bot token'
+
+
+def test_gives_up_after_bounded_retries_on_5xx():
+    http = FakeHTTP([FakeResponse(502)] * 3)
+    client = DiscordClient('token', http=http, max_retries=2)
+    with pytest.raises(requests.HTTPError):
+        client.get_guild_channels('9')
+    assert len(http.calls) == 3
+
+
+def test_exhausted_bucket_waits_for_reset():
+    headers = {'X-RateLimit-Bucket': 'abc', 'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset-After': '0.2'}
+    http = FakeHTTP([FakeResponse(200, {}, headers), FakeResponse(200, {})])
+    client = DiscordClient('token', http=http)
+    client.get_guild_channels('9')
+    started = time.monotonic()
+    client.get_guild_channels('9')
+    assert time.monotonic() - started >= 0.15
+
+
+def test_oauth_calls_use_user_token():
+    http = FakeHTTP([FakeResponse(200, {'access_token': 'user'}), FakeResponse(200, {'id': '1'})])
+    client = DiscordClient('bot', http=http)
+    client.exchange_code('code', 'id', 'secret', 'http://localhost/callback', 'identify')
+    client.get_current_user('user')
+    assert 'Authorization' not in http.calls[0][2]['headers']
+    assert http.calls[1][2]['headers']['Authorization'] == 'Bearer user'
+
+
+def test_attachment_streamed_from_disk(tmp_path):
+    video = tmp_path / 'clip.mp4'
+    video.write_bytes(b'video-bytes' * 10)
+    http = FakeHTTP([FakeResponse(200, {'id': '5'})])
+    client = DiscordClient('token', http=http)
+    assert client.create_message('7', 'hello', str(video), 'clip.mp4') == {'id': '5'}
+
+    kwargs = http.calls[0][2]
+    body = kwargs['data']
+    assert kwargs['headers']['Content-Type'].startswith('multipart/form-data; boundary=')
+    assert b'name="content"\r\n\r\nhello\r\n' in body
+    assert b'filename="clip.mp4"' in body
+    assert b'video-bytes' * 10 in body
+    assert len(body) == len(MultipartFileBody({'content': 'hello'}, 'file', str(video), 'clip.mp4'))
+
+
+def test_several_attachments_in_one_message(tmp_path):
+    paths = []
+    for name in ('a', 'b'):
+        path = tmp_path / f'{name}.mp4'
+        path.write_bytes(f'{name}-video'.encode() * 5)
+        paths.append(str(path))
+    http = FakeHTTP([FakeResponse(200, {'id': '6'})])
+    client = DiscordClient('token', http=http)
+    assert client.create_message_with_files('7', 'two', [(paths[0], 'a.mp4'), (paths[1], 'b.mp4')]) == {'id': '6'}
+
+    body = http.calls[0][2]['data']
+    assert b'name="files[0]"; filename="a.mp4"' in body
+    assert b'name="files[1]"; filename="b.mp4"' in body
+    assert b'a-video' * 5 in body and b'b-video' * 5 in body
+    boundary = http.calls[0][2]['headers']['Content-Type'].split('boundary=')[1].encode()
+    assert body.endswith(b'--' + boundary + b'--\r\n')
+    assert body.count(b'--' + boundary) == 4  # content, two files, closing
+
+
+def test_guild_member_lookup_returns_none_when_not_a_member():
+    http = FakeHTTP([FakeResponse(200, {'user': {'id': '7'}}), FakeResponse(404, {'code': 10004})])
+    client = DiscordClient('bot', http=http)
+    assert client.get_current_user_guild_member('user', '9') == {'user': {'id': '7'}}
+    assert http.calls[0][1].endswith('/users/@me/guilds/9/member')
+    assert http.calls[0][2]['headers']['Authorization'] == 'Bearer user'
+    assert client.get_current_user_guild_member('user', '9') is None
@@ -0,0 +1,68 @@
+import json
+import pytest
+from encoder_policy import EncoderPolicy, ThroughputModel, PRESETS, DEFAULT_PIXELS_PER_THREAD, RELATIVE_SPEED
+
+PIXEL_RATE_720P30 = 1280 * 720 * 30
+
+
+def idle(slots=2):
+    return {'queued': 0, 'running': 1, 'slots': slots}
+
+
+def test_unmeasured_presets_scale_from_the_nearest_measured_one(tmp_path):
+    model = ThroughputModel(str(tmp_path / 'model.json'))
+    assert model.speed('medium') == DEFAULT_PIXELS_PER_THREAD * RELATIVE_SPEED['medium']
+    model.record('veryfast', 4, 100e6 * 4 ** 0.8, 1.0)
+    assert model.speed('veryfast') == pytest.approx(100e6)
+    assert model.speed('superfast') == pytest.approx(100e6 * RELATIVE_SPEED['superfast'] / RELATIVE_SPEED['veryfast'])
+    assert model.predict_seconds('veryfast', 4, 100e6 * 4 ** 0.8) == pytest.approx(1.0)
+
+
+def test_model_learns_and_persists(tmp_path):
+    path = str(tmp_path / 'model.json')
+    model = ThroughputModel(path)
+    model.record('fast', 1, 100e6, 1.0)
+    model.record('fast', 1, 200e6, 1.0)
+    assert model.speed('fast') == pytest.approx(130e6)
+    assert ThroughputModel(path).measured() == model.measured()
+    model.record('fast', 1, 50e6, 1.0, replace=True)
+    assert model.speed('fast') == pytest.approx(50e6)
+    with open(path, 'w') as f:
+        json.dump({'speeds': 'garbage'}, f)
+    assert ThroughputModel(path).measured() == {}
+
+
+def test_short_clips_get_slower_presets_than_long_ones():
+    policy = EncoderPolicy(ThroughputModel(None), target_seconds=60, cpu_count=4)
+    short = policy.choose(10, PIXEL_RATE_720P30, idle(), threads_per_job=2)
+    long = policy.choose(1800, PIXEL_RATE_720P30, idle(), threads_per_job=2)
+    assert short.preset == 'medium' and short.reason == 'within budget'
+    assert long.preset == 'superfast' and long.reason == 'over budget'
+    assert short.predicted_seconds <= short.budget_seconds
+
+
+def test_backlog_shrinks_the_budget_and_threads():
+    policy = EncoderPolicy(ThroughputModel(None), target_seconds=120, cpu_count=8)
+    quiet = policy.choose(120, PIXEL_RATE_720P30, {'queued': 0, 'running': 1, 'slots': 4}, threads_per_job=2)
+    busy = policy.choose(120, PIXEL_RATE_720P30, {'queued': 12, 'running': 4, 'slots': 4}, threads_per_job=2)
+    assert quiet.threads == 8 and busy.threads == 2
+    assert busy.budget_seconds == pytest.approx(30)
+    assert PRESETS.index(busy.preset) < PRESETS.index(quiet.preset)
+
+
+def test_idle_slots_lend_only_their_share():
+    policy = EncoderPolicy(ThroughputModel(None), cpu_count=8)
+    wanted = [policy.threads({'queued': 0, 'running': running, 'slots': 4}, 2) for running in (1, 2, 3, 4)]
+    assert wanted == [8, 6, 4, 2]
+    granted = policy.choose(60, PIXEL_RATE_720P30, idle(), threads_per_job=2, threads=3)
+    assert granted.threads == 3
+
+
+def test_fixed_preset_and_segmented_encodes():
+    policy = EncoderPolicy(ThroughputModel(None), fixed_preset='fast', cpu_count=8)
+    choice = policy.choose(60, PIXEL_RATE_720P30, idle(), threads_per_job=2, processes=4)
+    assert (choice.preset, choice.threads, choice.reason) == ('fast', 2, 'fixed')
+    assert choice.to_dict()['preset'] == 'fast'
+    with pytest.raises(ValueError):
+        EncoderPolicy(ThroughputModel(None), fastest='slow', slowest='fast')
+
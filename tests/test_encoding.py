@@ -0,0 +1,40 @@
+from encoding import (ABSOLUTE_MIN_VIDEO_BITRATE_BPS, MIN_VIDEO_BITRATE_BPS, VBV_BUFFER_SECONDS,
+                      plan_bitrates, rate_control_args, corrected_bitrate, size_report)
+
+TARGET = 9.5 * 1024 * 1024
+
+
+def test_vbv_plan_stays_under_target_including_buffer():
+    video_bps, audio_bps = plan_bitrates(60, TARGET, mode='vbv')
+    worst_case_bits = video_bps * (60 + VBV_BUFFER_SECONDS) + audio_bps * 60
+    assert worst_case_bits <= TARGET * 8
+    assert audio_bps == 96 * 1024
+
+
+def test_long_clips_trade_audio_before_dropping_below_floor():
+    video_bps, audio_bps = plan_bitrates(240, TARGET, mode='vbv')
+    assert audio_bps < 96 * 1024
+    assert video_bps >= MIN_VIDEO_BITRATE_BPS or audio_bps == 48 * 1024
+    assert video_bps >= ABSOLUTE_MIN_VIDEO_BITRATE_BPS
+
+
+def test_clips_that_cannot_fit_are_rejected_before_encoding():
+    assert plan_bitrates(3600, TARGET) is None
+
+
+def test_rate_control_args():
+    assert rate_control_args(1000, mode='abr') == ['-b:v', '1000']
+    assert '-maxrate' in rate_control_args(1000, mode='vbv')
+
+
+def test_corrected_bitrate_lands_under_target():
+    duration, audio_bps, video_bps = 60, 96 * 1024, 1_200_000
+    overshoot = 11 * 1024 * 1024
+    corrected = corrected_bitrate(video_bps, audio_bps, duration, overshoot, TARGET)
+    assert corrected < video_bps
+    predicted = (overshoot - audio_bps * duration / 8) * corrected / video_bps + audio_bps * duration / 8
+    assert predicted < TARGET
+
+
+def test_size_report():
+    assert size_report(TARGET / 2, TARGET)['error_percent'] == -50.0
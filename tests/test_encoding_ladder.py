@@ -0,0 +1,42 @@
+from encoding import plan_bitrates
+from encoding_ladder import choose_rendition, RUNGS
+
+TARGET = 9.5 * 1024 * 1024
+
+
+def test_short_clip_keeps_top_rung():
+    video_bps, _ = plan_bitrates(20, TARGET)
+    rendition = choose_rendition(video_bps, 1920, 1080, 60)
+    assert (rendition.width, rendition.height, rendition.frame_rate) == (1280, 720, 30)
+
+
+def test_long_clip_steps_down_the_ladder():
+    short = choose_rendition(plan_bitrates(20, TARGET)[0], 1920, 1080, 30)
+    long = choose_rendition(plan_bitrates(180, TARGET)[0], 1920, 1080, 30)
+    assert long.width * long.height < short.width * short.height
+    assert long.bits_per_pixel >= 0.05
+
+
+def test_small_sources_are_never_upscaled():
+    rendition = choose_rendition(5_000_000, 640, 480, 24)
+    assert (rendition.width, rendition.height, rendition.frame_rate) == (640, 480, 24)
+
+
+def test_aspect_ratio_is_kept_for_portrait_and_wide_sources():
+    portrait = choose_rendition(5_000_000, 1080, 1920, 30)
+    assert (portrait.width, portrait.height) == (720, 1280)
+    square = choose_rendition(5_000_000, 1080, 1080, 30)
+    assert square.width == square.height == 720
+    wide = choose_rendition(5_000_000, 2560, 1080, 30)
+    assert wide.width == 1280 and wide.height % 2 == 0 and wide.height < 720
+
+
+def test_starved_budget_lowers_frame_rate_on_smallest_rung():
+    rendition = choose_rendition(60_000, 1920, 1080, 30)
+    assert (rendition.width, rendition.height) == RUNGS[-1]
+    assert rendition.frame_rate == 15
+
+
+def test_watermark_follows_output_width():
+    assert choose_rendition(5_000_000, 1920, 1080, 30).watermark_size == (256, 144)
+    assert choose_rendition(5_000_000, 640, 360, 30).watermark_size == (128, 72)
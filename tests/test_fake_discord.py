@@ -0,0 +1,77 @@
+from urllib.parse import urlsplit
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+import discord_api
+from discord_api import DiscordClient
+from fake_discord import Buckets, create_fake_discord
+
+
+class FlaskHTTP:
+    """Sends DiscordClient's requests to a Flask app's test client instead of the network."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, url, headers=None, timeout=None, data=None, json=None):
+        if hasattr(data, 'read'):
+            data = b''.join(iter(lambda: data.read(65536), b''))
+        result = self.client.open(urlsplit(url).path, method=method, headers=headers, data=data, json=json)
+        response = requests.Response()
+        response.status_code = result.status_code
+        response.headers = CaseInsensitiveDict(result.headers)
+        response._content = result.data
+        response.url = url
+        return response
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(discord_api, 'BACKOFF_SECONDS', 0.001)
+
+
+def client_for(app, **kwargs):
+    return DiscordClient('fake', api_base='http://fake.test/api', http=FlaskHTTP(app), **kwargs)
+
+
+def test_sign_in_flow():
+    client = client_for(create_fake_discord(bucket_limit=100))
+    tokens = client.exchange_code('alice', 'id', 'secret', 'http://app/callback', 'identify guilds.members.read')
+    member = client.get_current_user_guild_member(tokens['access_token'], '1')
+    assert member['user']['username'] == 'alice'
+    assert client.get_current_user(tokens['access_token'])['id'] == member['user']['id']
+    assert client.get_current_user_guild_member('fake-outsider-1', '1') is None
+    assert [channel['id'] for channel in client.get_guild_channels('1')] == ['100', '101', '102']
+
+
+def test_posts_attachments_and_rejects_oversized(tmp_path):
+    app = create_fake_discord(bucket_limit=100, max_file_bytes=1000)
+    client = client_for(app)
+    small, large = tmp_path / 'a.mp4', tmp_path / 'b.mp4'
+    small.write_bytes(b'x' * 500)
+    large.write_bytes(b'x' * 1500)
+    message = client.create_message_with_files('100', 'hi', [(str(small), 'a.mp4'), (str(small), 'c.mp4')])
+    assert [attachment['filename'] for attachment in message['attachments']] == ['a.mp4', 'c.mp4']
+    with pytest.raises(requests.HTTPError) as e:
+        client.create_message('100', 'hi', str(large))
+    assert e.value.response.status_code == 413
+    stats = app.test_client().get('/fake/stats').get_json()
+    assert stats['messages'] == 1 and stats['attachments'] == 2 and stats['too_large'] == 1
+
+
+def test_client_retries_injected_429():
+    app = create_fake_discord(bucket_limit=100, inject_429=0.5, seed=3)
+    client = client_for(app, max_retries=10)
+    for _ in range(5):
+        assert client.get_guild_channels('1')
+    stats = app.test_client().get('/fake/stats').get_json()
+    assert stats['rate_limited'] > 0
+    assert stats['requests'] == 5 + stats['rate_limited']
+
+
+def test_bucket_limits_requests_per_window():
+    buckets = Buckets(limit=2, reset_seconds=60)
+    assert buckets.take('a')[:2] == (True, 1)
+    assert buckets.take('a')[:2] == (True, 0)
+    assert buckets.take('a')[0] is False
+    assert buckets.take('b')[0] is True
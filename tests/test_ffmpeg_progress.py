@@ -0,0 +1,46 @@
+import io
+from ffmpeg_progress import StderrRing, follow_progress, parse_progress
+
+BLOCK = b"""frame=300
+fps=59.94
+bitrate=1203.4kbits/s
+total_size=1503232
+out_time_us=10000000
+out_time_ms=10000000
+out_time=00:00:10.000000
+speed=2.5x
+progress=continue
+frame=N/A
+fps=0.00
+bitrate=N/A
+out_time_us=N/A
+speed=N/A
+progress=end
+"""
+
+
+def test_blocks_parse_into_samples():
+    samples = list(parse_progress(io.BytesIO(BLOCK)))
+    assert len(samples) == 2
+    first, last = samples
+    assert first.out_time == 10.0
+    assert first.fps == 59.94
+    assert first.speed == 2.5
+    assert first.bitrate_kbps == 1203.4
+    assert first.total_size == 1503232
+    assert not first.finished
+    assert last.speed is None and last.frame is None
+    assert last.finished
+
+
+def test_follow_progress_returns_last_sample():
+    seen = []
+    last = follow_progress(io.BytesIO(BLOCK), seen.append, duration=20)
+    assert len(seen) == 2
+    assert last is seen[-1]
+
+
+def test_stderr_ring_keeps_only_the_tail():
+    stream = io.BytesIO(b''.join(f'line {i}\n'.encode() for i in range(100)))
+    ring = StderrRing(stream, maxlen=3)
+    assert ring.text() == 'line 97\nline 98\nline 99'
@@ -0,0 +1,76 @@
+import pytest
+import requests
+from guild_membership import MembershipCache, NotAMember, verify_member
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeClient:
+    def __init__(self, member=None, error=None, user=None):
+        self.member = member
+        self.error = error
+        self.user = user or {'id': '7', 'username': 'me'}
+        self.calls = []
+
+    def get_current_user_guild_member(self, access_token, guild_id):
+        self.calls.append('member')
+        if self.error:
+            raise self.error
+        return self.member
+
+    def get_current_user(self, access_token):
+        self.calls.append('user')
+        return self.user
+
+
+def http_error(status):
+    return requests.HTTPError(response=FakeResponse(status))
+
+
+def test_member_lookup_verifies_and_is_cached():
+    cache = MembershipCache(ttl=60)
+    client = FakeClient(member={'user': {'id': '7', 'username': 'me'}, 'roles': []})
+    assert verify_member(client, 'token', '1', cache)['id'] == '7'
+    assert client.calls == ['user', 'member']
+    assert cache.verified('7')
+
+
+def test_login_within_ttl_skips_member_lookup():
+    cache = MembershipCache(ttl=60)
+    cache.add('7')
+    client = FakeClient(error=http_error(429))
+    assert verify_member(client, 'token', '1', cache)['id'] == '7'
+    assert client.calls == ['user']
+
+
+def test_non_member_is_refused_and_forgotten():
+    cache = MembershipCache(ttl=60, max_size=10)
+    with pytest.raises(NotAMember):
+        verify_member(FakeClient(member=None), 'token', '1', cache)
+    # An expired verification is dropped rather than kept for the next outage
+    cache._verified['7'] = -1e9
+    with pytest.raises(NotAMember):
+        verify_member(FakeClient(member=None), 'token', '1', cache)
+    assert '7' not in cache._verified
+
+
+def test_failed_lookup_without_cached_verification_raises():
+    with pytest.raises(requests.HTTPError):
+        verify_member(FakeClient(error=http_error(503)), 'token', '1', MembershipCache(ttl=60))
+
+
+def test_cache_expires_and_stays_bounded(monkeypatch):
+    import guild_membership
+    now = [100.0]
+    monkeypatch.setattr(guild_membership.time, 'monotonic', lambda: now[0])
+    cache = MembershipCache(ttl=10, max_size=2)
+    cache.add('a')
+    now[0] += 5
+    cache.add('b')
+    cache.add('c')  # Full of live entries: 'a' is the oldest and goes
+    assert not cache.verified('a') and cache.verified('b') and cache.verified('c')
+    now[0] += 20
+    assert not cache.verified('c')
@@ -0,0 +1,53 @@
+import struct
+import threading
+import pytest
+from werkzeug.exceptions import RequestEntityTooLarge
+from ingest import IngestFile, IngestAborted
+
+
+def box(kind, payload=b''):
+    return struct.pack('>I4s', 8 + len(payload), kind) + payload
+
+
+def test_moov_before_mdat_is_streamable(tmp_path):
+    seen = []
+    ingest = IngestFile(str(tmp_path / 'in.mp4'), on_streamable=seen.append)
+    ingest.write(box(b'ftyp', b'isom' * 4))
+    ingest.write(box(b'moov', b'x' * 32)[:20])
+    assert ingest.streamable is None
+    ingest.write(box(b'moov', b'x' * 32)[20:] + box(b'mdat', b'y' * 64))
+    assert ingest.streamable is True
+    assert seen == [ingest]
+
+
+def test_mdat_first_is_not_streamable(tmp_path):
+    ingest = IngestFile(str(tmp_path / 'in.mp4'), on_streamable=pytest.fail)
+    ingest.write(box(b'ftyp', b'isom') + box(b'mdat', b'y' * 64) + box(b'moov'))
+    assert ingest.streamable is False
+
+
+def test_size_limit_enforced_as_bytes_arrive(tmp_path):
+    ingest = IngestFile(str(tmp_path / 'in.mp4'), max_bytes=10)
+    ingest.write(b'12345')
+    with pytest.raises(RequestEntityTooLarge):
+        ingest.write(b'678901')
+
+
+def test_follow_reads_while_writing(tmp_path):
+    ingest = IngestFile(str(tmp_path / 'in.mp4'))
+    received = []
+    reader = threading.Thread(target=lambda: received.extend(ingest.follow(chunk_size=4)))
+    reader.start()
+    ingest.write(b'hello ')
+    ingest.write(b'world')
+    ingest.finish()
+    reader.join(5)
+    assert b''.join(received) == b'hello world'
+
+
+def test_follow_raises_when_upload_aborted(tmp_path):
+    ingest = IngestFile(str(tmp_path / 'in.mp4'))
+    ingest.write(b'partial')
+    ingest.abort()
+    with pytest.raises(IngestAborted):
+        list(ingest.follow())
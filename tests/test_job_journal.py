@@ -0,0 +1,203 @@
+import os
+import threading
+import pytest
+from job_journal import JobJournal
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return JobJournal(str(tmp_path / 'jobs.jsonl'))
+
+
+def test_records_fold_into_latest_stage(journal):
+    """Each task's records fold into its furthest stage and merged data"""
+    journal.record('a', 'uploaded', channel_id='1', filename='clip.mp4')
+    journal.record('a', 'probed', duration=12.5)
+    journal.record('b', 'uploaded', channel_id='2')
+    state = journal.get('a')
+    assert state.stage == 'probed'
+    assert state.data == {'channel_id': '1', 'filename': 'clip.mp4', 'duration': 12.5}
+    assert {s.task_id for s in journal.unfinished()} == {'a', 'b'}
+
+
+def test_out_of_order_stages_do_not_move_back(journal):
+    """An encode that started before the upload finished can journal its stages first"""
+    journal.record('a', 'probed', duration=3.0)
+    journal.record('a', 'uploaded', channel_id='1')
+    assert journal.get('a').stage == 'probed'
+    assert journal.get('a').data['channel_id'] == '1'
+
+
+def test_failed_and_posted_are_final(journal):
+    journal.record('a', 'uploaded', channel_id='1')
+    journal.record('a', 'failed', error='boom')
+    journal.record('a', 'encoded')
+    journal.record('b', 'posted', message_link='https://discord.com/channels/1/2/3')
+    journal.record('b', 'failed', error='late')
+    assert journal.get('a').stage == 'failed'
+    assert journal.get('b').stage == 'posted'
+    assert journal.unfinished() == []
+
+
+def test_resumes_are_counted(journal):
+    journal.record('a', 'uploaded', channel_id='1')
+    journal.record('a', 'resumed', from_stage='uploaded')
+    journal.record('a', 'resumed', from_stage='uploaded')
+    state = journal.get('a')
+    assert state.resumes == 2
+    assert state.stage == 'uploaded'
+
+
+def test_truncated_line_is_skipped(journal):
+    """A line cut short by a crash does not hide the rest of the journal"""
+    journal.record('a', 'uploaded', channel_id='1')
+    with open(journal.path, 'a') as f:
+        f.write('{"task_id": "a", "sta')
+    assert journal.get('a').stage == 'uploaded'
+
+
+def test_compact_drops_old_finished_jobs(journal):
+    journal.record('old', 'posted', message_link='x')
+    journal.record('running', 'uploaded', channel_id='1')
+    journal.record('recent', 'failed', error='boom')
+    # Move 'old' back in time
+    with open(journal.path) as f:
+        lines = f.read().replace('"time": ', '"time": 0, "_": ', 1)
+    with open(journal.path, 'w') as f:
+        f.write(lines)
+    assert journal.compact(keep_finished=60) == 1
+    assert set(journal.jobs()) == {'running', 'recent'}
+    assert journal.compact(keep_finished=60) == 0
+
+
+def test_index_reads_only_appended_lines(journal, tmp_path):
+    """Lookups reuse the folded states and parse only what other workers appended since"""
+    other = JobJournal(journal.path)
+    journal.record('a', 'uploaded', channel_id='1')
+    assert journal.get('a').stage == 'uploaded'
+    folded = journal._offset
+    assert journal.jobs() == journal.jobs() and journal._offset == folded
+    other.record('a', 'probed', duration=1.0)
+    with open(journal.path, 'a') as f:
+        f.write('{"task_id": "b", "stage": "upl')
+    assert journal.get('a').stage == 'probed'
+    assert journal.get('b') is None  # Not folded until its newline lands
+    with open(journal.path, 'a') as f:
+        f.write('oaded"}\n')
+    assert journal.get('b').stage == 'uploaded'
+    other.record('a', 'posted', message_link='x')
+    assert other.compact(keep_finished=-1) == 1
+    assert set(journal.jobs()) == {'b'}  # Re-read from the start after the file was replaced
+
+
+def test_record_compacts_past_the_size_threshold(tmp_path):
+    journal = JobJournal(str(tmp_path / 'jobs.jsonl'), compact_bytes=2048)
+    for i in range(40):
+        journal.record(f'done-{i}', 'failed', error='x' * 40, time=0)
+    journal.record('running', 'uploaded', channel_id='1')
+    assert os.path.getsize(journal.path) < 2048
+    assert 'running' in journal.jobs()
+
+
+def test_compact_errors_are_logged(journal, monkeypatch, caplog):
+    journal.record('a', 'posted', message_link='x')
+
+    def fail(**kwargs):
+        raise OSError('read-only file system')
+    monkeypatch.setattr(journal, 'compact', fail)
+    assert journal.compact_logged() == 0
+    assert 'read-only file system' in caplog.text
+
+
+def test_concurrent_records_do_not_interleave(journal):
+    def write(n):
+        for i in range(50):
+            journal.record(f'{n}-{i}', 'uploaded', channel_id=str(n), filename='x' * 200)
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(journal.jobs()) == 200
+
+
+def test_to_progress_reports_finished_jobs(journal):
+    journal.record('a', 'posted', message_link='https://discord.com/channels/1/2/3')
+    journal.record('b', 'failed', error='boom')
+    journal.record('c', 'uploaded', channel_id='1')
+    assert journal.get('a').to_progress().message_link == 'https://discord.com/channels/1/2/3'
+    assert journal.get('b').to_progress().error == 'boom'
+    assert journal.get('c').to_progress().status == 'queued'
+
+
+def test_resume_requeues_unfinished_jobs(journal, queued_jobs):
+    """A restarted worker requeues jobs whose scratch directory survived and fails the rest"""
+    import app as app_module
+    scratch = app_module.scratch
+    for task_id in ('kept', 'encoded'):
+        os.makedirs(os.path.join(scratch.disk_dir, task_id))
+        open(os.path.join(scratch.disk_dir, task_id, 'input.mp4'), 'wb').close()
+    open(os.path.join(scratch.disk_dir, 'encoded', 'output.mp4'), 'wb').close()
+    journal.record('kept', 'uploaded', user_id='1', channel_id='2', filename='a.mp4')
+    journal.record('encoded', 'uploaded', user_id='1', channel_id='2', filename='b.mp4')
+    journal.record('encoded', 'encoded')
+    journal.record('lost', 'uploaded', user_id='1', channel_id='2', filename='c.mp4')
+
+    assert app_module.resume_jobs() == 2
+    submitted = {task_id: args for task_id, _, args in queued_jobs}
+    assert submitted['kept'][-1] is False
+    assert submitted['encoded'][-1] is True  # Goes straight to posting
+    assert journal.get('lost').stage == 'failed'
+    assert journal.get('kept').resumes == 1
+    for task_id in ('kept', 'encoded'):
+        del app_module.tasks[task_id]
+        scratch.release(task_id)
+
+
+def test_resume_rebuilds_batches(journal, queued_jobs):
+    """Resumed files of one batch are posted together, not one message each"""
+    import app as app_module
+    scratch = app_module.scratch
+    for task_id in ('one', 'two', 'alone'):
+        os.makedirs(os.path.join(scratch.disk_dir, task_id))
+        open(os.path.join(scratch.disk_dir, task_id, 'input.mp4'), 'wb').close()
+        batch_id = None if task_id == 'alone' else 'b1'
+        journal.record(task_id, 'uploaded', user_id='1', channel_id='2', filename=f'{task_id}.mp4', batch_id=batch_id)
+
+    assert app_module.resume_jobs() == 3
+    submitted = {task_id: args for task_id, _, args in queued_jobs}
+    batch = app_module.batches.get('b1')
+    assert batch.task_ids == ['one', 'two']
+    assert submitted['one'][3]['batch'] is batch and submitted['two'][3]['batch'] is batch
+    assert 'batch' not in submitted['alone'][3]
+    for task_id in ('one', 'two', 'alone'):
+        del app_module.tasks[task_id]
+        scratch.release(task_id)
+
+
+def test_rescan_takes_over_jobs_once_the_old_worker_lets_go(journal, queued_jobs):
+    """A job still locked by the worker a reload replaces is resumed by a later rescan"""
+    import fcntl
+    import time
+    import threading
+    import app as app_module
+    task_dir = os.path.join(app_module.scratch.disk_dir, 'held')
+    os.makedirs(task_dir)
+    open(os.path.join(task_dir, 'input.mp4'), 'wb').close()
+    journal.record('held', 'uploaded', user_id='1', channel_id='2', filename='a.mp4')
+    old_worker = open(os.path.join(task_dir, '.lock'), 'a')
+    fcntl.flock(old_worker, fcntl.LOCK_EX)
+
+    assert app_module.resume_jobs() == 0
+    assert journal.get('held').stage == 'uploaded'  # Not failed: its files are still there
+    stop = threading.Event()
+    app_module.rescan_jobs(interval=0.05, stop=stop)
+    old_worker.close()
+    deadline = time.time() + 5
+    while not queued_jobs and time.time() < deadline:
+        time.sleep(0.01)
+    stop.set()
+    assert [task_id for task_id, _, _ in queued_jobs] == ['held']
+    assert journal.get('held').resumes == 1
+    del app_module.tasks['held']
+    app_module.scratch.release('held')
@@ -0,0 +1,37 @@
+from load_test import ThrottledBody, percentile, session_cookie
+
+
+def read_all(body, size):
+    chunks = []
+    while True:
+        data = body.read(size)
+        if not data:
+            return b''.join(chunks)
+        chunks.append(data)
+
+
+def test_throttled_body_is_a_complete_multipart_upload():
+    body = ThrottledBody(100000, 0)
+    data = read_all(body, 7000)
+    assert len(data) == len(body)
+    assert b'filename="loadtest.bin"' in data
+    assert data.count(b'\x00') == 100000
+    assert data.endswith(f'--{body.boundary}--\r\n'.encode())
+
+
+def test_session_cookie_signs_in(monkeypatch):
+    """The minted cookie is accepted by the app, so polls reach the progress view"""
+    from app import create_app
+    app = create_app()
+    monkeypatch.setitem(app.config, 'SESSION_COOKIE_SECURE', False)
+    with app.test_client() as client:
+        client.set_cookie('upvrt_session', session_cookie(app.secret_key), path='/upvrt/')
+        assert client.get('/upvrt/progress/missing').status_code == 404
+    with app.test_client() as client:
+        assert client.get('/upvrt/progress/missing').status_code == 302
+
+
+def test_percentile():
+    assert percentile([], 0.5) is None
+    assert percentile([3, 1, 2, 4], 0.5) == 3
+    assert percentile([1, 2, 3], 0.99) == 3
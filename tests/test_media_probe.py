@@ -0,0 +1,45 @@
+import json
+import subprocess
+import media_probe
+from media_probe import ProbeCache, parse_probe, probe_media
+
+PROBE_OUTPUT = {
+    'format': {'duration': '12.5', 'bit_rate': '4000000', 'format_name': 'mov,mp4,m4a,3gp,3g2,mj2'},
+    'streams': [
+        {'codec_type': 'video', 'codec_name': 'h264', 'width': 1920, 'height': 1080,
+         'avg_frame_rate': '30000/1001', 'bit_rate': '3800000',
+         'side_data_list': [{'side_data_type': 'Display Matrix', 'rotation': -90}]},
+        {'codec_type': 'audio', 'codec_name': 'aac', 'bit_rate': '128000', 'channels': 2,
+         'channel_layout': 'stereo', 'sample_rate': '48000'},
+    ]
+}
+
+
+def test_parse_probe_reads_rotation_and_streams():
+    info = parse_probe(PROBE_OUTPUT, 1000)
+    assert info.duration == 12.5
+    assert info.rotation == 270
+    assert info.display_width == 1080
+    assert info.is_portrait
+    assert info.frame_rate == 29.97
+    assert info.audio_channel_layout == 'stereo'
+    assert info.has_audio
+
+
+def test_probe_media_runs_ffprobe_once_per_content(tmp_path, monkeypatch):
+    monkeypatch.setattr(media_probe, 'probe_cache', ProbeCache())
+    calls = []
+
+    def fake_run(cmd, **kwargs):
+        calls.append(cmd)
+        return subprocess.CompletedProcess(cmd, 0, stdout=json.dumps(PROBE_OUTPUT))
+    monkeypatch.setattr(subprocess, 'run', fake_run)
+
+    first = tmp_path / 'a.mp4'
+    second = tmp_path / 'b.mp4'
+    first.write_bytes(b'same content')
+    second.write_bytes(b'same content')
+
+    assert probe_media(str(first)).duration == 12.5
+    assert probe_media(str(second)).duration == 12.5
+    assert len(calls) == 1
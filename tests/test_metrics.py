@@ -0,0 +1,50 @@
+from metrics import Registry
+
+
+def test_counter_renders_labelled_series():
+    registry = Registry()
+    posts = registry.counter('posts_total', 'Posts by status', ['status'])
+    posts.inc(status=200)
+    posts.inc(status=200)
+    posts.inc(status=429)
+
+    text = registry.render()
+    assert '# TYPE posts_total counter' in text
+    assert 'posts_total{status="200"} 2' in text
+    assert 'posts_total{status="429"} 1' in text
+    assert posts.value(status=200) == 2
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.histogram('latency_seconds', 'Latency', buckets=(1, 5))
+    latency.observe(0.5)
+    latency.observe(3)
+    latency.observe(10)
+
+    lines = registry.render().splitlines()
+    assert 'latency_seconds_bucket{le="1"} 1' in lines
+    assert 'latency_seconds_bucket{le="5"} 2' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in lines
+    assert 'latency_seconds_sum 13.5' in lines
+    assert 'latency_seconds_count 3' in lines
+
+
+def test_histogram_time_records_on_error():
+    registry = Registry()
+    latency = registry.histogram('work_seconds', 'Work')
+    try:
+        with latency.time():
+            raise ValueError('boom')
+    except ValueError:
+        pass
+    assert latency.count() == 1
+
+
+def test_gauge_reads_callback_at_render():
+    registry = Registry()
+    depth = [3]
+    registry.gauge('queue_depth', 'Queued jobs', function=lambda: depth[0])
+    assert 'queue_depth 3' in registry.render()
+    depth[0] = 0
+    assert 'queue_depth 0' in registry.render()
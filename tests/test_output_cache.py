@@ -0,0 +1,44 @@
+import os
+import time
+from output_cache import OutputCache, cache_key
+
+
+def write(path, size):
+    path.write_bytes(b'x' * size)
+    return str(path)
+
+
+def test_key_depends_on_content_and_params():
+    params = {'scale': '1280:720', 'video_bitrate': 1000}
+    assert cache_key('abc', params) == cache_key('abc', dict(reversed(list(params.items()))))
+    assert cache_key('abc', params) != cache_key('abd', params)
+    assert cache_key('abc', params) != cache_key('abc', {**params, 'video_bitrate': 900})
+
+
+def test_hit_links_cached_output(tmp_path):
+    cache = OutputCache(str(tmp_path / 'cache'), 1024)
+    cache.put('key', write(tmp_path / 'out.mp4', 100))
+    assert cache.link_to('key', str(tmp_path / 'again.mp4'))
+    assert os.path.getsize(tmp_path / 'again.mp4') == 100
+    assert not cache.link_to('other', str(tmp_path / 'miss.mp4'))
+
+
+def test_least_recently_used_entries_evicted_over_budget(tmp_path):
+    cache = OutputCache(str(tmp_path / 'cache'), 250)
+    cache.put('old', write(tmp_path / 'a.mp4', 100))
+    cache.put('used', write(tmp_path / 'b.mp4', 100))
+    past = time.time() - 60
+    os.utime(cache.get('old'), (past, past))
+    os.utime(cache.get('used'), (past - 60, past - 60))
+    cache.get('used')
+    cache.put('new', write(tmp_path / 'c.mp4', 100))
+
+    assert cache.get('old') is None
+    assert cache.get('used') and cache.get('new')
+    assert cache.size() == 200
+
+
+def test_disabled_cache_stores_nothing(tmp_path):
+    cache = OutputCache(str(tmp_path / 'cache'), 0)
+    assert cache.put('key', write(tmp_path / 'out.mp4', 10)) is None
+    assert cache.get('key') is None
@@ -0,0 +1,51 @@
+import logging
+from request_logging import RequestTimer, ENDPOINT_KEY, parse_routes
+
+
+def wsgi_app(status='200 OK', body=(b'hello', b' world'), endpoint='index'):
+    def app(environ, start_response):
+        environ[ENDPOINT_KEY] = endpoint
+        start_response(status, [('Content-Type', 'text/plain')])
+        return list(body)
+    return app
+
+
+def call(middleware, path='/upvrt/'):
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'REMOTE_ADDR': '127.0.0.1'}
+    body = middleware(environ, lambda status, headers, exc_info=None: None)
+    data = b''.join(body)
+    body.close()
+    return data
+
+
+def test_one_line_per_request_with_status_and_size(caplog):
+    caplog.set_level(logging.INFO, logger='upvrt.requests')
+    assert call(RequestTimer(wsgi_app(), sampling={}, levels={})) == b'hello world'
+    records = [r for r in caplog.records if r.name == 'upvrt.requests']
+    assert len(records) == 1
+    message = records[0].getMessage()
+    assert 'endpoint=index status=200 bytes=11' in message
+    assert 'duration_ms=' in message
+
+
+def test_sampled_out_endpoints_are_skipped_but_errors_are_kept(caplog):
+    caplog.set_level(logging.INFO, logger='upvrt.requests')
+    call(RequestTimer(wsgi_app(endpoint='get_progress'), sampling={'get_progress': 0}, levels={}))
+    assert not [r for r in caplog.records if r.name == 'upvrt.requests']
+
+    call(RequestTimer(wsgi_app('500 INTERNAL SERVER ERROR', endpoint='get_progress'),
+                      sampling={'get_progress': 0}, levels={}))
+    records = [r for r in caplog.records if r.name == 'upvrt.requests']
+    assert len(records) == 1 and records[0].levelno == logging.ERROR
+
+
+def test_per_endpoint_level(caplog):
+    caplog.set_level(logging.DEBUG, logger='upvrt.requests')
+    call(RequestTimer(wsgi_app(endpoint='health_check'), sampling={}, levels={'health_check': logging.DEBUG}))
+    assert [r.levelno for r in caplog.records if r.name == 'upvrt.requests'] == [logging.DEBUG]
+
+
+def test_parse_routes_ignores_malformed_entries():
+    assert parse_routes('get_progress=0.05, bad, serve_static=x,health_check=0', float) == {
+        'get_progress': 0.05, 'health_check': 0.0
+    }
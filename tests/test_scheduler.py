@@ -0,0 +1,48 @@
+import threading
+from scheduler import TranscodeScheduler
+
+
+def test_jobs_run_in_submission_order_within_slot_limit():
+    scheduler = TranscodeScheduler(slots=1, threads_per_job=1)
+    started = threading.Event()
+    gate = threading.Event()
+    done = threading.Event()
+    order = []
+
+    scheduler.submit('first', lambda: (started.set(), gate.wait()))
+    assert started.wait(5)
+    scheduler.submit('second', order.append, 'second')
+    scheduler.submit('third', lambda: (order.append('third'), done.set()))
+
+    assert scheduler.position('second') == 1
+    assert scheduler.position('third') == 2
+    assert scheduler.estimated_start('third') > scheduler.estimated_start('second')
+
+    gate.set()
+    assert done.wait(5)
+    assert order == ['second', 'third']
+    assert scheduler.position('third') is None
+
+
+def test_threads_per_job_defaults_from_slots():
+    scheduler = TranscodeScheduler(slots=2)
+    assert scheduler.threads_per_job >= 1
+    assert scheduler.stats() == {'queued': 0, 'running': 0, 'slots': 2}
+
+
+def test_claimed_threads_stay_within_the_cores():
+    scheduler = TranscodeScheduler(slots=4, threads_per_job=2, cpu_count=8)
+    gate = threading.Event()
+    for task_id in ('0', '1', '2'):
+        started = threading.Event()
+        scheduler.submit(task_id, lambda started=started: (started.set(), gate.wait()))
+        assert started.wait(5)
+    # The other two running jobs hold their two threads each until they claim
+    assert scheduler.claim_threads('0', 8) == 4
+    assert scheduler.claim_threads('1', 8) == 2
+    assert scheduler.claim_threads('2', 8) == 2
+    assert scheduler.claim_threads('0', 2) == 2
+    assert scheduler.claim_threads('1', 8) == 4
+    # Never fewer than one, and only running jobs hold what they are granted
+    assert scheduler.claim_threads('queued', 8) == 1 and 'queued' not in scheduler._threads
+    gate.set()
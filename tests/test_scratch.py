@@ -0,0 +1,114 @@
+import os
+import time
+import subprocess
+import sys
+from scratch import ScratchSpace
+
+MB = 1024 * 1024
+
+
+def make_space(tmp_path, **kwargs):
+    kwargs.setdefault('budget_bytes', 10 * MB)
+    kwargs.setdefault('max_age', 3600)
+    return ScratchSpace(tmpfs_dir=None, disk_dir=str(tmp_path), sweep_interval=3600, **kwargs)
+
+
+def leftover(tmp_path, name, size, age):
+    path = tmp_path / name
+    path.mkdir()
+    (path / 'input.mp4').write_bytes(b'\x00' * size)
+    stamp = time.time() - age
+    os.utime(path, (stamp, stamp))
+    return path
+
+
+def test_each_task_gets_its_own_directory(tmp_path):
+    space = make_space(tmp_path)
+    first, second = space.create('a'), space.create('b')
+    assert first != second and os.path.isdir(first) and os.path.isdir(second)
+    space.release('a')
+    assert not os.path.exists(first)
+    assert space.locate('b') == second
+
+
+def test_sweep_keeps_live_and_recent_directories(tmp_path):
+    space = make_space(tmp_path)
+    live = space.create('live')
+    stamp = time.time() - 7200
+    os.utime(live, (stamp, stamp))
+    recent = leftover(tmp_path, 'recent', 1024, age=600)
+    stale = leftover(tmp_path, 'stale', 1024, age=7200)
+
+    space.sweep()
+    assert os.path.exists(live)
+    assert recent.exists()
+    assert not stale.exists()
+
+
+def test_sweep_removes_oldest_leftovers_over_budget(tmp_path):
+    space = make_space(tmp_path, budget_bytes=3 * MB)
+    older = leftover(tmp_path, 'older', 2 * MB, age=900)
+    newer = leftover(tmp_path, 'newer', 2 * MB, age=600)
+    assert space.sweep() <= 3 * MB
+    assert not older.exists()
+    assert newer.exists()
+
+
+def test_directory_of_another_live_process_is_kept(tmp_path):
+    holder = subprocess.Popen([sys.executable, '-c', (
+        'import sys, time; sys.path.insert(0, %r)\n'
+        'from scratch import ScratchSpace\n'
+        'ScratchSpace(tmpfs_dir=None, disk_dir=%r).create("other")\n'
+        'print("ready", flush=True); time.sleep(30)'
+    ) % (os.path.dirname(os.path.dirname(os.path.abspath(__file__))), str(tmp_path))],
+        stdout=subprocess.PIPE, text=True)
+    try:
+        assert holder.stdout.readline().strip() == 'ready'
+        stamp = time.time() - 7200
+        os.utime(tmp_path / 'other', (stamp, stamp))
+        make_space(tmp_path).sweep()
+        assert (tmp_path / 'other').exists()
+    finally:
+        holder.kill()
+        holder.wait()
+    make_space(tmp_path).sweep()
+    assert not (tmp_path / 'other').exists()
+
+
+def test_unlocked_directory_waits_for_adopt(tmp_path):
+    space = make_space(tmp_path)
+    path = space.create('chunked', lock=False)
+    assert space.adopt('chunked') == path
+    assert make_space(tmp_path).adopt('chunked') is None
+    space.release('chunked')
+
+    idle = space.create('idle', lock=False)
+    stamp = time.time() - 7200
+    os.utime(idle, (stamp, stamp))
+    space.sweep()
+    assert not os.path.exists(idle)
+
+
+def test_pending_directory_survives_budget_pressure_until_max_age(tmp_path):
+    space = make_space(tmp_path, budget_bytes=1 * MB)
+    pending = space.create('pending', lock=False)
+    with open(os.path.join(pending, 'input.mp4'), 'wb') as f:
+        f.write(b'\x01' * (2 * MB))
+    stamp = time.time() - 90
+    os.utime(pending, (stamp, stamp))
+    leftover(tmp_path, 'crashed', 2 * MB, age=90)
+    space.sweep()
+    assert os.path.exists(pending)
+    assert not (tmp_path / 'crashed').exists()
+    stamp = time.time() - 7200
+    os.utime(pending, (stamp, stamp))
+    space.sweep()
+    assert not os.path.exists(pending)
+
+
+def test_sparse_files_count_only_written_blocks(tmp_path):
+    space = make_space(tmp_path)
+    path = space.create('sparse', lock=False)
+    with open(os.path.join(path, 'input.mp4'), 'wb') as f:
+        f.truncate(100 * MB)
+    assert space.usage() < MB
@@ -0,0 +1,87 @@
+import os
+import segmented_encode
+from segmented_encode import (CombinedProgress, ThroughputBaseline, plan_segments, segment_bitrate,
+                              encode_segmented, default_workers)
+from task_store import FFmpegProgress
+
+
+def test_segments_cut_at_nearest_keyframes():
+    keyframes = [0.0, 2.0, 4.0, 29.0, 31.5, 58.0, 61.0, 88.0, 90.5]
+    segments = plan_segments(120, keyframes, 4, min_length=10)
+    assert [start for start, _ in segments] == [0.0, 29.0, 61.0, 90.5]
+    assert segments[-1][1] == 120
+    assert all(end == next_start for (_, end), (next_start, _) in zip(segments, segments[1:]))
+
+
+def test_short_inputs_get_fewer_segments():
+    assert plan_segments(25, [], 8, min_length=10) == [(0.0, 12.5), (12.5, 25)]
+    assert plan_segments(8, [], 8, min_length=10) == [(0.0, 8)]
+
+
+def test_workers_fit_the_cores_granted(monkeypatch):
+    assert default_workers(2, cores=6) == 3
+    assert default_workers(4, cores=2) == 1
+    monkeypatch.setattr(segmented_encode, 'SEGMENT_WORKERS', 8)
+    assert default_workers(2, cores=6) == 3
+    assert default_workers(2) == 8
+
+
+def test_segment_bitrate_leaves_room_for_each_vbv_buffer():
+    assert segment_bitrate(1_000_000, 120, 4, mode='abr') == 1_000_000
+    assert segment_bitrate(1_000_000, 120, 1, mode='vbv') == 1_000_000
+    assert segment_bitrate(1_000_000, 120, 4, mode='vbv') < 1_000_000
+
+
+def test_combined_progress_sums_segments():
+    progress = FFmpegProgress()
+    progress.start(100)
+    combined = CombinedProgress(progress, 2)
+    combined.segment(0).update(30)
+    combined.segment(1).update(20)
+    assert progress.percent == 50
+
+
+def test_speedup_relative_to_single_process_baseline():
+    baseline = ThroughputBaseline()
+    assert baseline.speedup(100) is None
+    baseline.record(100)
+    assert baseline.speedup(350) == 3.5
+
+
+def test_encode_segmented_joins_segments_in_order(tmp_path):
+    commands = []
+
+    def run(command, progress, duration):
+        commands.append(command)
+        progress.update(duration or 0)
+        if command[0] == 'segment':
+            open(command[-1], 'wb').close()
+        return 0, None
+
+    progress = FFmpegProgress()
+    progress.start(30)
+    work_dir = str(tmp_path / 'segments')
+    returncode, _ = encode_segmented(
+        [(0, 10), (10, 30)], work_dir,
+        lambda start, length, path: ['segment', start, length, path],
+        lambda list_path: ['join', open(list_path).read()],
+        run, progress, workers=2
+    )
+    assert returncode == 0
+    assert progress.percent == 100
+    listing = commands[-1][1]
+    assert listing.index('segment-000') < listing.index('segment-001')
+    assert not os.path.exists(work_dir)
+
+
+def test_encode_segmented_reports_failed_segment(tmp_path):
+    def run(command, progress, duration):
+        return (1, 'boom') if command[1] == 10 else (0, None)
+
+    returncode, error = encode_segmented(
+        [(0, 10), (10, 20)], str(tmp_path / 'segments'),
+        lambda start, length, path: ['segment', start, length, path],
+        lambda list_path: ['join'], run, FFmpegProgress(), workers=2
+    )
+    assert returncode == 1
+    assert error == 'Segment 2 of 2 failed: boom'
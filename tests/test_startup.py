@@ -0,0 +1,41 @@
+import os
+import sys
+import subprocess
+from stamp_version import stamp
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+# Importing the app runs in every gunicorn worker and test process; keep it cheap
+IMPORT_BUDGET_SECONDS = float(os.getenv('IMPORT_BUDGET_SECONDS', 1.5))
+
+IMPORT_PROBE = """
+import subprocess, time
+spawned = []
+original = subprocess.Popen.__init__
+def record(self, args, *rest, **kwargs):
+    spawned.append(args)
+    original(self, args, *rest, **kwargs)
+subprocess.Popen.__init__ = record
+started = time.perf_counter()
+import app
+print(time.perf_counter() - started)
+print(len(spawned))
+"""
+
+
+def test_import_is_fast_and_side_effect_free(tmp_path):
+    result = subprocess.run([sys.executable, '-c', IMPORT_PROBE], cwd=tmp_path, capture_output=True, text=True,
+                            env=dict(os.environ, PYTHONPATH=ROOT), check=True)
+    seconds, spawned = result.stdout.split()
+    assert float(seconds) < IMPORT_BUDGET_SECONDS
+    assert spawned == '0'  # No git or other subprocesses at import
+    assert not (tmp_path / 'uploads').exists()  # Directories are created by create_app()
+
+
+def test_stamp_replaces_commit_fields():
+    source = 'VERSION = "1.0.0"\nCOMMIT = ""\nCOMMIT_MESSAGE = ""\n'
+    stamped = stamp(source, 'abc1234', "Fix the 'size' report")
+    namespace = {}
+    exec(stamped, namespace)
+    assert namespace['COMMIT'] == 'abc1234'
+    assert namespace['COMMIT_MESSAGE'] == "Fix the 'size' report"
+    assert namespace['VERSION'] == '1.0.0'
@@ -0,0 +1,52 @@
+import gzip
+from flask import Flask, request
+from static_assets import StaticAssets
+
+CSS = b'body { color: #333; }\n' * 100
+
+
+def make_assets(tmp_path, external_url=None):
+    (tmp_path / 'css').mkdir()
+    (tmp_path / 'css' / 'site.css').write_bytes(CSS)
+    (tmp_path / '.gitkeep').write_bytes(b'')
+    return StaticAssets(str(tmp_path), external_url=external_url).build()
+
+
+def serve(assets, filename, headers=None):
+    app = Flask(__name__)
+
+    @app.route('/upvrt/static/<path:filename>')
+    def static_file(filename):
+        asset, immutable = assets.lookup(filename)
+        return assets.response(asset, request, immutable=immutable)
+    return app.test_client().get(f'/upvrt/static/{filename}', headers=headers or {})
+
+
+def test_urls_are_fingerprinted_and_fall_back_to_static_url(tmp_path):
+    assets = make_assets(tmp_path, external_url='https://cdn.example.com/images')
+    url = assets.url('css/site.css')
+    assert url.startswith('/upvrt/static/css/site.') and url.endswith('.css')
+    assert assets.url('images/favicon.png') == 'https://cdn.example.com/images/favicon.png'
+    assert '.gitkeep' not in assets
+
+
+def test_fingerprinted_name_is_immutable_with_etag_and_304(tmp_path):
+    assets = make_assets(tmp_path)
+    filename = assets.url('css/site.css')[len('/upvrt/static/'):]
+    rv = serve(assets, filename)
+    assert rv.status_code == 200
+    assert 'immutable' in rv.headers['Cache-Control']
+    assert rv.data == CSS
+    assert serve(assets, filename, {'If-None-Match': rv.headers['ETag']}).status_code == 304
+
+    plain = serve(assets, 'css/site.css')
+    assert 'immutable' not in plain.headers['Cache-Control']
+
+
+def test_precompressed_copy_served_when_accepted(tmp_path):
+    assets = make_assets(tmp_path)
+    rv = serve(assets, 'css/site.css', {'Accept-Encoding': 'gzip'})
+    assert rv.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in rv.headers['Vary']
+    assert gzip.decompress(rv.data) == CSS
+    assert rv.headers['ETag'].endswith('-gzip"')
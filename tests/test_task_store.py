@@ -0,0 +1,51 @@
+import time
+import pytest
+from task_store import FFmpegProgress, MemoryTaskStore, SQLiteTaskStore, create_task_store
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    return create_task_store(request.param, path=str(tmp_path / 'tasks.db'), ttl=60, flush_interval=1.0)
+
+
+def test_stage_changes_are_visible_to_readers(store):
+    store['task'] = FFmpegProgress(status='queued')
+    store['task'].start(10)
+    store['task'].fail('boom')
+
+    assert 'task' in store
+    assert store['task'].status == 'failed'
+    assert store['task'].error == 'boom'
+    assert store.get('missing') is None
+
+
+def test_percent_updates_are_batched(tmp_path):
+    writer = SQLiteTaskStore(str(tmp_path / 'tasks.db'), flush_interval=60)
+    reader = SQLiteTaskStore(str(tmp_path / 'tasks.db'))
+    progress = FFmpegProgress()
+    writer['task'] = progress
+    progress.start(10)
+    progress.update(5)
+
+    assert progress.percent == 50
+    assert reader['task'].percent == 0
+    progress.set_stage('posting', 0)
+    assert reader['task'].stage == 'posting'
+
+
+def test_finished_tasks_are_evicted_after_ttl():
+    store = MemoryTaskStore(ttl=60)
+    store['old'] = FFmpegProgress()
+    store['old'].complete()
+    store['old'].finished_at = time.time() - 120
+    store['running'] = FFmpegProgress()
+
+    store._last_evict = 0
+    store.maybe_evict()
+    assert 'old' not in store
+    assert 'running' in store
+    assert len(store) == 1
+
+
+def test_records_use_slots():
+    assert not hasattr(FFmpegProgress(), '__dict__')
@@ -1,6 +1,10 @@
-VERSION = "1.0.13"
+VERSION = "1.25.0"
+
+# Filled in at build time by stamp_version.py; empty in a development checkout
+COMMIT = ""
+COMMIT_MESSAGE = ""
 
 # Version format: MAJOR.MINOR.PATCH
 # MAJOR: Breaking changes
 # MINOR: New features, backwards compatible
-# PATCH: Bug fixes, backwards compatible 
\ No newline at end of file
+# PATCH: Bug fixes, backwards compatible 
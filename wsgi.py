@@ -1,4 +1,11 @@
-from app import app
+from dotenv import load_dotenv
+
+# Before importing the app: its modules read their settings from the environment on import
+load_dotenv()
+
+from app import create_app
+
+app = create_app()
 
 if __name__ == "__main__":
-    app.run() 
\ No newline at end of file
+    app.run()